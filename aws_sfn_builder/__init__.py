@@ -1,15 +1,45 @@
 __version__ = "0.0.10"
 
+from .async_runner import AsyncRunner
+from .batching import Batcher
+from .cache import LRU
+from .clock import Clock, VirtualClock
+from .deadlines import abandoned_calls, heartbeat
+from .errors import Catcher, Errors, Retrier, StateFailed, StatesError
+from .limits import Limit
+from .pages import Pages
 from .runner import ResourceManager, Runner
-from .states import Choice, ChoiceRule, Fail, Machine, Parallel, Pass, Sequence, State, States, Succeed, Task, Wait
+from .scheduler import Execution, Scheduler
+from .states import (
+    Choice, ChoiceRule, DistributedMap, Fail, Machine, Map, Parallel, Pass, Sequence, State, States, Succeed, Task,
+    Wait,
+)
 
 __all__ = [
+    "AsyncRunner",
+    "Batcher",
+    "LRU",
+    "Clock",
+    "VirtualClock",
+    "abandoned_calls",
+    "heartbeat",
+    "Catcher",
+    "Errors",
+    "Retrier",
+    "StateFailed",
+    "StatesError",
+    "Limit",
+    "Pages",
     "ResourceManager",
     "Runner",
+    "Execution",
+    "Scheduler",
     "Choice",
     "ChoiceRule",
+    "DistributedMap",
     "Fail",
     "Machine",
+    "Map",
     "Parallel",
     "Pass",
     "Sequence",
@@ -0,0 +1,243 @@
+import asyncio
+import collections
+import contextvars
+import functools
+import inspect
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Callable, Iterable, List, Optional, Tuple, Union
+
+from .clock import Clock, Timelines
+from .deadlines import execution_deadline
+from .errors import ExecutionTimedOut
+from .pages import Pages
+from .payloads import shared_payloads
+from .plan import Plan
+from .runner import (
+    _max_pages, branch_failed, execution_timeout, MAX_TRANSITIONS, ResourceManager, Runner, state_failed,
+    STREAM_WINDOW, timed_out, too_many_transitions,
+)
+from .states import Machine, Sequence, State, States
+
+
+class AsyncRunner(Runner):
+    """
+    Executes state machines on an asyncio event loop.
+
+    Providers may be coroutine functions (``async def``) which are awaited on the loop,
+    or plain functions which are run on ``executor`` (a thread pool by default) with
+    ``loop.run_in_executor`` so they do not block other executions.
+    Branches of Parallel states and iterations of Map states are run with ``asyncio.gather``.
+
+    Usage:
+
+        runner = AsyncRunner()
+
+        @runner.resource_provider("arn.hello-world")
+        async def hello_world(payload):
+            return "Hello, world!"
+
+        final_state, output = await runner.run(state_machine)
+
+    Many executions can run concurrently on the same loop:
+
+        results = await asyncio.gather(*(runner.run(state_machine, input) for input in inputs))
+
+    Executions parked at Wait states are timers of the event loop, so any number of them
+    can wait at the same time without holding a thread. With a ``VirtualClock`` the waits
+    of concurrent executions add up, use ``Scheduler`` to simulate many executions at once.
+    """
+
+    def __init__(
+        self,
+        resources: ResourceManager = None,
+        executor: Union[Executor, str] = "thread",
+        max_workers: int = None,
+        clock: Clock = None,
+        max_transitions: int = MAX_TRANSITIONS,
+    ):
+        if executor == "process":
+            raise ValueError("AsyncRunner runs plain function providers on threads, 'process' is not supported")
+        super().__init__(
+            resources=resources, executor=executor, max_workers=max_workers, clock=clock,
+            max_transitions=max_transitions,
+        )
+
+    async def run(self, sm: Machine, input=None, _timeout=None) -> Tuple[Optional[State], Any]:
+        """
+        Execute the state machine using its compiled plan (see ``Machine.compile_plan``).
+        Returns the final state and the output.
+
+        The execution fails with ``States.Timeout`` once it has taken longer than
+        TimeoutSeconds of the state machine or ``_timeout`` seconds on the clock of the runner,
+        or has made more than ``max_transitions`` state transitions.
+        """
+        if input is None:
+            input = {}
+
+        plan = sm.compile_plan()
+        token = _max_pages.set(sm.max_pages)
+        try:
+            index, output = await self._run_plan(plan, input, sm.comment or sm.name, execution_timeout(sm, _timeout))
+        finally:
+            _max_pages.reset(token)
+
+        # Return the final state
+        if index is None:
+            return None, output
+        return sm.states[plan.names[index]], output
+
+    def walk(self, sm: Machine, input=None, _timeout=None):
+        """
+        Not supported: ``AsyncRunner`` only runs compiled plans. ``Runner.walk`` is the reference
+        implementation that the outputs of ``AsyncRunner.run`` can be compared with.
+        """
+        raise TypeError("AsyncRunner only runs compiled plans, walk the state machine with Runner.walk")
+
+    async def run_branches(self, branches: List[Sequence], input, _timeout=None) -> List:
+        """
+        Run branches of a Parallel state concurrently, all of them with ``input``.
+        Returns the list of outputs of the branches in the order of the branches.
+        """
+        return await self.run_sequences(branches, [input] * len(branches), _timeout=_timeout)
+
+    async def run_sequences(
+        self, sequences: List[Sequence], inputs: List, max_concurrency: int = None, _timeout=None,
+    ) -> List:
+        """
+        Run each of ``sequences`` with the corresponding item of ``inputs`` concurrently,
+        at most ``max_concurrency`` at a time if it is set (``0`` or ``None`` means no limit).
+        Returns the list of outputs in the order of the sequences.
+        """
+        if not max_concurrency or max_concurrency >= len(sequences):
+            timelines = self.clock.timelines(len(sequences))
+            outputs = await asyncio.gather(*(
+                self._run_on_timeline(timelines, sequence, input, _timeout)
+                for sequence, input in zip(sequences, inputs)
+            ))
+            timelines.join()
+            return outputs
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        timelines = self.clock.timelines(max_concurrency)
+
+        async def run_bounded(sequence, input):
+            async with semaphore:
+                return await self._run_on_timeline(timelines, sequence, input, _timeout)
+
+        outputs = await asyncio.gather(*(run_bounded(sequence, input) for sequence, input in zip(sequences, inputs)))
+        timelines.join()
+        return outputs
+
+    async def stream_sequence(
+        self, sequence: Sequence, inputs: Iterable, max_concurrency: int = None, _timeout=None,
+    ) -> AsyncIterator:
+        """
+        Asynchronous generator running ``sequence`` for each item of ``inputs`` and yielding
+        the outputs in the order of the inputs, with at most ``max_concurrency``
+        (``STREAM_WINDOW`` if it is not set) runs in flight. See ``Runner.stream_sequence``.
+        """
+        limit = max_concurrency or STREAM_WINDOW
+        timelines = self.clock.timelines(limit)
+        pending = collections.deque()
+        try:
+            for input in inputs:
+                if len(pending) >= limit:
+                    yield await pending.popleft()
+                pending.append(asyncio.ensure_future(self._run_on_timeline(timelines, sequence, input, _timeout)))
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+        timelines.join()
+
+    async def fetch_pages(self, pages: Pages) -> Any:
+        """
+        Fetch the pages of a paginated result concurrently, at most ``MaxPages`` of the
+        state machine at a time, and merge them in page order.
+        ``pages.fetch`` may be a coroutine function.
+        """
+        cursors = pages.remaining_cursors
+        semaphore = asyncio.Semaphore(_max_pages.get() or len(cursors) or 1)
+
+        async def fetch(cursor):
+            async with semaphore:
+                return await self.call_provider(pages.fetch, cursor)
+
+        return pages.combine(await asyncio.gather(*(fetch(cursor) for cursor in cursors)))
+
+    async def call_provider(self, provider: Callable, payload) -> Any:
+        """
+        Await a coroutine function provider, or run a plain function provider on the executor.
+        """
+        if inspect.iscoroutinefunction(provider):
+            return await provider(payload)
+        # In a copy of the context, for heartbeat() and the deadlines of the calls it makes
+        call = functools.partial(contextvars.copy_context().run, provider, payload)
+        result = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _run_on_timeline(self, timelines: Timelines, branch: Sequence, input, _timeout) -> Any:
+        with timelines.run():
+            return await self._run_branch(branch, input, _timeout)
+
+    async def _run_branch(self, branch: Sequence, input, _timeout) -> Any:
+        plan = branch.compile_plan()
+        with shared_payloads():
+            index, output = await self._run_plan(plan, input, branch.comment or branch.name, _timeout)
+        if index is not None and plan.states[index].type == States.Fail:
+            raise branch_failed(plan.states[index], output)
+        return output
+
+    async def _run_plan(self, plan: Plan, input, label: str, _timeout) -> Tuple[Optional[int], Any]:
+        steps = plan.async_steps
+        delays = plan.delays
+        clock = self.clock
+
+        deadline = clock.time() + _timeout if _timeout is not None else None
+        index = None
+        next_index = plan.start
+        transitions_left = self.max_transitions
+
+        last_10_states = collections.deque(maxlen=10)
+
+        with execution_deadline(clock, deadline):
+            while next_index is not None:
+                index = next_index
+                last_10_states.append(index)
+                transitions_left -= 1
+                if transitions_left < 0:
+                    raise too_many_transitions(label, self.max_transitions, [plan.names[i] for i in last_10_states])
+                delay = delays[index]
+                if delay is not None:
+                    try:
+                        seconds = delay(input, clock.time())
+                    except Exception as e:
+                        raise state_failed(plan.states[index], e)
+                    if not await self._asleep(seconds, deadline):
+                        raise timed_out(label, _timeout, [plan.names[i] for i in last_10_states])
+                try:
+                    next_index, input = await steps[index](input, self)
+                except ExecutionTimedOut:
+                    if deadline is None:
+                        raise
+                    raise timed_out(label, _timeout, [plan.names[i] for i in last_10_states])
+                except Exception as e:
+                    raise state_failed(plan.states[index], e)
+                if deadline is not None and clock.time() > deadline:
+                    raise timed_out(label, _timeout, [plan.names[i] for i in last_10_states])
+
+        return index, input
+
+    async def _asleep(self, seconds: float, deadline: Optional[float]) -> bool:
+        """
+        Wait for ``seconds`` on the clock without blocking the loop, but not past ``deadline``.
+        Returns ``False`` if the deadline came first.
+        """
+        if deadline is not None and self.clock.time() + seconds > deadline:
+            await self.clock.asleep(deadline - self.clock.time())
+            return False
+        await self.clock.asleep(seconds)
+        return True
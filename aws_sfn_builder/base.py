@@ -25,6 +25,7 @@ def _parse_node_dict(d: Dict, **fields) -> "Node":
         state_cls = state_types[fields["type"]]
     else:
         state_cls = Node
+    state_cls = state_cls.select_class(d)
 
     for attr_name, sl_name in state_cls._FIELDS.items():
         if sl_name in d:
@@ -126,6 +127,15 @@ class Node:
 
         return c
 
+    @classmethod
+    def select_class(cls, d: Dict) -> Type["Node"]:
+        """
+        A hook for custom Node classes whose definitions may stand for a more specific class.
+
+        Returns the class to parse ``d`` into.
+        """
+        return cls
+
     @classmethod
     def parse_dict(cls, d: Dict, fields: Dict) -> None:
         """
@@ -0,0 +1,154 @@
+"""
+Coalescing of concurrent provider calls into batches (see ``ResourceManager.batch_provider``).
+"""
+import asyncio
+import functools
+import inspect
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class _Call:
+    """
+    A payload waiting in a batch for its result.
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+def _results(batch_provider: Callable, payloads: List, results) -> List:
+    results = list(results)
+    if len(results) != len(payloads):
+        raise ValueError(
+            f"Batch provider {batch_provider!r} returned {len(results)} results for {len(payloads)} payloads"
+        )
+    return results
+
+
+class Batcher:
+    """
+    Coalesces the concurrent calls of a provider into calls of a batch provider, which takes
+    the list of their payloads and returns the list of their results in the same order.
+
+    The first call of a batch waits at most ``max_wait_ms`` milliseconds for others to join it,
+    a batch is made as soon as it has ``max_batch`` payloads.
+    A result that is an exception is raised to the caller of its payload only,
+    an exception raised by the batch provider to all the callers of the batch.
+
+    Plain function batch providers are called on the thread of the first call of the batch,
+    coroutine function batch providers as a task of the event loop of the calls.
+    """
+
+    def __init__(self, max_batch: int = 100, max_wait_ms: float = 2.0):
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be at least 1, got {max_batch!r}")
+        if max_wait_ms < 0:
+            raise ValueError(f"max_wait_ms must not be negative, got {max_wait_ms!r}")
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._condition = threading.Condition()
+        self._batch: List[_Call] = []
+        # The batches being filled on each event loop
+        self._loop_batches: Dict[asyncio.AbstractEventLoop, List[Tuple[Any, "asyncio.Future"]]] = {}
+        # Tasks of the batches being run on event loops, which the loops only hold weakly
+        self._tasks = set()
+        # Number of batches made
+        self.batches = 0
+
+    def __getstate__(self):
+        return {"max_batch": self.max_batch, "max_wait_ms": self.max_wait_ms}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def wrap(self, batch_provider: Callable) -> Callable:
+        """
+        A provider of one payload that calls ``batch_provider`` with batches of payloads.
+        """
+        if inspect.iscoroutinefunction(batch_provider):
+            @functools.wraps(batch_provider)
+            async def batched(payload):
+                return await self._acall(batch_provider, payload)
+        else:
+            @functools.wraps(batch_provider)
+            def batched(payload):
+                return self._call(batch_provider, payload)
+
+        batched.batcher = self
+        return batched
+
+    def _call(self, batch_provider: Callable, payload):
+        call = _Call(payload)
+        with self._condition:
+            batch = self._batch
+            batch.append(call)
+            leader = len(batch) == 1
+            if len(batch) >= self.max_batch:
+                self._batch = []
+                self.batches += 1
+                self._condition.notify_all()
+            elif leader:
+                self._condition.wait_for(lambda: batch is not self._batch, self.max_wait_ms / 1000)
+                if batch is self._batch:
+                    self._batch = []
+                    self.batches += 1
+
+        if leader:
+            self._run(batch_provider, batch)
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run(self, batch_provider: Callable, batch: List[_Call]) -> None:
+        payloads = [call.payload for call in batch]
+        try:
+            results = _results(batch_provider, payloads, batch_provider(payloads))
+        except BaseException as e:
+            results = [e] * len(batch)
+        for call, result in zip(batch, results):
+            if isinstance(result, BaseException):
+                call.error = result
+            else:
+                call.result = result
+            call.done.set()
+
+    async def _acall(self, batch_provider: Callable, payload):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._loop_batches.setdefault(loop, [])
+        batch.append((payload, future))
+        if len(batch) >= self.max_batch:
+            self._flush(batch_provider, loop, batch)
+        elif len(batch) == 1:
+            loop.call_later(self.max_wait_ms / 1000, self._flush, batch_provider, loop, batch)
+        return await future
+
+    def _flush(self, batch_provider: Callable, loop: asyncio.AbstractEventLoop, batch: List) -> None:
+        if self._loop_batches.get(loop) is not batch:
+            # Flushed already, when it was full
+            return
+        del self._loop_batches[loop]
+        self.batches += 1
+        task = loop.create_task(self._arun(batch_provider, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _arun(self, batch_provider: Callable, batch: List) -> None:
+        payloads = [payload for payload, _ in batch]
+        try:
+            results = _results(batch_provider, payloads, await batch_provider(payloads))
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
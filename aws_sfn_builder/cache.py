@@ -0,0 +1,214 @@
+"""
+Memoization of resource providers (see ``ResourceManager.register``).
+"""
+import asyncio
+import collections
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from .lazy_json import materialize
+from .payloads import copy_payload
+
+# Cached entries are (expires at, result)
+_Entry = Tuple[float, Any]
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    currsize: int
+    maxsize: Optional[int]
+
+
+class _Call:
+    """
+    A call in flight, which callers with the same payload wait for instead of making their own.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+def payload_key(payload) -> Optional[str]:
+    """
+    Canonical hash of a JSON payload: the same for equal payloads whatever the order of their keys.
+    ``None`` if the payload is not JSON.
+    """
+    try:
+        text = json.dumps(payload, sort_keys=True, separators=(",", ":"), allow_nan=False, default=materialize)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class LRU:
+    """
+    Cache of the results of a provider by its payload, the least recently used results
+    are evicted first when it holds ``maxsize`` of them (``None`` for no limit),
+    and results expire ``ttl`` seconds after they are computed (``None`` for never):
+
+        @resources.provider("arn.lookup", cache=LRU(maxsize=1024, ttl=60))
+        def lookup(payload):
+            ...
+
+    Concurrent calls with equal payloads are made once: the first caller calls the provider
+    and the others wait for its result, or its error. Errors are not cached.
+
+    Callers are given copies of the cached results, so they can modify them.
+    Payloads that are not JSON are passed to the provider without caching.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 128, ttl: Optional[float] = None, timer: Callable[[], float] = None):
+        if maxsize is not None and maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1 or None, got {maxsize!r}")
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f"ttl must be positive or None, got {ttl!r}")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer or time.monotonic
+        self._entries: "collections.OrderedDict[Hashable, _Entry]" = collections.OrderedDict()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, "asyncio.Future"] = {}
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = 0
+
+    def __getstate__(self):
+        # Worker processes start with an empty cache of the same size
+        return {"maxsize": self.maxsize, "ttl": self.ttl}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def info(self) -> CacheInfo:
+        """
+        Counters of the cache. Calls that waited for the same call in flight count as hits,
+        expired results as evictions.
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions, len(self._entries), self.maxsize)
+
+    def clear(self) -> None:
+        """
+        Drop all results, counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def wrap(self, provider: Callable, name: Hashable = None) -> Callable:
+        """
+        ``provider`` with its results cached in this cache under ``name``, so that one cache
+        can be shared by several providers. Coroutine function providers stay coroutine functions.
+        """
+        if inspect.iscoroutinefunction(provider):
+            @functools.wraps(provider)
+            async def cached(payload):
+                return await self._acall(provider, name, payload)
+        else:
+            @functools.wraps(provider)
+            def cached(payload):
+                return self._call(provider, name, payload)
+
+        cached.cache = self
+        return cached
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        The cached result of ``key`` if there is one. Call with the lock held.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, result = entry
+            if expires > self._timer():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return True, result
+            del self._entries[key]
+            self._evictions += 1
+        return False, None
+
+    def _store(self, key: Hashable, result) -> Any:
+        """
+        Caches a copy of ``result`` and returns the copy.
+        """
+        expires = float("inf") if self.ttl is None else self._timer() + self.ttl
+        result = copy_payload(result)
+        with self._lock:
+            self._entries[key] = (expires, result)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return result
+
+    def _call(self, provider: Callable, name: Hashable, payload):
+        digest = payload_key(payload)
+        if digest is None:
+            return provider(payload)
+        key = (name, digest)
+        with self._lock:
+            found, result = self._lookup(key)
+            if found:
+                return copy_payload(result)
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._misses += 1
+            else:
+                self._hits += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy_payload(call.result)
+
+        try:
+            result = provider(payload)
+            call.result = self._store(key, result)
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def _acall(self, provider: Callable, name: Hashable, payload):
+        digest = payload_key(payload)
+        if digest is None:
+            return await provider(payload)
+        key = (name, digest)
+        # Tasks can only be awaited on their loop
+        task_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            found, result = self._lookup(key)
+            if found:
+                return copy_payload(result)
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = asyncio.ensure_future(provider(payload))
+                task.add_done_callback(functools.partial(self._task_done, task_key))
+                self._misses += 1
+            else:
+                self._hits += 1
+
+        # Cancelling a caller does not cancel the call others wait for
+        result = await asyncio.shield(task)
+        return copy_payload(result)
+
+    def _task_done(self, task_key: Tuple[Any, Hashable], task: "asyncio.Future") -> None:
+        with self._lock:
+            del self._tasks[task_key]
+        if not task.cancelled() and task.exception() is None:
+            self._store(task_key[1], task.result())
@@ -1,17 +1,48 @@
+import bisect
+import collections
 import datetime as dt
-from typing import Any, Callable, Dict
+import functools
+import operator
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Pattern, Tuple
 
 import dataclasses
 from bidict import bidict
-from jsonpath_ng import parse as parse_jsonpath
 
 from .base import Node
+from .jsonpath import compile_path
 
 
 class _OperatorDef:
-    def __init__(self, impl: Callable = None):
+    """
+    Definition of a Choice Rule operator.
+
+    Operators that compare the variable with a value are given by ``compare`` and ``coerce``:
+    the value of the rule is coerced (or converted by ``prepare`` if given) once, when the rule
+    is compiled, and the variable on every evaluation unless it already is of one of ``types``.
+    The ``*Path`` variants (``path=True``) compare the variable with the value at another path
+    of the input, coerced the same way.
+
+    Operators that test the variable (``IsNull`` and the like) are given by ``test``,
+    they match if the result of the test is the boolean value of the rule.
+    """
+
+    def __init__(
+        self,
+        compare: Callable = None,
+        coerce: Callable = None,
+        types: Tuple[type, ...] = (),
+        test: Callable[[Any], bool] = None,
+        prepare: Callable = None,
+        path: bool = False,
+    ):
         self.name = None
-        self.impl = impl
+        self.compare = compare
+        self.coerce = coerce
+        self.types = types
+        self.test = test
+        self.prepare = prepare or coerce
+        self.path = path
 
     def __set_name__(self, owner, name):
         self.name = name
@@ -20,6 +51,32 @@ class _OperatorDef:
     def __get__(self, instance, owner):
         return self
 
+    def compile(self, value) -> Callable[[Any], bool]:
+        """
+        Returns a function of the value of the variable that tells whether it matches ``value``.
+        Not available for ``IsPresent`` and the ``*Path`` variants, which need the whole input.
+        """
+        if self.test is not None:
+            test, expected = self.test, bool(value)
+            return lambda x: test(x) is expected
+
+        compare, coerce, types = self.compare, self.coerce, self.types
+        value = self.prepare(value)
+
+        if types:
+            def matches(x):
+                if type(x) in types:
+                    return compare(x, value)
+                return compare(coerce(x), value)
+        else:
+            def matches(x):
+                return compare(coerce(x), value)
+
+        return matches
+
+    def impl(self, value, x) -> bool:
+        return self.compile(value)(x)
+
 
 def to_bool(x):
     return bool(x)
@@ -34,41 +91,367 @@ def to_numeric(x):
         return float(x)
 
 
-def to_timestamp(x):
+def to_datetime(x) -> dt.datetime:
+    """
+    Timezone-aware datetime of an ISO 8601 timestamp such as ``2016-03-14T01:59:00Z``.
+    Timestamps without a time zone are in UTC.
+    """
+    if not isinstance(x, dt.datetime):
+        if x.endswith(("Z", "z")):
+            x = x[:-1] + "+00:00"
+        x = dt.datetime.fromisoformat(x)
+    if x.tzinfo is None:
+        x = x.replace(tzinfo=dt.timezone.utc)
+    return x
+
+
+GLOB_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=GLOB_CACHE_SIZE)
+def compile_glob(pattern: str) -> Pattern:
+    """
+    Compiles a ``StringMatches`` pattern into a regular expression.
+
+    ``*`` matches any sequence of characters, ``\\*`` a literal ``*`` and ``\\\\`` a literal backslash.
+    """
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "\\" and i + 1 < n and pattern[i + 1] in "*\\":
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        parts.append(".*" if c == "*" else re.escape(c))
+        i += 1
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def matches_glob(x: str, pattern: Pattern) -> bool:
+    return pattern.fullmatch(x) is not None
+
+
+def is_boolean(x) -> bool:
+    return isinstance(x, bool)
+
+
+def is_numeric(x) -> bool:
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+
+def is_timestamp(x) -> bool:
     if isinstance(x, dt.datetime):
-        return x.isoformat()
-    return dt.datetime.fromisoformat(x).isoformat()
+        return True
+    if not isinstance(x, str) or "T" not in x:
+        return False
+    try:
+        to_datetime(x)
+    except ValueError:
+        return False
+    return True
+
+
+_NUMBERS = (int, float)
 
 
 class Operators:
     ALL: Dict[str, _OperatorDef] = {}
 
     And = _OperatorDef()
-    IsBoolean = _OperatorDef(lambda a: isinstance(a, bool) or a.tolower() in ['true', 't', '1', 'false', 'f', '0'])
-    IsNull = _OperatorDef(lambda a: a is None)
-    IsNumeric = _OperatorDef(lambda a: isinstance(a, (int, float, complex)) or a.isnumeric())
-    IsPresent = _OperatorDef(lambda a: None)  # TODO
-    IsString = _OperatorDef(lambda a: isinstance(a, str))
-    IsTimestamp = _OperatorDef(lambda a: None)  # TODO
-    BooleanEquals = _OperatorDef(lambda a, x: to_bool(x) is a)
+    IsBoolean = _OperatorDef(test=is_boolean)
+    IsNull = _OperatorDef(test=lambda a: a is None)
+    IsNumeric = _OperatorDef(test=is_numeric)
+    IsPresent = _OperatorDef()  # evaluated in Operator.compile_matcher, it does not extract the variable
+    IsString = _OperatorDef(test=lambda a: isinstance(a, str))
+    IsTimestamp = _OperatorDef(test=is_timestamp)
+    BooleanEquals = _OperatorDef(operator.is_, to_bool, (bool,))
+    BooleanEqualsPath = _OperatorDef(operator.is_, to_bool, (bool,), path=True)
     Not = _OperatorDef()
-    NumericEquals = _OperatorDef(lambda a, x: to_numeric(x) == a)
-    NumericGreaterThan = _OperatorDef(lambda a, x: to_numeric(x) > a)
-    NumericGreaterThanEquals = _OperatorDef(lambda a, x: to_numeric(x) >= a)
-    NumericLessThan = _OperatorDef(lambda a, x: to_numeric(x) < a)
-    NumericLessThanEquals = _OperatorDef(lambda a, x: to_numeric(x) <= a)
+    NumericEquals = _OperatorDef(operator.eq, to_numeric, _NUMBERS)
+    NumericEqualsPath = _OperatorDef(operator.eq, to_numeric, _NUMBERS, path=True)
+    NumericGreaterThan = _OperatorDef(operator.gt, to_numeric, _NUMBERS)
+    NumericGreaterThanPath = _OperatorDef(operator.gt, to_numeric, _NUMBERS, path=True)
+    NumericGreaterThanEquals = _OperatorDef(operator.ge, to_numeric, _NUMBERS)
+    NumericGreaterThanEqualsPath = _OperatorDef(operator.ge, to_numeric, _NUMBERS, path=True)
+    NumericLessThan = _OperatorDef(operator.lt, to_numeric, _NUMBERS)
+    NumericLessThanPath = _OperatorDef(operator.lt, to_numeric, _NUMBERS, path=True)
+    NumericLessThanEquals = _OperatorDef(operator.le, to_numeric, _NUMBERS)
+    NumericLessThanEqualsPath = _OperatorDef(operator.le, to_numeric, _NUMBERS, path=True)
     Or = _OperatorDef()
-    StringEquals = _OperatorDef(lambda a, x: str(x) == a)
-    StringGreaterThan = _OperatorDef(lambda a, x: str(x) > a)
-    StringGreaterThanEquals = _OperatorDef(lambda a, x: str(x) >= a)
-    StringLessThan = _OperatorDef(lambda a, x: str(x) < a)
-    StringLessThanEquals = _OperatorDef(lambda a, x: str(x) <= a)
-    StringMatches = _OperatorDef(lambda a, x: None)  # TODO
-    TimestampEquals = _OperatorDef(lambda a, x: to_timestamp(x) == a)
-    TimestampGreaterThan = _OperatorDef(lambda a, x: to_timestamp(x) > a)
-    TimestampGreaterThanEquals = _OperatorDef(lambda a, x: to_timestamp(x) >= a)
-    TimestampLessThan = _OperatorDef(lambda a, x: to_timestamp(x) < a)
-    TimestampLessThanEquals = _OperatorDef(lambda a, x: to_timestamp(x) <= a)
+    StringEquals = _OperatorDef(operator.eq, str, (str,))
+    StringEqualsPath = _OperatorDef(operator.eq, str, (str,), path=True)
+    StringGreaterThan = _OperatorDef(operator.gt, str, (str,))
+    StringGreaterThanPath = _OperatorDef(operator.gt, str, (str,), path=True)
+    StringGreaterThanEquals = _OperatorDef(operator.ge, str, (str,))
+    StringGreaterThanEqualsPath = _OperatorDef(operator.ge, str, (str,), path=True)
+    StringLessThan = _OperatorDef(operator.lt, str, (str,))
+    StringLessThanPath = _OperatorDef(operator.lt, str, (str,), path=True)
+    StringLessThanEquals = _OperatorDef(operator.le, str, (str,))
+    StringLessThanEqualsPath = _OperatorDef(operator.le, str, (str,), path=True)
+    StringMatches = _OperatorDef(matches_glob, str, (str,), prepare=compile_glob)
+    TimestampEquals = _OperatorDef(operator.eq, to_datetime)
+    TimestampEqualsPath = _OperatorDef(operator.eq, to_datetime, path=True)
+    TimestampGreaterThan = _OperatorDef(operator.gt, to_datetime)
+    TimestampGreaterThanPath = _OperatorDef(operator.gt, to_datetime, path=True)
+    TimestampGreaterThanEquals = _OperatorDef(operator.ge, to_datetime)
+    TimestampGreaterThanEqualsPath = _OperatorDef(operator.ge, to_datetime, path=True)
+    TimestampLessThan = _OperatorDef(operator.lt, to_datetime)
+    TimestampLessThanPath = _OperatorDef(operator.lt, to_datetime, path=True)
+    TimestampLessThanEquals = _OperatorDef(operator.le, to_datetime)
+    TimestampLessThanEqualsPath = _OperatorDef(operator.le, to_datetime, path=True)
+
+
+# Marks a shared variable that has not been extracted yet in the current evaluation.
+_UNSET = object()
+
+
+def shared_variables(operators: Iterable["Operator"], reads: Iterable[str] = ()) -> Dict[str, int]:
+    """
+    Variables read by more than one of the comparisons in ``operators`` (and ``reads``), mapped to
+    the slots in which their values are kept during one evaluation.
+    """
+    counts = collections.Counter(reads)
+    stack = list(operators)
+    while stack:
+        op = stack.pop()
+        if op.name in ("And", "Or"):
+            stack.extend(op.value)
+        elif op.name == "Not":
+            stack.append(op.value)
+        elif op.name != "IsPresent":
+            counts[op.variable] += 1
+    shared = [variable for variable, count in counts.items() if count > 1]
+    return {variable: slot for slot, variable in enumerate(shared)}
+
+
+# Consecutive rules on the same variable that are dispatched through an index rather
+# than tried one by one when there are at least this many of them.
+INDEX_MIN_RULES = 8
+
+# Returned by the lookup of an indexed group of rules when none of them matches.
+_NO_MATCH = object()
+
+# Kinds of indexable rules: the equality kinds are looked up in a dict, numeric ranges by bisection.
+_STRING = "string"
+_BOOLEAN = "boolean"
+_NUMERIC = "numeric"
+
+_INDEXABLE = {
+    "StringEquals": _STRING,
+    "BooleanEquals": _BOOLEAN,
+    "NumericEquals": _NUMERIC,
+    "NumericGreaterThan": _NUMERIC,
+    "NumericGreaterThanEquals": _NUMERIC,
+    "NumericLessThan": _NUMERIC,
+    "NumericLessThanEquals": _NUMERIC,
+}
+
+
+def _interval(op: "Operator") -> Tuple:
+    """
+    The values matched by a numeric comparison as ``(low, low_closed, high, high_closed)``,
+    ``None`` for an unbounded side.
+    """
+    value = to_numeric(op.value)
+    if op.name == "NumericEquals":
+        return value, True, value, True
+    if op.name in ("NumericGreaterThan", "NumericGreaterThanEquals"):
+        return value, op.name == "NumericGreaterThanEquals", None, False
+    return None, False, value, op.name == "NumericLessThanEquals"
+
+
+def _intersect(a: Tuple, b: Tuple) -> Tuple:
+    low, low_closed, high, high_closed = a
+    if b[0] is not None and (low is None or b[0] > low or (b[0] == low and not b[1])):
+        low, low_closed = b[0], b[1]
+    if b[2] is not None and (high is None or b[2] < high or (b[2] == high and not b[3])):
+        high, high_closed = b[2], b[3]
+    return low, low_closed, high, high_closed
+
+
+def _index_entry(op: "Operator") -> Optional[Tuple[str, str, List]]:
+    """
+    ``(variable, kind, entries)`` of a rule that can be indexed, ``None`` if it cannot.
+
+    Indexable rules are single equality or numeric comparisons, an ``And`` of numeric comparisons
+    of the same variable (a range) and an ``Or`` of comparisons of the same kind and variable.
+    ``entries`` are the coerced values of equality comparisons or the intervals of numeric ones.
+    """
+    if op.name in _INDEXABLE:
+        kind = _INDEXABLE[op.name]
+        if kind == _NUMERIC:
+            return op.variable, kind, [_interval(op)]
+        return op.variable, kind, [Operators.ALL[op.name].coerce(op.value)]
+
+    if op.name in ("And", "Or") and op.value:
+        entries = [_index_entry(item) if item.name in _INDEXABLE else None for item in op.value]
+        if None in entries or len({(variable, kind) for variable, kind, _ in entries}) != 1:
+            return None
+        variable, kind, _ = entries[0]
+        if op.name == "Or":
+            return variable, kind, [entry for _, _, item_entries in entries for entry in item_entries]
+        if kind != _NUMERIC:
+            return None
+        interval = entries[0][2][0]
+        for _, _, (item_interval,) in entries[1:]:
+            interval = _intersect(interval, item_interval)
+        return variable, kind, [interval]
+
+    return None
+
+
+def _index_group(variable: str, kind: str, rules: List[Tuple[List, Any]], slots: Dict[str, int]) -> Callable:
+    """
+    Compiles a group of consecutive rules ``(entries, outcome)`` on the same variable into
+    a function of ``(input, values)`` that returns the outcome of the first rule that matches
+    or ``_NO_MATCH``.
+    """
+    get = compile_path(variable).get
+    slot = slots.get(variable)
+
+    if slot is None:
+        extract = lambda input, values: get(input)  # noqa: E731
+    else:
+        def extract(input, values):
+            x = values[slot]
+            if x is _UNSET:
+                x = values[slot] = get(input)
+            return x
+
+    points = kind == _NUMERIC and all(
+        low is not None and low == high and low_closed and high_closed
+        for entries, _ in rules
+        for low, low_closed, high, high_closed in entries
+    )
+    if kind != _NUMERIC or points:
+        table = {}
+        for entries, outcome in rules:
+            for entry in entries:
+                table.setdefault(entry if kind != _NUMERIC else entry[0], outcome)
+        lookup = table.get
+
+        if kind == _STRING:
+            def find_string(input, values):
+                x = extract(input, values)
+                return lookup(x if type(x) is str else str(x), _NO_MATCH)
+
+            return find_string
+
+        if kind == _BOOLEAN:
+            return lambda input, values: lookup(to_bool(extract(input, values)), _NO_MATCH)
+
+        def find_number(input, values):
+            x = extract(input, values)
+            if type(x) not in _NUMBERS:
+                x = to_numeric(x)
+            if x != x:
+                return _NO_MATCH
+            return lookup(x, _NO_MATCH)
+
+        return find_number
+
+    # The bounds of all intervals split the number line into the bounds themselves and the open gaps
+    # between them: region 2 * i + 1 is bounds[i], region 2 * i is the gap before it.
+    # Each region is matched by the same rules throughout, it is marked with the outcome of the first one.
+    bounds = sorted({bound for entries, _ in rules for low, _, high, _ in entries for bound in (low, high)} - {None})
+    positions = {bound: i for i, bound in enumerate(bounds)}
+    regions = [_NO_MATCH] * (2 * len(bounds) + 1)
+    for entries, outcome in reversed(rules):
+        for low, low_closed, high, high_closed in reversed(entries):
+            first = 0 if low is None else 2 * positions[low] + (1 if low_closed else 2)
+            last = len(regions) - 1 if high is None else 2 * positions[high] + (1 if high_closed else 0)
+            if first <= last:
+                regions[first:last + 1] = [outcome] * (last - first + 1)
+
+    n = len(bounds)
+
+    def find_range(input, values):
+        x = extract(input, values)
+        if type(x) not in _NUMBERS:
+            x = to_numeric(x)
+        if x != x:
+            return _NO_MATCH
+        i = bisect.bisect_left(bounds, x)
+        if i < n and bounds[i] == x:
+            return regions[2 * i + 1]
+        return regions[2 * i]
+
+    return find_range
+
+
+def compile_choices(operators: List["Operator"], outcomes: Iterable, default) -> Callable[[Any], Any]:
+    """
+    Returns a function of the input of a Choice state that returns the outcome of the first
+    of ``operators`` that matches the input, or ``default`` if none does.
+
+    Variables read by several operators are extracted from the input at most once per evaluation.
+    Runs of at least ``INDEX_MIN_RULES`` consecutive equality or numeric range rules on the same
+    variable are looked up in a dict or by bisection instead of being tried one by one.
+    """
+    outcomes = list(outcomes)
+
+    # Split the rules into runs of indexable rules of the same variable and kind, and the rest.
+    runs = []
+    for op, outcome in zip(operators, outcomes):
+        entry = _index_entry(op)
+        key = entry[:2] if entry is not None else None
+        if key is not None and runs and runs[-1][0] == key:
+            runs[-1][1].append((op, entry[2], outcome))
+        else:
+            runs.append((key, [(op, entry[2] if entry else None, outcome)]))
+
+    groups = []
+    for key, rules in runs:
+        if key is not None and len(rules) >= INDEX_MIN_RULES:
+            groups.append((key, rules))
+        else:
+            groups.extend((None, [rule]) for rule in rules)
+
+    linear = [rules[0][0] for key, rules in groups if key is None]
+    slots = shared_variables(linear, [key[0] for key, _ in groups if key is not None])
+
+    steps = []
+    for key, rules in groups:
+        if key is None:
+            op, _, outcome = rules[0]
+            steps.append((op.compile_matcher(slots), outcome))
+        else:
+            steps.append((_index_group(*key, [(entries, outcome) for _, entries, outcome in rules], slots), _NO_MATCH))
+    steps = tuple(steps)
+    unset = [_UNSET] * len(slots)
+
+    if len(steps) == len(operators):
+        if not slots:
+            def choose(input):
+                for matches, outcome in steps:
+                    if matches(input, None):
+                        return outcome
+                return default
+
+            return choose
+
+        def choose_shared(input):
+            values = unset.copy()
+            for matches, outcome in steps:
+                if matches(input, values):
+                    return outcome
+            return default
+
+        return choose_shared
+
+    def choose_indexed(input):
+        values = unset.copy()
+        for matches, outcome in steps:
+            if outcome is _NO_MATCH:
+                found = matches(input, values)
+                if found is not _NO_MATCH:
+                    return found
+            elif matches(input, values):
+                return outcome
+        return default
+
+    return choose_indexed
 
 
 @dataclasses.dataclass
@@ -89,6 +472,9 @@ class Operator(Node):
 
     def __post_init__(self):
         assert self.name in Operators.ALL
+        self._variable = compile_path(self.variable) if self.variable else None
+        self._value_path = compile_path(self.value) if Operators.ALL[self.name].path else None
+        self._matches = compile_choices([self], (True,), False)
 
     @classmethod
     def parse_dict(cls, d: Dict, fields: Dict) -> None:
@@ -116,20 +502,113 @@ class Operator(Node):
         else:
             c[self.name] = self.value
 
-    def matches(self, input) -> bool:
+    def compile_matcher(self, slots: Dict[str, int] = None) -> Callable[[Any, Optional[List]], bool]:
+        """
+        Compiles the operator into a function of ``(input, values)`` that tells whether the input matches.
+
+        ``slots`` maps variables shared with other operators to indexes in ``values``,
+        the list in which their extracted values are kept during one evaluation
+        (see ``compile_choices``).
+        """
         if self.name == "Not":
-            return not self.value[0].matches(input)
+            inner = self.value.compile_matcher(slots)
+
+            def matches_not(input, values):
+                return not inner(input, values)
+
+            return matches_not
+
+        if self.name in ("And", "Or"):
+            parts = tuple(op.compile_matcher(slots) for op in self.value)
+
+            if self.name == "And":
+                def matches_all(input, values):
+                    for part in parts:
+                        if not part(input, values):
+                            return False
+                    return True
+
+                return matches_all
 
-        elif self.name == "Or":
-            return any(v.matches(input) for v in self.value)
+            def matches_any(input, values):
+                for part in parts:
+                    if part(input, values):
+                        return True
+                return False
 
-        elif self.name == "And":
-            return all(v.matches(input) for v in self.value)
+            return matches_any
 
+        op_def = Operators.ALL[self.name]
+        get = self._variable.get
+        slot = slots.get(self.variable) if slots else None
+        expected = bool(self.value)
+
+        if self.name == "IsPresent":
+            find = self._variable.find
+            return lambda input, values: bool(find(input)) is expected
+
+        if slot is None:
+            extract = lambda input, values: get(input)  # noqa: E731
         else:
-            path = parse_jsonpath(self.variable)
-            check_value = path.find(input)[0].value
-            return Operators.ALL[self.name].impl(self.value, check_value)
+            def extract(input, values):
+                x = values[slot]
+                if x is _UNSET:
+                    x = values[slot] = get(input)
+                return x
+
+        if op_def.test is not None:
+            test = op_def.test
+            return lambda input, values: test(extract(input, values)) is expected
+
+        if op_def.path:
+            compare, coerce, types = op_def.compare, op_def.coerce, op_def.types
+            get_other = self._value_path.get
+
+            def matches_path(input, values):
+                x = extract(input, values)
+                other = get_other(input)
+                if type(x) not in types:
+                    x = coerce(x)
+                if type(other) not in types:
+                    other = coerce(other)
+                return compare(x, other)
+
+            return matches_path
+
+        # Comparison and extraction are inlined here rather than calling the function
+        # returned by op_def.compile(), Choice states spend most of their time in these two functions.
+        compare, coerce, types = op_def.compare, op_def.coerce, op_def.types
+        value = op_def.prepare(self.value)
+
+        if slot is None:
+            def matches(input, values):
+                x = get(input)
+                if type(x) in types:
+                    return compare(x, value)
+                return compare(coerce(x), value)
+
+            return matches
+
+        def matches_shared(input, values):
+            x = values[slot]
+            if x is _UNSET:
+                x = values[slot] = get(input)
+            if type(x) in types:
+                return compare(x, value)
+            return compare(coerce(x), value)
+
+        return matches_shared
+
+    def matches(self, input) -> bool:
+        return self._matches(input)
+
+    def matches_many(self, inputs: Iterable) -> List[bool]:
+        """
+        Tells for each of ``inputs`` whether it matches, evaluating the operator
+        over all of them at once with NumPy if it is installed.
+        """
+        from .vectorized import matches_many
+        return matches_many(self, inputs)
 
 
 @dataclasses.dataclass
@@ -150,6 +629,9 @@ class ChoiceRule(Node):
     def matches(self, input) -> bool:
         return self.operator.matches(input)
 
+    def matches_many(self, inputs: Iterable) -> List[bool]:
+        return self.operator.matches_many(inputs)
+
     @classmethod
     def parse_dict(cls, d: Dict, fields: Dict) -> None:
         fields["operator"] = Operator.parse(d)
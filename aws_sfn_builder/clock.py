@@ -0,0 +1,161 @@
+"""
+Clocks used by runners to wait, for example between the attempts of a Retry.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import threading
+import time
+from typing import ContextManager, List, Optional
+
+
+class Clock:
+    """
+    Real time.
+    """
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def sleep_until(self, when: float) -> None:
+        self.sleep(when - self.time())
+
+    async def asleep(self, seconds: float) -> None:
+        await asyncio.sleep(max(seconds, 0))
+
+    def timelines(self, limit: int) -> "Timelines":
+        """
+        The timelines of runs started concurrently, at most ``limit`` at a time (see ``Timelines``).
+        Runs in real time share the one timeline there is.
+        """
+        return _REAL_TIMELINES
+
+
+class Timelines:
+    """
+    Timelines of concurrent runs, of Parallel branches or Map iterations, on a ``VirtualClock``.
+
+    Each run waits on a timeline of its own, which starts when one of ``limit`` slots is free:
+    at the time of the fan-out for the first ``limit`` runs, and when an earlier run has ended
+    for the others. ``join`` then moves the timeline of the caller to the end of the last run,
+    so that concurrent waits take as long as the longest of them rather than their sum.
+    """
+
+    def __init__(self, clock: "VirtualClock", limit: int):
+        self._clock = clock
+        self._end = clock.time()
+        self._slots: List[float] = [self._end] * max(limit, 1)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def run(self):
+        with self._lock:
+            start = heapq.heappop(self._slots)
+        end = start
+        try:
+            with self._clock.timeline(start):
+                try:
+                    yield
+                finally:
+                    end = self._clock.time()
+        finally:
+            with self._lock:
+                heapq.heappush(self._slots, end)
+                self._end = max(self._end, end)
+
+    def join(self) -> None:
+        self._clock.sleep_until(self._end)
+
+
+class _RealTimelines(Timelines):
+    def __init__(self):
+        pass
+
+    def run(self) -> ContextManager:
+        return contextlib.nullcontext()
+
+    def join(self) -> None:
+        pass
+
+
+_REAL_TIMELINES = _RealTimelines()
+
+
+class VirtualClock(Clock):
+    """
+    Simulated time that jumps forward instead of waiting, so that executions that
+    back off or wait for minutes complete instantly:
+
+        clock = VirtualClock()
+        runner = Runner(clock=clock)
+        runner.run(state_machine)
+        print(f"The execution would have taken {clock.time()} seconds")
+
+    Sleeps of one execution are added up. Branches of Parallel states and iterations of Map states
+    run concurrently by a runner wait on timelines of their own (see ``Timelines``), the state waits
+    for as long as the longest of them. Sleeps of separate executions run at the same time are added up,
+    use ``Scheduler`` to simulate many executions at once.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._now = start
+        self._lock = threading.Lock()
+        self._timeline: "contextvars.ContextVar[Optional[List[float]]]" = contextvars.ContextVar(
+            "virtual_timeline", default=None,
+        )
+
+    def __getstate__(self):
+        return {"_now": self.time()}
+
+    def __setstate__(self, state):
+        self.__init__(state["_now"])
+
+    def time(self) -> float:
+        timeline = self._timeline.get()
+        if timeline is not None:
+            return timeline[0]
+        return self._now
+
+    def advance(self, seconds: float) -> None:
+        timeline = self._timeline.get()
+        if timeline is not None:
+            timeline[0] += max(seconds, 0)
+            return
+        with self._lock:
+            self._now += max(seconds, 0)
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    def sleep_until(self, when: float) -> None:
+        timeline = self._timeline.get()
+        if timeline is not None:
+            timeline[0] = max(timeline[0], when)
+            return
+        with self._lock:
+            self._now = max(self._now, when)
+
+    @contextlib.contextmanager
+    def timeline(self, start: float):
+        """
+        Makes the sleeps in this context advance a timeline of their own, starting at ``start``,
+        instead of the one of the caller.
+        """
+        token = self._timeline.set([start])
+        try:
+            yield
+        finally:
+            self._timeline.reset(token)
+
+    def timelines(self, limit: int) -> Timelines:
+        return Timelines(self, limit)
+
+    async def asleep(self, seconds: float) -> None:
+        self.advance(seconds)
+        # Still give other executions on the loop a chance to run
+        await asyncio.sleep(0)
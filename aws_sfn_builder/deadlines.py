@@ -0,0 +1,255 @@
+"""
+Deadlines of provider calls: TimeoutSeconds and HeartbeatSeconds of Task states,
+and the time left to the execution (TimeoutSeconds of the state machine).
+
+Plain function providers are called with a deadline whenever there is one: TimeoutSeconds or
+HeartbeatSeconds of their Task state, or the time left to the execution. They run on a worker thread,
+which the caller stops waiting for once a deadline has passed. Worker threads are reused by later calls,
+so there are as many of them as calls running at the same time, not one per call. Threads cannot
+be stopped: a provider that hangs keeps its thread, but it no longer holds up the execution.
+``abandoned_calls`` counts the threads left running like this. Without any deadline, providers are
+called in the calling thread. Coroutine function providers are run as a task, which is cancelled
+when a deadline passes.
+
+Deadlines are measured in real time, the time left to the execution on the clock of the runner.
+"""
+import asyncio
+import contextlib
+import contextvars
+import queue
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from .clock import Clock
+from .errors import Errors, ExecutionTimedOut, StatesError
+
+# The clock and the deadline of the execution being run
+_execution: "contextvars.ContextVar[Optional[Tuple[Clock, float]]]" = contextvars.ContextVar(
+    "execution_deadline", default=None,
+)
+
+# Heartbeat of the provider being called
+_heartbeat: "contextvars.ContextVar[Optional[Callable[[], None]]]" = contextvars.ContextVar("heartbeat", default=None)
+
+# Number of provider calls that were stopped waiting for and are still running
+_abandoned = 0
+_abandoned_lock = threading.Lock()
+
+
+def heartbeat() -> None:
+    """
+    Reports that the provider being called is still working. A Task state with HeartbeatSeconds
+    fails with States.HeartbeatTimeout if its provider does not call it often enough.
+    Does nothing when called outside of such a provider.
+    """
+    beat = _heartbeat.get()
+    if beat is not None:
+        beat()
+
+
+@contextlib.contextmanager
+def execution_deadline(clock: Clock, deadline: Optional[float]):
+    """
+    Bounds the provider calls made in this context by ``deadline`` on ``clock``, if there is one.
+    """
+    if deadline is None:
+        yield
+        return
+    token = _execution.set((clock, deadline))
+    try:
+        yield
+    finally:
+        _execution.reset(token)
+
+
+# Seconds a worker thread of provider calls waits for another call before it exits
+WORKER_IDLE_SECONDS = 10
+
+
+class _Workers:
+    """
+    Daemon threads running provider calls, a new one only when none of them is idle.
+    Daemon threads do not keep the interpreter from exiting while a provider hangs.
+    """
+
+    def __init__(self):
+        self._calls = queue.SimpleQueue()
+        self._idle = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable, *args) -> None:
+        with self._lock:
+            spawn = self._idle == 0
+            if not spawn:
+                self._idle -= 1
+        self._calls.put((func, args))
+        if spawn:
+            threading.Thread(target=self._work, name="aws-sfn-builder-deadline", daemon=True).start()
+
+    def _work(self) -> None:
+        while True:
+            try:
+                func, args = self._calls.get(timeout=WORKER_IDLE_SECONDS)
+            except queue.Empty:
+                with self._lock:
+                    # Unless a call has been submitted for this thread meanwhile
+                    if self._idle > 0:
+                        self._idle -= 1
+                        return
+                continue
+            func(*args)
+            with self._lock:
+                self._idle += 1
+
+
+_workers = _Workers()
+
+
+def abandoned_calls() -> int:
+    """
+    Number of provider calls whose deadline passed and whose threads are still running.
+    """
+    return _abandoned
+
+
+def _time_left() -> Optional[float]:
+    execution = _execution.get()
+    if execution is None:
+        return None
+    clock, deadline = execution
+    return deadline - clock.time()
+
+
+class _Deadlines:
+    """
+    The deadlines of one provider call.
+    """
+
+    def __init__(
+        self, timeout_seconds: Optional[float], heartbeat_seconds: Optional[float], time_left: Optional[float],
+    ):
+        now = time.monotonic()
+        self.timeout_seconds = timeout_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.task_end = now + timeout_seconds if timeout_seconds is not None else None
+        self.execution_end = now + time_left if time_left is not None else None
+        self.beat_at = now
+
+    def beat(self) -> None:
+        self.beat_at = time.monotonic()
+
+    def check(self) -> float:
+        """
+        Raises the error of the first deadline that has passed,
+        otherwise returns the seconds to the next deadline.
+        """
+        now = time.monotonic()
+        ends = []
+        if self.task_end is not None:
+            if now >= self.task_end:
+                raise StatesError(Errors.Timeout, f"The task did not complete in {self.timeout_seconds} seconds")
+            ends.append(self.task_end)
+        if self.heartbeat_seconds is not None:
+            heartbeat_end = self.beat_at + self.heartbeat_seconds
+            if now >= heartbeat_end:
+                raise StatesError(
+                    Errors.HeartbeatTimeout, f"The task sent no heartbeat for {self.heartbeat_seconds} seconds",
+                )
+            ends.append(heartbeat_end)
+        if self.execution_end is not None:
+            if now >= self.execution_end:
+                raise ExecutionTimedOut("The execution ran out of time while the task was running")
+            ends.append(self.execution_end)
+        return min(ends) - now
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.abandoned = False
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+    def run(self, provider: Callable, payload) -> None:
+        global _abandoned
+        try:
+            self.result = provider(payload)
+        except BaseException as e:
+            self.error = e
+        finally:
+            with _abandoned_lock:
+                self.done.set()
+                if self.abandoned:
+                    _abandoned -= 1
+
+    def abandon(self) -> None:
+        """
+        Stop waiting for the call, counting it in ``abandoned_calls`` until it returns.
+        """
+        global _abandoned
+        with _abandoned_lock:
+            if not self.done.is_set():
+                self.abandoned = True
+                _abandoned += 1
+
+
+def call_with_deadlines(
+    provider: Callable, payload, timeout_seconds: float = None, heartbeat_seconds: float = None,
+) -> Any:
+    """
+    Calls ``provider`` with ``payload``, raising States.Timeout or States.HeartbeatTimeout
+    if it takes longer than ``timeout_seconds`` or does not send a heartbeat for ``heartbeat_seconds``,
+    and ``ExecutionTimedOut`` if the execution runs out of time first.
+
+    Without any deadline the provider is called in this thread.
+    """
+    time_left = _time_left()
+    if timeout_seconds is None and heartbeat_seconds is None and time_left is None:
+        return provider(payload)
+
+    deadlines = _Deadlines(timeout_seconds, heartbeat_seconds, time_left)
+    timeout = deadlines.check()
+    call = _Call()
+    context = contextvars.copy_context()
+    context.run(_heartbeat.set, deadlines.beat)
+    _workers.submit(context.run, call.run, provider, payload)
+    try:
+        while not call.done.wait(timeout):
+            timeout = deadlines.check()
+    except BaseException:
+        call.abandon()
+        raise
+    if call.error is not None:
+        raise call.error
+    return call.result
+
+
+async def acall_with_deadlines(
+    call: Callable[[], Awaitable], timeout_seconds: float = None, heartbeat_seconds: float = None,
+) -> Any:
+    """
+    Coroutine version of ``call_with_deadlines``, awaits ``call()`` which is cancelled
+    when a deadline passes.
+    """
+    time_left = _time_left()
+    if timeout_seconds is None and heartbeat_seconds is None and time_left is None:
+        return await call()
+
+    deadlines = _Deadlines(timeout_seconds, heartbeat_seconds, time_left)
+    timeout = deadlines.check()
+    token = _heartbeat.set(deadlines.beat)
+    try:
+        # The task runs in a copy of this context, with the heartbeat
+        task = asyncio.ensure_future(call())
+    finally:
+        _heartbeat.reset(token)
+    try:
+        while True:
+            done, _ = await asyncio.wait([task], timeout=timeout)
+            if done:
+                return task.result()
+            timeout = deadlines.check()
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,232 @@
+"""
+Errors of States Language and the Retry and Catch fields that handle them.
+"""
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+import dataclasses
+from bidict import bidict
+
+from .base import Node
+from .jsonpath import compile_path
+
+
+class Errors:
+    """
+    Namespace for the names of predefined errors.
+    """
+
+    ALL = "States.ALL"
+    DataLimitExceeded = "States.DataLimitExceeded"
+    Runtime = "States.Runtime"
+    HeartbeatTimeout = "States.HeartbeatTimeout"
+    Timeout = "States.Timeout"
+    TaskFailed = "States.TaskFailed"
+    Permissions = "States.Permissions"
+    ResultPathMatchFailure = "States.ResultPathMatchFailure"
+    ParameterPathFailure = "States.ParameterPathFailure"
+    BranchFailed = "States.BranchFailed"
+    NoChoiceMatched = "States.NoChoiceMatched"
+    IntrinsicFailure = "States.IntrinsicFailure"
+    ExceedToleratedFailureThreshold = "States.ExceedToleratedFailureThreshold"
+    ItemReaderFailed = "States.ItemReaderFailed"
+    ResultWriterFailed = "States.ResultWriterFailed"
+
+    # Errors that States.ALL does not match
+    _NOT_ALL = (DataLimitExceeded, Runtime)
+
+
+class StatesError(Exception):
+    """
+    An error with a States Language name and cause.
+
+    Providers may raise it to report a specific error to Retry and Catch, other
+    exceptions are reported with the name of their class as the error.
+    """
+
+    def __init__(self, error: str, cause: str = None):
+        super().__init__(error, cause)
+        self.error = error
+        self.cause = cause
+
+    def __str__(self):
+        if self.cause is None:
+            return self.error
+        return f"{self.error}: {self.cause}"
+
+
+class ExecutionTimedOut(StatesError):
+    """
+    Raised into the state being executed when the execution runs out of time (see ``deadlines``).
+    Retry and Catch of the state do not handle it, the runner fails the execution with States.Timeout.
+    """
+
+    def __init__(self, cause: str = None):
+        super().__init__(Errors.Timeout, cause)
+
+    def __reduce__(self):
+        return self.__class__, (self.cause,)
+
+
+class StateFailed(RuntimeError):
+    """
+    Raised by runners when a state fails with an error that is not caught,
+    or a branch of a Parallel or Map state ends in a Fail state.
+    Keeps the name and the cause of the error for outer Retry and Catch.
+    """
+
+    def __init__(self, message: str, error: str, cause: str = None, state: str = None):
+        super().__init__(message)
+        self.error = error
+        self.cause = cause
+        self.state = state
+
+    def __reduce__(self):
+        # Raised in worker processes of Runner(executor="process") and pickled back
+        return self.__class__, (self.args[0], self.error, self.cause, self.state)
+
+
+def describe_error(exc: BaseException) -> Tuple[str, Optional[str]]:
+    """
+    Returns the error name and the cause of an exception.
+    """
+    if isinstance(exc, (StatesError, StateFailed)):
+        return exc.error, exc.cause
+    return exc.__class__.__name__, str(exc)
+
+
+def error_matches(error_equals: List[str], error: str) -> bool:
+    """
+    Whether ``error`` is one of ``error_equals``, taking the wildcards
+    States.ALL and States.TaskFailed into account.
+    """
+    for name in error_equals:
+        if name == error:
+            return True
+        if name == Errors.ALL and error not in Errors._NOT_ALL:
+            return True
+        if name == Errors.TaskFailed and error not in Errors._NOT_ALL and error != Errors.Timeout:
+            return True
+    return False
+
+
+@dataclasses.dataclass
+class Retrier(Node):
+    _FIELDS = bidict(
+        **Node._FIELDS,
+        **{
+            "comment": "Comment",
+            "error_equals": "ErrorEquals",
+            "interval_seconds": "IntervalSeconds",
+            "max_attempts": "MaxAttempts",
+            "backoff_rate": "BackoffRate",
+            "max_delay_seconds": "MaxDelaySeconds",
+            "jitter_strategy": "JitterStrategy",
+        },
+    )
+
+    DEFAULT_INTERVAL_SECONDS = 1
+    DEFAULT_MAX_ATTEMPTS = 3
+    DEFAULT_BACKOFF_RATE = 2.0
+
+    type: str = "Retrier"
+    comment: str = None
+    error_equals: List[str] = dataclasses.field(default_factory=list)
+    interval_seconds: int = None
+    max_attempts: int = None
+    backoff_rate: float = None
+    max_delay_seconds: int = None
+    jitter_strategy: str = None
+
+    def matches(self, error: str) -> bool:
+        return error_matches(self.error_equals, error)
+
+    @property
+    def attempts(self) -> int:
+        """
+        Number of retries, MaxAttempts or its default.
+        """
+        return self.DEFAULT_MAX_ATTEMPTS if self.max_attempts is None else self.max_attempts
+
+    def delay(self, retry: int, rand=random.random) -> float:
+        """
+        Seconds to wait before retry number ``retry`` (starting from 1).
+        """
+        interval = self.DEFAULT_INTERVAL_SECONDS if self.interval_seconds is None else self.interval_seconds
+        backoff_rate = self.DEFAULT_BACKOFF_RATE if self.backoff_rate is None else self.backoff_rate
+        delay = interval * backoff_rate ** (retry - 1)
+        if self.max_delay_seconds is not None:
+            delay = min(delay, self.max_delay_seconds)
+        if self.jitter_strategy == "FULL":
+            delay *= rand()
+        return delay
+
+
+@dataclasses.dataclass
+class Catcher(Node):
+    _FIELDS = bidict(
+        **Node._FIELDS,
+        **{
+            "comment": "Comment",
+            "error_equals": "ErrorEquals",
+            "next": "Next",
+            "result_path": "ResultPath",
+        },
+    )
+
+    type: str = "Catcher"
+    comment: str = None
+    error_equals: List[str] = dataclasses.field(default_factory=list)
+    next: str = None
+    result_path: str = None
+
+    def __post_init__(self):
+        self._result_path = compile_path(self.result_path) if self.result_path else None
+
+    def matches(self, error: str) -> bool:
+        return error_matches(self.error_equals, error)
+
+    def get_output(self, input, error: str, cause: Optional[str]) -> Any:
+        """
+        The input of the state with the error output placed at ResultPath.
+        """
+        error_output: Dict[str, Any] = {"Error": error}
+        if cause is not None:
+            error_output["Cause"] = cause
+        if self._result_path is None:
+            return error_output
+        return self._result_path.assign(input, error_output)
+
+
+class Recovery:
+    """
+    Retry and Catch of one execution of a state, see ``Task.recover``.
+    """
+
+    __slots__ = ("retriers", "catchers", "retries")
+
+    def __init__(self, retriers: List[Retrier], catchers: List[Catcher]):
+        self.retriers = retriers
+        self.catchers = catchers
+        self.retries = [0] * len(retriers)
+
+    def recover(self, exc: BaseException) -> Tuple[Optional[float], Optional[Catcher], str, Optional[str]]:
+        """
+        Decide what to do after ``exc``: returns the delay before the next attempt
+        if it is to be retried, otherwise the catcher that catches it, if any,
+        along with the error name and cause.
+        """
+        error, cause = describe_error(exc)
+        if isinstance(exc, ExecutionTimedOut):
+            return None, None, error, cause
+        for i, retrier in enumerate(self.retriers):
+            if retrier.matches(error):
+                if self.retries[i] < retrier.attempts:
+                    self.retries[i] += 1
+                    return retrier.delay(self.retries[i]), None, error, cause
+                # The first matching retrier decides, even when it has run out of attempts.
+                break
+        for catcher in self.catchers:
+            if catcher.matches(error):
+                return None, catcher, error, cause
+        return None, None, error, cause
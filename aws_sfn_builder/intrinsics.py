@@ -0,0 +1,499 @@
+"""
+Compilation of the intrinsic functions of States Language, the ``States.*`` expressions
+of ``.$`` fields of Parameters, ResultSelector and ItemSelector:
+
+    "message.$": "States.Format('Hello, {}', $.name)"
+    "batches.$": "States.ArrayPartition($.items, 4)"
+
+An expression is parsed once into a tree of getters ``get(input, context) -> value``,
+the same getters templates are made of. Arguments that do not reference paths are
+evaluated at compile time, and so are calls with only such arguments, unless the
+function is not deterministic (``States.UUID``, ``States.MathRandom``) or returns
+an array or an object that must be a new one on every call.
+
+Errors of the functions are raised as ``StatesError`` with ``States.IntrinsicFailure``
+and paths that match nothing with ``States.Runtime``, so that Retry and Catch handle them.
+"""
+import base64
+import functools
+import hashlib
+import json
+import random
+import re
+import uuid
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .errors import Errors, StatesError
+from .jsonpath import compile_path, PATH_CACHE_SIZE, PathNotFound
+from .lazy_json import ARRAY_TYPES, materialize, OBJECT_TYPES
+
+# A getter of a value: ``get(input, context) -> value``.
+Getter = Callable[[Any, Optional[Dict]], Any]
+
+PREFIX = "States."
+
+# Largest array States.ArrayRange may return.
+ARRAY_RANGE_LIMIT = 1000
+
+_FUNCTION_NAME = re.compile(r"States\.[A-Za-z0-9]+")
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][+-]?[0-9]+)?")
+_KEYWORDS = {"null": None, "true": True, "false": False}
+
+# Results of these types are the same object on every call and can be computed at compile time.
+_IMMUTABLE = (str, int, float, bool, type(None))
+
+
+def is_intrinsic(value) -> bool:
+    return isinstance(value, str) and value.startswith(PREFIX)
+
+
+class _Function(NamedTuple):
+    impl: Callable
+    min_args: int
+    max_args: Optional[int]
+    pure: bool = True
+
+
+def _array(value, name="argument") -> List:
+    if not isinstance(value, ARRAY_TYPES):
+        raise ValueError(f"expected an array as {name}, got {value!r}")
+    return value if isinstance(value, list) else list(value)
+
+
+def _string(value, name="argument") -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"expected a string as {name}, got {value!r}")
+    return value
+
+
+def _integer(value, name="argument") -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+        raise ValueError(f"expected an integer as {name}, got {value!r}")
+    return int(value)
+
+
+def _dumps(value, **options) -> str:
+    # Lazy objects and arrays are serialized as plain ones.
+    return json.dumps(value, separators=(",", ":"), default=materialize, **options)
+
+
+def _to_text(value) -> str:
+    return value if isinstance(value, str) else _dumps(value)
+
+
+def string_to_json(value):
+    return json.loads(_string(value))
+
+
+def json_to_string(value):
+    return _dumps(value)
+
+
+def array(*values):
+    return list(values)
+
+
+def array_partition(values, size):
+    values, size = _array(values), _integer(size, "chunk size")
+    if size <= 0:
+        raise ValueError(f"expected a positive chunk size, got {size}")
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def array_contains(values, value):
+    return value in _array(values)
+
+
+def array_range(start, end, step):
+    start, end, step = _integer(start, "start"), _integer(end, "end"), _integer(step, "step")
+    if step == 0:
+        raise ValueError("expected a non-zero step")
+    # The end is included.
+    values = range(start, end + (1 if step > 0 else -1), step)
+    if len(values) > ARRAY_RANGE_LIMIT:
+        raise ValueError(f"the range has {len(values)} items, at most {ARRAY_RANGE_LIMIT} are allowed")
+    return list(values)
+
+
+def array_get_item(values, index):
+    values, index = _array(values), _integer(index, "index")
+    if not 0 <= index < len(values):
+        raise ValueError(f"index {index} is out of the bounds of an array of {len(values)} items")
+    return values[index]
+
+
+def array_length(values):
+    return len(_array(values))
+
+
+def array_unique(values):
+    unique = []
+    seen = set()
+    for value in _array(values):
+        key = _dumps(value, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            unique.append(value)
+    return unique
+
+
+def base64_encode(value):
+    return base64.b64encode(_string(value).encode("utf-8")).decode("ascii")
+
+
+def base64_decode(value):
+    return base64.b64decode(_string(value), validate=True).decode("utf-8")
+
+
+_HASH_ALGORITHMS = {
+    "MD5": "md5",
+    "SHA-1": "sha1",
+    "SHA-256": "sha256",
+    "SHA-384": "sha384",
+    "SHA-512": "sha512",
+}
+
+
+def hash_(data, algorithm):
+    try:
+        name = _HASH_ALGORITHMS[algorithm]
+    except (KeyError, TypeError):
+        raise ValueError(
+            f"unsupported hash algorithm {algorithm!r}, expected one of {', '.join(_HASH_ALGORITHMS)}"
+        ) from None
+    return hashlib.new(name, _to_text(data).encode("utf-8")).hexdigest()
+
+
+def json_merge(first, second, deep):
+    if not isinstance(first, OBJECT_TYPES) or not isinstance(second, OBJECT_TYPES):
+        raise ValueError(f"expected two objects, got {first!r} and {second!r}")
+    if deep is not False:
+        raise ValueError("only shallow merges are supported, the third argument must be false")
+    return {**first, **second}
+
+
+def math_random(start, end, seed=None):
+    start, end = _integer(start, "start"), _integer(end, "end")
+    if seed is None:
+        return random.randrange(start, end)
+    return random.Random(_integer(seed, "seed")).randrange(start, end)
+
+
+def math_add(first, second):
+    return _integer(first) + _integer(second)
+
+
+def string_split(value, delimiters):
+    value, delimiters = _string(value), _string(delimiters, "delimiters")
+    if not delimiters:
+        return [value]
+    return [part for part in re.split(f"[{re.escape(delimiters)}]", value) if part]
+
+
+def uuid_():
+    return str(uuid.uuid4())
+
+
+_FUNCTIONS: Dict[str, _Function] = {
+    # States.Format is compiled by _compile_format.
+    "States.StringToJson": _Function(string_to_json, 1, 1),
+    "States.JsonToString": _Function(json_to_string, 1, 1),
+    "States.Array": _Function(array, 0, None),
+    "States.ArrayPartition": _Function(array_partition, 2, 2),
+    "States.ArrayContains": _Function(array_contains, 2, 2),
+    "States.ArrayRange": _Function(array_range, 3, 3),
+    "States.ArrayGetItem": _Function(array_get_item, 2, 2),
+    "States.ArrayLength": _Function(array_length, 1, 1),
+    "States.ArrayUnique": _Function(array_unique, 1, 1),
+    "States.Base64Encode": _Function(base64_encode, 1, 1),
+    "States.Base64Decode": _Function(base64_decode, 1, 1),
+    "States.Hash": _Function(hash_, 2, 2),
+    "States.JsonMerge": _Function(json_merge, 3, 3),
+    "States.MathRandom": _Function(math_random, 2, 3, pure=False),
+    "States.MathAdd": _Function(math_add, 2, 2),
+    "States.StringSplit": _Function(string_split, 2, 2),
+    "States.UUID": _Function(uuid_, 0, 0, pure=False),
+}
+
+
+class _Constant(NamedTuple):
+    """
+    An argument known at compile time. ``raw`` is the source of string literals, with their escapes.
+    """
+    value: Any
+    raw: Optional[str] = None
+
+
+# An argument: a constant or a getter.
+_Argument = Any
+
+
+class _Parser:
+    """
+    Recursive descent parser of one expression.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.pos = 0
+
+    def error(self, message) -> ValueError:
+        return ValueError(f"Invalid intrinsic function {self.source!r} at position {self.pos}: {message}")
+
+    def skip_spaces(self):
+        while self.pos < len(self.source) and self.source[self.pos].isspace():
+            self.pos += 1
+
+    def peek(self) -> str:
+        return self.source[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        self.skip_spaces()
+        if self.peek() != char:
+            raise self.error(f"expected {char!r}")
+        self.pos += 1
+
+    def parse(self) -> _Argument:
+        self.skip_spaces()
+        call = self.call()
+        self.skip_spaces()
+        if self.pos != len(self.source):
+            raise self.error("unexpected characters after the function call")
+        return call
+
+    def call(self) -> _Argument:
+        match = _FUNCTION_NAME.match(self.source, self.pos)
+        if match is None:
+            raise self.error("expected a States.* function")
+        name = match.group()
+        self.pos = match.end()
+        self.expect("(")
+        args = []
+        self.skip_spaces()
+        if self.peek() == ")":
+            self.pos += 1
+        else:
+            while True:
+                args.append(self.argument())
+                self.skip_spaces()
+                if self.peek() == ",":
+                    self.pos += 1
+                elif self.peek() == ")":
+                    self.pos += 1
+                    break
+                else:
+                    raise self.error("expected ',' or ')'")
+        return _compile_call(name, args, self.error)
+
+    def argument(self) -> _Argument:
+        self.skip_spaces()
+        char = self.peek()
+        if char == "'":
+            return self.string()
+        if char == "$":
+            return self.path()
+        if self.source.startswith(PREFIX, self.pos):
+            return self.call()
+        match = _NUMBER.match(self.source, self.pos)
+        if match is not None:
+            self.pos = match.end()
+            text = match.group()
+            return _Constant(float(text) if match.group(1) or match.group(2) else int(text))
+        for keyword, value in _KEYWORDS.items():
+            if self.source.startswith(keyword, self.pos):
+                self.pos += len(keyword)
+                return _Constant(value)
+        raise self.error("expected a string, a number, a path or a function call")
+
+    def string(self) -> _Constant:
+        start = self.pos = self.pos + 1
+        while True:
+            char = self.peek()
+            if not char:
+                raise self.error("unterminated string")
+            if char == "\\":
+                self.pos += 2
+            elif char == "'":
+                break
+            else:
+                self.pos += 1
+        raw = self.source[start:self.pos]
+        self.pos += 1
+        return _Constant(re.sub(r"\\(.)", r"\1", raw), raw)
+
+    def path(self) -> Getter:
+        # Up to the next ',' or ')' that is not inside brackets.
+        start = self.pos
+        depth = 0
+        quote = None
+        while self.pos < len(self.source):
+            char = self.source[self.pos]
+            if quote is not None:
+                if char == "\\":
+                    self.pos += 1
+                elif char == quote:
+                    quote = None
+            elif char in "'\"" and depth:
+                quote = char
+            elif char == "[":
+                depth += 1
+            elif char == "]":
+                depth -= 1
+            elif char in ",)" and not depth:
+                break
+            self.pos += 1
+        return _path_getter(self.source[start:self.pos].strip())
+
+
+def _path_getter(value: str) -> Getter:
+    if value.startswith("$$"):
+        get_context = compile_path(value[1:]).get
+
+        def get_from_context(input, context):
+            try:
+                if context is None:
+                    raise PathNotFound(value)
+                return get_context(context)
+            except PathNotFound:
+                raise StatesError(Errors.Runtime, f"The path {value!r} of an intrinsic function matches nothing")
+
+        return get_from_context
+
+    get = compile_path(value).get
+
+    def get_from_input(input, context):
+        try:
+            return get(input)
+        except PathNotFound:
+            raise StatesError(Errors.Runtime, f"The path {value!r} of an intrinsic function matches nothing")
+
+    return get_from_input
+
+
+def _getter(arg: _Argument) -> Getter:
+    if isinstance(arg, _Constant):
+        value = arg.value
+        return lambda input, context: value
+    return arg
+
+
+def _failing(name: str, impl: Callable) -> Callable:
+    """
+    ``impl`` raising its errors as States.IntrinsicFailure.
+    """
+    @functools.wraps(impl)
+    def call(*args):
+        try:
+            return impl(*args)
+        except StatesError:
+            raise
+        except (TypeError, ValueError, KeyError, IndexError, UnicodeError) as e:
+            raise StatesError(Errors.IntrinsicFailure, f"{name}: {e}") from e
+
+    return call
+
+
+def _compile_call(name: str, args: List[_Argument], error: Callable[[str], ValueError]) -> _Argument:
+    if name == "States.Format":
+        impl, pure, args = _compile_format(args, error)
+    else:
+        try:
+            function = _FUNCTIONS[name]
+        except KeyError:
+            raise error(f"unknown function {name}")
+        if len(args) < function.min_args or (function.max_args is not None and len(args) > function.max_args):
+            expected = function.min_args if function.min_args == function.max_args else (
+                f"at least {function.min_args}" if function.max_args is None
+                else f"{function.min_args} to {function.max_args}"
+            )
+            raise error(f"{name} takes {expected} arguments, got {len(args)}")
+        impl, pure = function.impl, function.pure
+    impl = _failing(name, impl)
+
+    if pure and all(isinstance(arg, _Constant) for arg in args):
+        try:
+            value = impl(*(arg.value for arg in args))
+        except StatesError:
+            # Raised when the template is applied, like any other error of the function.
+            pass
+        else:
+            if isinstance(value, _IMMUTABLE):
+                return _Constant(value)
+
+    getters = [_getter(arg) for arg in args]
+    if not getters:
+        return lambda input, context: impl()
+    if len(getters) == 1:
+        get = getters[0]
+        return lambda input, context: impl(get(input, context))
+    if len(getters) == 2:
+        get_first, get_second = getters
+        return lambda input, context: impl(get_first(input, context), get_second(input, context))
+    return lambda input, context: impl(*[get(input, context) for get in getters])
+
+
+def _format_parts(raw: str, error: Callable[[str], ValueError]) -> List[Optional[str]]:
+    """
+    Splits the raw template of States.Format into its text and ``None`` for every ``{}``.
+    """
+    parts: List[Optional[str]] = []
+    text = []
+    i = 0
+    while i < len(raw):
+        char = raw[i]
+        if char == "\\" and i + 1 < len(raw):
+            text.append(raw[i + 1])
+            i += 2
+        elif raw.startswith("{}", i):
+            parts.extend(("".join(text), None))
+            text = []
+            i += 2
+        elif char in "{}":
+            raise error("unescaped brace in the template of States.Format")
+        else:
+            text.append(char)
+            i += 1
+    parts.append("".join(text))
+    return [part for part in parts if part != ""]
+
+
+def _compile_format(args: List[_Argument], error: Callable[[str], ValueError]) -> Tuple[Callable, bool, List]:
+    if not args:
+        raise error("States.Format takes at least 1 argument, got 0")
+    template, values = args[0], args[1:]
+
+    if not isinstance(template, _Constant) or template.raw is None:
+        # A template from a path, without escapes.
+        def format_(template, *values):
+            parts = _string(template, "template").split("{}")
+            if len(parts) != len(values) + 1:
+                raise ValueError(f"the template has {len(parts) - 1} placeholders, got {len(values)} values")
+            text = [parts[0]]
+            for value, part in zip(values, parts[1:]):
+                text.extend((_to_text(value), part))
+            return "".join(text)
+
+        return format_, True, args
+
+    parts = _format_parts(template.raw, error)
+    placeholders = parts.count(None)
+    if placeholders != len(values):
+        raise error(f"the template of States.Format has {placeholders} placeholders, got {len(values)} values")
+
+    def format_(*values):
+        values = iter(values)
+        return "".join(_to_text(next(values)) if part is None else part for part in parts)
+
+    return format_, True, values
+
+
+@functools.lru_cache(maxsize=PATH_CACHE_SIZE)
+def compile_intrinsic(expression: str) -> Getter:
+    """
+    Compiles an intrinsic function expression into ``get(input, context) -> value``,
+    reusing a previously compiled expression if the same one has been seen before.
+
+    Raises ``ValueError`` if ``expression`` is not a valid expression.
+    """
+    compiled = _Parser(expression).parse()
+    return _getter(compiled)
@@ -0,0 +1,191 @@
+"""
+Item sources and result destinations of Distributed Map states.
+
+Amazon S3 is stood in for by the local file system: ``Bucket`` is a directory
+and ``Key`` (or ``Prefix``) a path relative to it. The ``Resource`` of
+ItemReader and ResultWriter is not used.
+
+Items are read lazily, one at a time, and results are written as they
+come, so that neither the items nor the results of a Distributed Map have
+to fit in memory.
+"""
+import csv
+import itertools
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .lazy_json import materialize
+
+# Input types of ItemReader.ReaderConfig
+JSON = "JSON"
+JSONL = "JSONL"
+CSV = "CSV"
+
+# CSVHeaderLocation of ItemReader.ReaderConfig
+FIRST_ROW = "FIRST_ROW"
+GIVEN = "GIVEN"
+
+MANIFEST_KEY = "manifest.json"
+SUCCEEDED_KEY = "SUCCEEDED_0.json"
+
+
+def local_path(bucket: Optional[str], key: str) -> str:
+    """
+    Path of the local file standing in for an S3 object.
+    """
+    if bucket:
+        return os.path.join(bucket, key)
+    return key
+
+
+def read_items(reader_config: Dict, parameters: Dict) -> Iterator:
+    """
+    Iterate over the items of the file pointed to by ``parameters`` (the resolved
+    Parameters of ItemReader) according to ``reader_config`` (its ReaderConfig).
+
+    JSON Lines and CSV files are streamed, a JSON file must be an array and is loaded whole.
+    """
+    input_type = reader_config.get("InputType", JSON)
+    path = local_path(parameters.get("Bucket"), parameters["Key"])
+
+    if input_type == JSONL:
+        items = _read_json_lines(path)
+    elif input_type == CSV:
+        header_location = reader_config.get("CSVHeaderLocation", FIRST_ROW)
+        if header_location == GIVEN:
+            items = _read_csv(path, reader_config["CSVHeaders"])
+        elif header_location == FIRST_ROW:
+            items = _read_csv(path, None)
+        else:
+            raise ValueError(f"Unsupported CSVHeaderLocation {header_location!r}")
+    elif input_type == JSON:
+        items = _read_json_array(path)
+    else:
+        raise ValueError(f"Unsupported ItemReader InputType {input_type!r}")
+
+    max_items = reader_config.get("MaxItems")
+    if max_items:
+        items = itertools.islice(items, max_items)
+    return items
+
+
+def _read_json_lines(path: str) -> Iterator:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _read_csv(path: str, headers: Optional[List[str]]) -> Iterator[Dict[str, str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = csv.reader(f)
+        if headers is None:
+            headers = next(rows, [])
+        for row in rows:
+            yield dict(zip(headers, row))
+
+
+def _read_json_array(path: str) -> Iterator:
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+    if not isinstance(items, list):
+        raise ValueError(f"ItemReader expected a JSON array in {path}, got {type(items).__name__}")
+    return iter(items)
+
+
+def batch_items(items: Iterable, item_batcher: Dict, batch_input: Any = None) -> Iterator[Dict]:
+    """
+    Group items as ItemBatcher does, in batches of at most MaxItemsPerBatch items
+    and MaxInputBytesPerBatch bytes of JSON. Every batch is a ``{"Items": [...]}``
+    dictionary which also has ``batch_input`` (the resolved BatchInput) under "BatchInput".
+
+    An item larger than MaxInputBytesPerBatch on its own makes a batch of one.
+    """
+    max_items = item_batcher.get("MaxItemsPerBatch")
+    max_bytes = item_batcher.get("MaxInputBytesPerBatch")
+    if not max_items and not max_bytes:
+        raise ValueError("ItemBatcher must specify MaxItemsPerBatch or MaxInputBytesPerBatch")
+
+    def make_batch(batch_items):
+        batch = {"Items": batch_items}
+        if batch_input is not None:
+            batch["BatchInput"] = batch_input
+        return batch
+
+    batch = []
+    batch_bytes = 0
+    for item in items:
+        if max_bytes:
+            item_bytes = len(json.dumps(item, separators=(",", ":")).encode("utf-8")) + 1
+            if batch and batch_bytes + item_bytes > max_bytes:
+                yield make_batch(batch)
+                batch, batch_bytes = [], 0
+            batch_bytes += item_bytes
+        batch.append(item)
+        if max_items and len(batch) >= max_items:
+            yield make_batch(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        yield make_batch(batch)
+
+
+class ResultFileWriter:
+    """
+    Writes the results of the child executions of a Distributed Map as ResultWriter does,
+    to ``<Bucket>/<Prefix>/SUCCEEDED_0.json`` (a JSON array, written one result at a time)
+    and ``<Bucket>/<Prefix>/manifest.json`` which lists the result files once all are written.
+
+    Usage:
+
+        with ResultFileWriter(parameters) as writer:
+            for output in outputs:
+                writer.write(output)
+        state_result = writer.details
+    """
+
+    def __init__(self, parameters: Dict):
+        self.bucket = parameters["Bucket"]
+        self.prefix = parameters.get("Prefix", "")
+        self.count = 0
+        self._file = None
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix.rstrip('/')}/{name}" if self.prefix else name
+
+    def __enter__(self) -> "ResultFileWriter":
+        path = local_path(self.bucket, self._key(SUCCEEDED_KEY))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[")
+        return self
+
+    def write(self, output) -> None:
+        if self.count:
+            self._file.write(",\n")
+        self._file.write(json.dumps({"Output": json.dumps(output, default=materialize), "Status": "SUCCEEDED"}))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.write("]\n")
+        size = self._file.tell()
+        self._file.close()
+        if exc_type is not None:
+            return
+        manifest = {
+            "DestinationBucket": self.bucket,
+            "ResultFiles": {
+                "FAILED": [],
+                "PENDING": [],
+                "SUCCEEDED": [{"Key": self._key(SUCCEEDED_KEY), "Size": size}],
+            },
+        }
+        with open(local_path(self.bucket, self._key(MANIFEST_KEY)), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+    @property
+    def details(self) -> Dict:
+        """
+        Result of the Map state when it has a ResultWriter.
+        """
+        return {"ResultWriterDetails": {"Bucket": self.bucket, "Key": self._key(MANIFEST_KEY)}}
@@ -0,0 +1,374 @@
+"""
+Compilation of the JSONPath expressions used in States Language
+(InputPath, OutputPath, ResultPath, Variable and the ``.$`` fields of
+Parameters and ResultSelector).
+
+States Language only uses a small subset of JSONPath:
+
+    $
+    $.a.b
+    $.a[0]
+    $.a[*].b
+    $['key']
+
+Paths in this subset are tokenized here and evaluated with plain dict and
+list indexing. Anything else (filters, slices, recursive descent, unions ...)
+falls back to jsonpath_ng (with its extensions, so filters work too) which is
+only imported when such a path is seen.
+
+Parsing a path is far more expensive than evaluating it, so every path is
+parsed once and the result is kept in a process-wide bounded LRU cache.
+"""
+import copy
+import functools
+import re
+from typing import Any, List, Optional, Tuple
+
+from .lazy_json import ARRAY_TYPES, LazyArray, LazyObject, OBJECT_TYPES
+
+PATH_CACHE_SIZE = 4096
+
+# Segment kinds
+FIELD = "field"
+INDEX = "index"
+WILDCARD = "wildcard"
+
+# Same as the identifiers accepted by jsonpath_ng so that both agree on what a field name is.
+_FIELD_NAME = re.compile(r"[a-zA-Z_@][a-zA-Z0-9_@\-]*")
+_ARRAY_INDEX = re.compile(r"[0-9]+")
+
+
+class PathNotFound(LookupError):
+    """
+    Raised when a path that must match does not match anything in the document.
+    """
+
+
+def tokenize(path: str) -> Optional[Tuple[Tuple[str, Any], ...]]:
+    """
+    Split a path in the States Language subset of JSONPath into ``(kind, key)`` segments.
+
+    Returns ``None`` if the path is not in the subset.
+    """
+    if not path.startswith("$"):
+        return None
+
+    segments = []
+    i, n = 1, len(path)
+    while i < n:
+        c = path[i]
+        if c == ".":
+            m = _FIELD_NAME.match(path, i + 1)
+            if not m:
+                return None
+            segments.append((FIELD, m.group()))
+            i = m.end()
+        elif c == "[":
+            end = path.find("]", i)
+            if end < 0:
+                return None
+            inner = path[i + 1:end]
+            if inner == "*":
+                segments.append((WILDCARD, None))
+            elif _ARRAY_INDEX.fullmatch(inner):
+                segments.append((INDEX, int(inner)))
+            elif len(inner) >= 2 and inner[0] in "'\"" and inner[-1] == inner[0] and inner[0] not in inner[1:-1]:
+                segments.append((FIELD, inner[1:-1]))
+            else:
+                return None
+            i = end + 1
+        else:
+            return None
+    return tuple(segments)
+
+
+class Path:
+    """
+    A compiled path in the States Language subset of JSONPath.
+    """
+
+    __slots__ = ("source", "segments", "is_root", "has_wildcard", "_keys")
+
+    def __init__(self, source: str, segments: Tuple[Tuple[str, Any], ...]):
+        self.source = source
+        self.segments = segments
+        self.is_root = not segments
+        self.has_wildcard = any(kind == WILDCARD for kind, _ in segments)
+
+        # Paths that consist of field names only are by far the most common,
+        # they are evaluated with a tight loop over the keys.
+        if all(kind == FIELD for kind, _ in segments):
+            self._keys = tuple(key for _, key in segments)
+        else:
+            self._keys = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.source!r})"
+
+    def __str__(self):
+        return self.source
+
+    def get(self, doc):
+        """
+        Returns the first value matched by the path, raises ``PathNotFound`` if there is none.
+        """
+        if self._keys is not None:
+            try:
+                for key in self._keys:
+                    doc = doc[key]
+            except (KeyError, TypeError, IndexError):
+                raise PathNotFound(self.source)
+            return doc
+        found = self.find(doc)
+        if not found:
+            raise PathNotFound(self.source)
+        return found[0]
+
+    def find(self, doc) -> List:
+        """
+        Returns a list of all values matched by the path.
+        """
+        if self._keys is not None:
+            try:
+                for key in self._keys:
+                    doc = doc[key]
+            except (KeyError, TypeError, IndexError):
+                return []
+            return [doc]
+        if not self.has_wildcard:
+            for kind, key in self.segments:
+                if kind == INDEX:
+                    if not isinstance(doc, ARRAY_TYPES):
+                        return []
+                    # Not len(doc): lazy arrays would have to locate all of their items.
+                    try:
+                        doc = doc[key]
+                    except IndexError:
+                        return []
+                elif isinstance(doc, OBJECT_TYPES) and key in doc:
+                    doc = doc[key]
+                else:
+                    return []
+            return [doc]
+        return [value for _, value in self.find_indexed(doc)]
+
+    def find_indexed(self, doc) -> List[Tuple[Tuple[int, ...], Any]]:
+        """
+        Returns a list of ``(indexes, value)`` pairs for all values matched by the path,
+        where ``indexes`` are the array indexes on the way to the value, outermost first.
+        """
+        matches = [((), doc)]
+        for kind, key in self.segments:
+            next_matches = []
+            for indexes, value in matches:
+                if kind == FIELD:
+                    if isinstance(value, OBJECT_TYPES) and key in value:
+                        next_matches.append((indexes, value[key]))
+                elif kind == INDEX:
+                    if isinstance(value, ARRAY_TYPES):
+                        try:
+                            next_matches.append((indexes + (key,), value[key]))
+                        except IndexError:
+                            pass
+                elif isinstance(value, ARRAY_TYPES):
+                    next_matches.extend((indexes + (i,), item) for i, item in enumerate(value))
+                else:
+                    # Like jsonpath_ng, treat a non-array as an array of one item.
+                    next_matches.append((indexes + (0,), value))
+            matches = next_matches
+            if not matches:
+                break
+        return matches
+
+    def set(self, doc, value):
+        """
+        Sets the value at the path in ``doc``, modifying it in place, and returns the document.
+        Setting the root path returns ``value`` itself.
+
+        Missing objects on the way to the value are created.
+        """
+        if self.is_root:
+            return value
+        if self.has_wildcard:
+            for parent, key in self._parents(doc):
+                parent[key] = value
+            return doc
+
+        parent = doc
+        for (kind, key), (next_kind, _) in zip(self.segments, self.segments[1:]):
+            if kind == FIELD and isinstance(parent, dict) and key not in parent and next_kind == FIELD:
+                parent[key] = {}
+            try:
+                parent = parent[key]
+            except (KeyError, TypeError, IndexError):
+                raise PathNotFound(self.source)
+        kind, key = self.segments[-1]
+        try:
+            parent[key] = value
+        except (TypeError, IndexError):
+            raise PathNotFound(self.source)
+        return doc
+
+    def assign(self, doc, value):
+        """
+        Like ``set`` but leaves ``doc`` as it is: returns a new document that shares
+        everything with ``doc`` but the objects and arrays on the way to the value,
+        which are copied. This is how ResultPath places results, so that inputs
+        can be shared by branches and iterations without copying them.
+        """
+        if self.is_root:
+            return value
+        if self.has_wildcard:
+            return self.set(copy.deepcopy(doc), value)
+
+        segments = self.segments
+        try:
+            root = parent = _shallow_copy(doc)
+            for (kind, key), (next_kind, _) in zip(segments, segments[1:]):
+                if kind == FIELD and isinstance(parent, dict) and key not in parent and next_kind == FIELD:
+                    child = {}
+                else:
+                    child = _shallow_copy(parent[key])
+                parent[key] = child
+                parent = child
+            parent[segments[-1][1]] = value
+        except (KeyError, TypeError, IndexError):
+            raise PathNotFound(self.source)
+        return root
+
+    def _parents(self, doc):
+        parent_path = Path(self.source, self.segments[:-1])
+        kind, key = self.segments[-1]
+        for parent in parent_path.find(doc):
+            if kind == WILDCARD:
+                if isinstance(parent, list):
+                    yield from ((parent, i) for i in range(len(parent)))
+            elif kind == INDEX:
+                if isinstance(parent, list) and key < len(parent):
+                    yield parent, key
+            elif isinstance(parent, dict):
+                yield parent, key
+
+
+class JsonPathNgPath:
+    """
+    A compiled path that is outside of the States Language subset and is evaluated by jsonpath_ng.
+    Has the same interface as ``Path``.
+    """
+
+    def __init__(self, source: str):
+        from jsonpath_ng import Root
+        from jsonpath_ng.ext import parse as parse_jsonpath
+
+        self.source = source
+        self.expr = parse_jsonpath(source)
+        self.is_root = isinstance(self.expr, Root)
+        self.has_wildcard = True
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.source!r})"
+
+    def __str__(self):
+        return self.source
+
+    def get(self, doc):
+        found = self.expr.find(doc)
+        if not found:
+            raise PathNotFound(self.source)
+        return found[0].value
+
+    def find(self, doc) -> List:
+        return [match.value for match in self.expr.find(doc)]
+
+    def find_indexed(self, doc) -> List[Tuple[Tuple[int, ...], Any]]:
+        return [(_full_path_indexes(match.full_path), match.value) for match in self.expr.find(doc)]
+
+    def set(self, doc, value):
+        if self.is_root:
+            return value
+        if not self.expr.find(doc):
+            # Set a non-existent key assuming the parent of the path is a dictionary.
+            self.expr.left.find(doc)[0].value[str(self.expr.right)] = value
+            return doc
+        self.expr.update(doc, value)
+        return doc
+
+    def assign(self, doc, value):
+        if self.is_root:
+            return value
+        return self.set(copy.deepcopy(doc), value)
+
+
+def _shallow_copy(value):
+    if isinstance(value, (dict, list)):
+        return value.copy()
+    # Lazy objects and arrays are copied into plain ones, their members stay lazy.
+    if isinstance(value, LazyObject):
+        return dict(value.items())
+    if isinstance(value, LazyArray):
+        return list(value)
+    return value
+
+
+def _full_path_indexes(full_path) -> Tuple[int, ...]:
+    from jsonpath_ng import Child, Index
+
+    if isinstance(full_path, Child):
+        return _full_path_indexes(full_path.left) + _full_path_indexes(full_path.right)
+    elif isinstance(full_path, Index):
+        # Older versions of jsonpath_ng have a single index, newer ones a tuple of indices.
+        if hasattr(full_path, "indices"):
+            return tuple(full_path.indices)
+        return (full_path.index,)
+    return ()
+
+
+@functools.lru_cache(maxsize=PATH_CACHE_SIZE)
+def compile_path(path: str):
+    """
+    Compile ``path`` into a ``Path`` (or ``JsonPathNgPath`` for paths outside of the
+    States Language subset), reusing a previously compiled path if the same path
+    has been seen before.
+
+    Raises ``ValueError`` if ``path`` is not a valid JSONPath.
+    """
+    if not isinstance(path, str):
+        raise ValueError(f"Invalid JSONPath {path!r} -- expected a string")
+
+    segments = tokenize(path)
+    if segments is not None:
+        return Path(path, segments)
+
+    try:
+        return JsonPathNgPath(path)
+    except Exception as e:
+        raise ValueError(f"Invalid JSONPath {path!r}: {e}") from e
+
+
+def compile_template_paths(template, strict=True) -> None:
+    """
+    Compile all paths referenced by a Parameters or ResultSelector template.
+
+    Values of keys ending with ``.$`` must be valid paths. Other string values
+    starting with ``$.`` are only resolved if they happen to be valid paths,
+    so with ``strict=True`` only the former raise ``ValueError``.
+    """
+    if isinstance(template, dict):
+        items = template.items()
+    elif isinstance(template, list):
+        items = ((None, item) for item in template)
+    else:
+        return
+
+    for name, value in items:
+        if isinstance(value, (dict, list)):
+            compile_template_paths(value, strict=strict)
+        elif isinstance(value, str) and value.startswith("$") and not value.startswith("$$"):
+            # ``$$`` refers to the context object which is not a JSONPath on the input.
+            if strict and isinstance(name, str) and name.endswith(".$"):
+                compile_path(value)
+            else:
+                try:
+                    compile_path(value)
+                except ValueError:
+                    pass
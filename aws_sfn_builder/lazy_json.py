@@ -0,0 +1,424 @@
+"""
+Lazy JSON documents backed by a memory-mapped file, for execution inputs too large to load:
+
+    with Runner() as runner:
+        final_state, output = runner.run(state_machine, lazy_json.load("input.json"))
+
+Objects and arrays of the document are ``LazyObject`` and ``LazyArray``, read-only
+mappings and sequences that only locate their members in the file when they are first
+accessed, and only parse the members that are accessed. So a path such as ``$.config.mode``
+materializes the root object's keys, the ``config`` object's keys and one string,
+whatever the size of the rest of the document.
+
+JSONPath, Parameters and ResultPath work on top of them: ResultPath copies the objects
+on the way to the result into plain dicts (see ``Path.assign``) that share the untouched
+lazy members. ``materialize`` turns a value into plain dicts and lists.
+"""
+import array
+import collections.abc
+import itertools
+import json
+import mmap
+import operator
+import re
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_STRING_PATTERN = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_STRING = re.compile(_STRING_PATTERN)
+_SCALAR = re.compile(rb"[^,\]}\s]+")
+_WHITESPACE_BYTES = b" \t\n\r"
+
+
+def _nested_pattern(levels: int) -> bytes:
+    """
+    Pattern of anything up to the next bracket, strings and objects and arrays nested
+    at most ``levels`` deep included, so that most values are skipped by a single match.
+    """
+    flat = rb'[^"\[\]{}]*(?:' + _STRING_PATTERN + rb'[^"\[\]{}]*)*'
+    pattern = flat
+    for _ in range(levels):
+        pattern = flat + rb"(?:[\[{]" + pattern + rb"[\]}]" + flat + rb")*"
+    return pattern
+
+
+_NESTED = re.compile(_nested_pattern(3))
+
+_QUOTE, _COMMA, _COLON, _BACKSLASH = ord('"'), ord(","), ord(":"), ord("\\")
+_OPEN_OBJECT, _CLOSE_OBJECT, _OPEN_ARRAY, _CLOSE_ARRAY = ord("{"), ord("}"), ord("["), ord("]")
+_OPENING = (_OPEN_OBJECT, _OPEN_ARRAY)
+_CLOSING = (_CLOSE_OBJECT, _CLOSE_ARRAY)
+
+# Values are scanned this many bytes at a time, longer ones are skipped a window at a time.
+SCAN_BYTES = 64 * 1024
+# Windows in which long values are skipped, the pages of every window are released from memory.
+WINDOW_BYTES = 4 * 1024 * 1024
+
+_NOT_QUOTES_OR_BRACKETS = bytes(set(range(256)) - set(b'"[]{}'))
+# Strings once only their quotes and brackets are left
+_QUOTED = re.compile(rb'"[^"]*"')
+# Opening brackets count for 2 and closing ones for 0, one less than that is the change of depth.
+_STEPS = bytes.maketrans(b"[{]}", b"\x02\x02\x00\x00")
+
+# Locating the members of a value is not thread safe.
+_scan_lock = threading.Lock()
+
+# Marks scanning all members of an object
+_ALL = object()
+
+
+def _invalid(buffer, pos, expected) -> ValueError:
+    return ValueError(f"Invalid JSON at byte {pos}: expected {expected}, got {bytes(buffer[pos:pos + 20])!r}")
+
+
+def _skip_whitespace(buffer, pos: int) -> int:
+    return _WHITESPACE.match(buffer, pos).end()
+
+
+def _skip_value(buffer, pos: int) -> int:
+    """
+    Returns the end of the value starting at ``pos``, without parsing it.
+    """
+    char = buffer[pos] if pos < len(buffer) else None
+    if char == _QUOTE:
+        match = _STRING.match(buffer, pos)
+        if match is None:
+            raise _invalid(buffer, pos, "a string")
+        return match.end()
+
+    if char in _OPENING:
+        start = released = scan_until = pos
+        depth = 0
+        while True:
+            char = buffer[pos] if pos < len(buffer) else None
+            if char in _OPENING:
+                depth += 1
+                pos += 1
+            elif char in _CLOSING:
+                depth -= 1
+                pos += 1
+                if not depth:
+                    break
+            elif char == _QUOTE:
+                # A string longer than what was left of the window
+                match = _STRING.match(buffer, pos)
+                if match is None:
+                    raise _invalid(buffer, pos, "a string")
+                pos = match.end()
+            elif char is None:
+                raise _invalid(buffer, start, "a complete object or array")
+
+            skipped = None
+            if pos - start >= SCAN_BYTES and pos >= scan_until:
+                skipped = _skip_window(buffer, pos, depth)
+                if skipped is None:
+                    # The value ends in the next window, it is scanned up to there.
+                    scan_until = pos + WINDOW_BYTES
+            if skipped is not None:
+                pos, depth = skipped
+            else:
+                pos = _NESTED.match(buffer, pos, pos + SCAN_BYTES).end()
+            if pos - released >= WINDOW_BYTES:
+                _release(buffer, released, pos)
+                released = pos
+        return pos
+
+    match = _SCALAR.match(buffer, pos)
+    if match is None:
+        raise _invalid(buffer, pos, "a value")
+    return match.end()
+
+
+def _skip_window(buffer, pos: int, depth: int) -> Optional[Tuple[int, int]]:
+    """
+    Skips the next ``WINDOW_BYTES`` of a value ``depth`` levels deep, if the value does not end
+    in them: returns the position and the depth after them, ``None`` if the value ends in them.
+
+    Works on the whole window at once with bytes methods rather than a byte at a time:
+    leaves only the quotes and brackets, drops the strings, and adds up the brackets.
+    """
+    window = buffer[pos:pos + WINDOW_BYTES]
+    if len(window) < WINDOW_BYTES:
+        return None
+    text = window.replace(b"\\\\", b"").replace(b'\\"', b"") if b"\\" in window else window
+    marks = text.translate(None, _NOT_QUOTES_OR_BRACKETS)
+    end = len(window)
+    if marks.count(b'"') % 2:
+        # The window ends in a string, end it before the string.
+        end = _last_quote(window)
+        if end <= 0:
+            return None
+        marks = marks[:marks.rindex(b'"')]
+
+    steps = _QUOTED.sub(b"", marks).translate(_STEPS)
+    lowest = min(map(operator.sub, itertools.accumulate(steps), itertools.count(1)), default=0)
+    if depth + lowest <= 0:
+        return None
+    return pos + end, depth + sum(steps) - len(steps)
+
+
+def _last_quote(window: bytes) -> int:
+    """
+    Position of the last quote of ``window`` that is not escaped.
+    """
+    end = len(window)
+    while True:
+        end = window.rfind(b'"', 0, end)
+        i = end - 1
+        while i >= 0 and window[i] == _BACKSLASH:
+            i -= 1
+        if end < 0 or (end - 1 - i) % 2 == 0:
+            return end
+
+
+def _release(buffer, start: int, end: int):
+    """
+    Releases the pages of a skipped value, they are read again from the file if it is accessed.
+    """
+    if isinstance(buffer, mmap.mmap) and hasattr(mmap, "MADV_DONTNEED"):
+        start += -start % mmap.PAGESIZE
+        length = (end - start) // mmap.PAGESIZE * mmap.PAGESIZE
+        if length > 0:
+            buffer.madvise(mmap.MADV_DONTNEED, start, length)
+
+
+def _value(buffer, start: int, end: int) -> Any:
+    char = buffer[start]
+    if char == _OPEN_OBJECT:
+        return LazyObject(buffer, start, end)
+    if char == _OPEN_ARRAY:
+        return LazyArray(buffer, start, end)
+    return json.loads(buffer[start:end])
+
+
+def _loads(data: bytes) -> Any:
+    return json.loads(data)
+
+
+class _LazyValue:
+    """
+    A value in ``buffer`` from ``start`` to ``end``. Its members are located from ``_pos``
+    on when they are first accessed, ``_pos`` is ``None`` once all of them have been.
+    It is ``start`` before the first one has been.
+    """
+
+    __slots__ = ("_buffer", "_start", "_end", "_pos")
+
+    def __init__(self, buffer, start: int, end: int):
+        self._buffer = buffer
+        self._start = start
+        self._end = end
+        self._pos = start
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(<{self._end - self._start} bytes at {self._start}>)"
+
+    def __reduce__(self):
+        # Pickled (for worker processes, copies) as plain values
+        return _loads, (self._buffer[self._start:self._end],)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return materialize(self)
+
+    def _next_member(self, pos: int, closing: int) -> Optional[int]:
+        """
+        Position of the next member after the one that ended at ``pos``, ``None`` if it was the last one.
+        """
+        buffer = self._buffer
+        pos = _skip_whitespace(buffer, pos)
+        if buffer[pos] == closing:
+            return None
+        if buffer[pos] != _COMMA:
+            raise _invalid(buffer, pos, f"',' or {chr(closing)!r}")
+        return _skip_whitespace(buffer, pos + 1)
+
+    def _first_member(self, closing: int) -> Optional[int]:
+        pos = _skip_whitespace(self._buffer, self._start + 1)
+        return None if self._buffer[pos] == closing else pos
+
+
+class LazyObject(_LazyValue, collections.abc.Mapping):
+    """
+    A JSON object of a lazy document.
+    """
+
+    __slots__ = ("_members", "_values")
+
+    def __init__(self, buffer, start: int, end: int):
+        super().__init__(buffer, start, end)
+        self._members: Dict[str, Tuple[int, int]] = {}
+        self._values: Dict[str, Any] = {}
+
+    def _scan(self, key=_ALL):
+        """
+        Locates the members up to ``key``, all of them by default.
+        """
+        buffer = self._buffer
+        members = self._members
+        with _scan_lock:
+            pos = self._pos
+            if pos == self._start:
+                pos = self._first_member(_CLOSE_OBJECT)
+            released = pos
+            while pos is not None and key not in members:
+                match = _STRING.match(buffer, pos)
+                if match is None:
+                    raise _invalid(buffer, pos, "a key")
+                name = json.loads(match.group())
+                pos = _skip_whitespace(buffer, match.end())
+                if buffer[pos] != _COLON:
+                    raise _invalid(buffer, pos, "':'")
+                start = _skip_whitespace(buffer, pos + 1)
+                end = _skip_value(buffer, start)
+                members[name] = start, end
+                pos = self._next_member(end, _CLOSE_OBJECT)
+                if pos is not None and pos - released >= WINDOW_BYTES:
+                    _release(buffer, released, pos)
+                    released = pos
+            self._pos = pos
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if key not in self._members and self._pos is not None:
+            self._scan(key)
+        start, end = self._members[key]
+        value = self._values[key] = _value(self._buffer, start, end)
+        return value
+
+    def __contains__(self, key):
+        if key not in self._members and self._pos is not None:
+            self._scan(key)
+        return key in self._members
+
+    def __iter__(self) -> Iterator[str]:
+        if self._pos is not None:
+            self._scan()
+        return iter(self._members)
+
+    def __len__(self):
+        if self._pos is not None:
+            self._scan()
+        return len(self._members)
+
+
+class LazyArray(_LazyValue, collections.abc.Sequence):
+    """
+    A JSON array of a lazy document.
+    """
+
+    __slots__ = ("_starts", "_ends", "_values")
+
+    def __init__(self, buffer, start: int, end: int):
+        super().__init__(buffer, start, end)
+        self._starts = array.array("q")
+        self._ends = array.array("q")
+        self._values: Dict[int, Any] = {}
+
+    def _scan(self, index: int = None):
+        """
+        Locates the items up to ``index``, all of them by default.
+        """
+        buffer = self._buffer
+        starts, ends = self._starts, self._ends
+        with _scan_lock:
+            pos = self._pos
+            if pos == self._start:
+                pos = self._first_member(_CLOSE_ARRAY)
+            released = pos
+            while pos is not None and (index is None or len(starts) <= index):
+                end = _skip_value(buffer, pos)
+                starts.append(pos)
+                ends.append(end)
+                pos = self._next_member(end, _CLOSE_ARRAY)
+                if pos is not None and pos - released >= WINDOW_BYTES:
+                    _release(buffer, released, pos)
+                    released = pos
+            self._pos = pos
+
+    def __len__(self):
+        if self._pos is not None:
+            self._scan()
+        return len(self._starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        try:
+            return self._values[index]
+        except KeyError:
+            pass
+        if index < 0:
+            index += len(self)
+        elif index >= len(self._starts) and self._pos is not None:
+            self._scan(index)
+        if not 0 <= index < len(self._starts):
+            raise IndexError("LazyArray index out of range")
+        value = self._values[index] = _value(self._buffer, self._starts[index], self._ends[index])
+        return value
+
+    def __iter__(self):
+        # Items are located as the iteration goes.
+        i = 0
+        while i < len(self._starts) or self._pos is not None:
+            if i >= len(self._starts):
+                self._scan(i)
+                if i >= len(self._starts):
+                    break
+            yield self[i]
+            i += 1
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazyArray)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+
+# Types of JSON objects and arrays, plain or lazy
+OBJECT_TYPES = (dict, LazyObject)
+ARRAY_TYPES = (list, LazyArray)
+
+
+def load(path: str) -> Any:
+    """
+    Memory-maps the JSON file at ``path`` and returns its root value, lazily if it is an object or an array.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(buffer)
+
+
+def loads(data) -> Any:
+    """
+    Returns the root value of the JSON document in ``data`` (bytes or any buffer),
+    lazily if it is an object or an array.
+    """
+    start = _skip_whitespace(data, 0)
+    if start == len(data):
+        raise _invalid(data, start, "a value")
+    # The document is not scanned up front, its end is the end of the data.
+    end = len(data)
+    while data[end - 1] in _WHITESPACE_BYTES:
+        end -= 1
+    return _value(data, start, end)
+
+
+def materialize(value) -> Any:
+    """
+    ``value`` with all lazy objects and arrays in it turned into plain dicts and lists.
+    """
+    if isinstance(value, _LazyValue):
+        return json.loads(value._buffer[value._start:value._end])
+    if isinstance(value, dict):
+        return {key: materialize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [materialize(item) for item in value]
+    return value
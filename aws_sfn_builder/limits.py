@@ -0,0 +1,229 @@
+"""
+Concurrency and rate limits of resource providers (see ``ResourceManager.limit``).
+"""
+import asyncio
+import collections
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Deque, NamedTuple, Optional
+
+
+class LimitInfo(NamedTuple):
+    calls: int
+    # Calls that had to wait in the queue
+    throttled: int
+    # Seconds waited in the queue, in total and at most
+    total_wait: float
+    max_wait: float
+    in_flight: int
+    queued: int
+
+
+class _ThreadWaiter:
+    def __init__(self):
+        self.granted = False
+        self._event = threading.Event()
+
+    def wake(self) -> None:
+        self._event.set()
+
+    def reset(self) -> None:
+        self._event.clear()
+
+    def wait(self, timeout: Optional[float]) -> None:
+        self._event.wait(timeout)
+
+
+class _LoopWaiter:
+    def __init__(self):
+        self.granted = False
+        self._loop = asyncio.get_running_loop()
+        self._future = self._loop.create_future()
+
+    def wake(self) -> None:
+        self._loop.call_soon_threadsafe(self._set, self._future)
+
+    @staticmethod
+    def _set(future: "asyncio.Future") -> None:
+        if not future.done():
+            future.set_result(None)
+
+    def reset(self) -> None:
+        self._future = self._loop.create_future()
+
+    async def wait(self, timeout: Optional[float]) -> None:
+        await asyncio.wait([self._future], timeout=timeout)
+
+
+class Limit:
+    """
+    Limits the calls of the providers it wraps to ``max_concurrency`` at a time,
+    and to ``rate`` per second with a token bucket of ``burst`` tokens
+    (``None`` for no limit). Calls over the limits wait in a queue in the order they are made.
+
+    A limit is shared by all the providers it wraps, for example by all the resources
+    that match the pattern it is set for (see ``ResourceManager.limit``).
+
+    Calls of coroutine function providers wait on their event loop, other calls on their thread.
+    """
+
+    def __init__(self, max_concurrency: int = None, rate: float = None, burst: int = 1):
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1 or None, got {max_concurrency!r}")
+        if rate is not None and rate <= 0:
+            raise ValueError(f"rate must be positive or None, got {rate!r}")
+        if burst < 1:
+            raise ValueError(f"burst must be at least 1, got {burst!r}")
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._queue: Deque = collections.deque()
+        self._in_flight = 0
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._calls = self._throttled = 0
+        self._total_wait = self._max_wait = 0.0
+
+    def __getstate__(self):
+        # Worker processes have limits of their own
+        return {"max_concurrency": self.max_concurrency, "rate": self.rate, "burst": self.burst}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __repr__(self):
+        return f"Limit(max_concurrency={self.max_concurrency!r}, rate={self.rate!r}, burst={self.burst!r})"
+
+    def info(self) -> LimitInfo:
+        with self._lock:
+            return LimitInfo(
+                self._calls, self._throttled, self._total_wait, self._max_wait, self._in_flight, len(self._queue),
+            )
+
+    def wrap(self, provider: Callable) -> Callable:
+        """
+        ``provider`` with its calls limited. Coroutine function providers stay coroutine functions.
+        """
+        if inspect.iscoroutinefunction(provider):
+            @functools.wraps(provider)
+            async def limited(payload):
+                await self._aacquire()
+                try:
+                    return await provider(payload)
+                finally:
+                    self._release()
+        else:
+            @functools.wraps(provider)
+            def limited(payload):
+                self._acquire()
+                try:
+                    return provider(payload)
+                finally:
+                    self._release()
+
+        limited.limit = self
+        return limited
+
+    def _grant(self) -> Optional[float]:
+        """
+        Lets the calls at the head of the queue go while the limits allow it.
+        Returns in how many seconds the call at the head can go if it waits for a token,
+        ``None`` if it waits for a call to end or if the queue is empty. Call with the lock held.
+        """
+        if self.rate is not None:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+        head = self._queue[0] if self._queue else None
+        while self._queue:
+            if self.max_concurrency is not None and self._in_flight >= self.max_concurrency:
+                break
+            if self.rate is not None and self._tokens < 1:
+                break
+            waiter = self._queue.popleft()
+            self._in_flight += 1
+            if self.rate is not None:
+                self._tokens -= 1
+            waiter.granted = True
+            waiter.wake()
+
+        if not self._queue:
+            return None
+        if self._queue[0] is not head:
+            # The new head of the queue takes over waiting for tokens
+            self._queue[0].wake()
+        if self.max_concurrency is not None and self._in_flight >= self.max_concurrency:
+            return None
+        return (1 - self._tokens) / self.rate
+
+    def _enqueue(self, waiter) -> Optional[float]:
+        with self._lock:
+            self._calls += 1
+            self._queue.append(waiter)
+            delay = self._grant()
+            if not waiter.granted:
+                self._throttled += 1
+                waiter.reset()
+            return delay if self._queue and self._queue[0] is waiter else None
+
+    def _poll(self, waiter) -> Optional[float]:
+        """
+        Checks the limits again for ``waiter``, returns how long it should wait next.
+        """
+        with self._lock:
+            delay = self._grant()
+            waiter.reset()
+            # Only the head of the queue waits for tokens, the others until they are woken
+            return delay if self._queue and self._queue[0] is waiter else None
+
+    def _abandon(self, waiter) -> None:
+        with self._lock:
+            if waiter.granted:
+                self._in_flight -= 1
+            else:
+                self._queue.remove(waiter)
+            self._grant()
+
+    def _waited(self, started: float) -> None:
+        waited = time.monotonic() - started
+        with self._lock:
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+    def _acquire(self) -> None:
+        waiter = _ThreadWaiter()
+        delay = self._enqueue(waiter)
+        if waiter.granted:
+            return
+        started = time.monotonic()
+        try:
+            while not waiter.granted:
+                waiter.wait(delay)
+                delay = self._poll(waiter)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        self._waited(started)
+
+    async def _aacquire(self) -> None:
+        waiter = _LoopWaiter()
+        delay = self._enqueue(waiter)
+        if waiter.granted:
+            return
+        started = time.monotonic()
+        try:
+            while not waiter.granted:
+                await waiter.wait(delay)
+                delay = self._poll(waiter)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        self._waited(started)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._grant()
@@ -0,0 +1,72 @@
+"""
+Paginated results of Tasks with ``"ParallelPages": true``.
+"""
+from typing import Any, Callable, Iterable, List, Union
+
+_NOT_FETCHED = object()
+
+
+def merge_pages(pages: List) -> Any:
+    """
+    Default merge of pages: pages that are all arrays are concatenated,
+    otherwise the result is the list of pages.
+    """
+    if all(isinstance(page, list) for page in pages):
+        return [item for page in pages for item in page]
+    return list(pages)
+
+
+class Pages:
+    """
+    A result that comes in pages.
+
+    A provider of a Task with ``"ParallelPages": true`` returns it to have the runner
+    fetch the pages concurrently, at most ``MaxPages`` of the state machine at a time,
+    and merge them in page order into the result of the task:
+
+        @runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:ListJobs")
+        def list_jobs(payload):
+            first = api.list_jobs(page=0)
+            return Pages(lambda page: api.list_jobs(page=page)["Jobs"], first["PageCount"], first=first["Jobs"])
+
+    ``cursors`` are the cursors passed to ``fetch``, one per page, or the number of pages
+    in which case the cursors are the page numbers starting from 0.
+    ``first`` is the page of the first cursor if the provider has fetched it already.
+    ``merge`` combines the list of pages into the result, ``merge_pages`` by default.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Any], Any],
+        cursors: Union[int, Iterable],
+        first: Any = _NOT_FETCHED,
+        merge: Callable[[List], Any] = merge_pages,
+    ):
+        self.fetch = fetch
+        self.cursors = list(range(cursors)) if isinstance(cursors, int) else list(cursors)
+        self.first = first
+        self.merge = merge
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} ({len(self.cursors)} pages)>"
+
+    @property
+    def has_first(self) -> bool:
+        return self.first is not _NOT_FETCHED
+
+    @property
+    def remaining_cursors(self) -> List:
+        """
+        Cursors of the pages that are yet to be fetched.
+        """
+        if self.has_first:
+            return self.cursors[1:]
+        return self.cursors
+
+    def combine(self, fetched: List) -> Any:
+        """
+        Merge the fetched pages of ``remaining_cursors`` with the first page.
+        """
+        if self.has_first:
+            fetched = [self.first, *fetched]
+        return self.merge(fetched)
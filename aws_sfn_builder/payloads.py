@@ -0,0 +1,59 @@
+"""
+Sharing of payloads between the runs of Parallel branches and Map iterations.
+
+States never modify their input: ResultPath places the result in a copy of only
+the objects and arrays on the way to it (see ``Path.assign``) and shares the rest,
+so branches and iterations are given the input of their state as it is, without copying it.
+
+Providers may modify their input though. Within branches and iterations, where their
+input may be shared with other runs, they are given a copy of it. Lazy JSON values
+are read-only and are given as they are, unmaterialized.
+"""
+import contextlib
+import contextvars
+import copy
+
+from .lazy_json import LazyArray, LazyObject
+
+# Whether the payloads of the current run may be shared with other runs
+_shared: "contextvars.ContextVar[bool]" = contextvars.ContextVar("shared_payloads", default=False)
+
+_SCALARS = (str, int, float, bool, type(None))
+_READ_ONLY = (*_SCALARS, LazyObject, LazyArray)
+
+
+def copy_payload(value):
+    """
+    Deep copy of a JSON-like ``value``, much faster than ``copy.deepcopy`` for plain
+    objects and arrays. Lazy JSON values are read-only and not copied, other mutable
+    values are copied with ``copy.deepcopy``.
+    """
+    cls = type(value)
+    if cls is dict:
+        return {key: copy_payload(item) for key, item in value.items()}
+    if cls is list:
+        return [copy_payload(item) for item in value]
+    if cls in _READ_ONLY:
+        return value
+    return copy.deepcopy(value)
+
+
+@contextlib.contextmanager
+def shared_payloads():
+    """
+    Marks the payloads of the runs started in this context as shared with other runs.
+    """
+    token = _shared.set(True)
+    try:
+        yield
+    finally:
+        _shared.reset(token)
+
+
+def provider_input(payload):
+    """
+    The input to give to a provider: ``payload`` itself, or a copy of it if it may be shared with other runs.
+    """
+    if _shared.get():
+        return copy_payload(payload)
+    return payload
@@ -0,0 +1,119 @@
+"""
+Execution plans.
+
+A plan is a state machine (or a branch of one) lowered to a flat list of
+step callables. ``Next`` of every state is resolved to an integer index into
+that list, and stages of a state that would not change anything (no InputPath,
+no Parameters, ...) are left out of its step when it is compiled.
+
+Every step takes ``(input, runner)`` and returns ``(next_index, output)``,
+``next_index`` being ``None`` when the execution ends in that state.
+Steps do not wait: the runner waits before the steps of Wait states
+for as long as their ``delays`` say.
+``AsyncRunner`` uses coroutine versions of the steps, compiled on first use.
+
+Plans are cached process-wide by the hash of the compiled definition.
+"""
+import collections
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PLAN_CACHE_SIZE = 256
+
+Step = Callable[[Any, Any], Tuple[Optional[int], Any]]
+
+
+def definition_hash(definition: Dict) -> str:
+    """
+    Returns a hash that is the same for equal state machine definitions.
+    """
+    return hashlib.sha1(json.dumps(definition, sort_keys=True, default=repr).encode("utf-8")).hexdigest()
+
+
+class Plan:
+    """
+    A list of states with their compiled steps.
+    """
+
+    __slots__ = ("key", "names", "states", "index", "steps", "delays", "start", "_async_steps", "_attempts")
+
+    def __init__(self, start_at: Optional[str], states: List, key: str = None):
+        self.key = key
+        self.states = list(states)
+        self.names = [state.name for state in self.states]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.start = self.resolve(start_at)
+        self.steps: List[Step] = [state.compile_step(self.resolve) for state in self.states]
+        # Seconds to wait before each step, see ``State.compile_delay``
+        self.delays: List[Optional[Callable[[Any, float], float]]] = [
+            state.compile_delay() for state in self.states
+        ]
+        self._async_steps: Optional[List[Callable]] = None
+        self._attempts: Optional[List[Optional[Tuple[Step, Callable]]]] = None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.key} ({len(self.steps)} steps)>"
+
+    @property
+    def async_steps(self) -> List[Callable]:
+        """
+        Coroutine steps for ``AsyncRunner``.
+        """
+        if self._async_steps is None:
+            self._async_steps = [state.compile_async_step(self.resolve) for state in self.states]
+        return self._async_steps
+
+    @property
+    def attempts(self) -> List[Optional[Tuple[Step, Callable]]]:
+        """
+        Single attempts of the steps of states with Retry or Catch, for ``Scheduler``
+        which waits between the attempts itself (see ``State.compile_attempt``).
+        """
+        if self._attempts is None:
+            self._attempts = [state.compile_attempt(self.resolve) for state in self.states]
+        return self._attempts
+
+    def resolve(self, name: Optional[str]) -> Optional[int]:
+        """
+        Translate the name of a state to its index in the plan.
+        """
+        if name is None:
+            return None
+        try:
+            return self.index[name]
+        except KeyError:
+            raise ValueError(f"Unknown state {name!r}")
+
+
+_plan_cache: "collections.OrderedDict[str, Plan]" = collections.OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan(sequence) -> Plan:
+    """
+    Returns the plan of a ``Sequence`` (or ``Machine``), reusing the plan of
+    an equal definition if one has been compiled before.
+    """
+    key = definition_hash(sequence.compile())
+
+    with _plan_cache_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            return plan
+
+    plan = Plan(sequence.start_at, sequence.states.values(), key=key)
+
+    with _plan_cache_lock:
+        _plan_cache[key] = plan
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+
+    return plan
+
+
+def clear_plan_cache() -> None:
+    with _plan_cache_lock:
+        _plan_cache.clear()
@@ -0,0 +1,195 @@
+"""
+Resolution of resource ARNs to the patterns providers are registered for (see ``ResourceManager``).
+"""
+import fnmatch
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+_WILDCARDS = re.compile(r"[*?\[]")
+
+# Suffixes of the service integration patterns of Task resources
+_INTEGRATION_SUFFIX = re.compile(r"\.(sync(:\d+)?|waitForTaskToken)$")
+
+# Qualified Lambda function ARNs: arn:aws:lambda:REGION:ACCOUNT_ID:function:NAME:VERSION_OR_ALIAS
+_QUALIFIED_FUNCTION = re.compile(r"^(arn:[^:]*:lambda:[^:]*:[^:]*:function:[^:]+):[^:]+$")
+
+_NOT_RESOLVED = object()
+
+
+def arn_family(arn: str) -> List[str]:
+    """
+    The ARNs ``arn`` is a variant of, most specific first: the service integration without
+    its integration pattern (``.sync``, ``.sync:2``, ``.waitForTaskToken``), and the Lambda
+    function without its version or alias.
+    """
+    family = []
+    base = _INTEGRATION_SUFFIX.sub("", arn)
+    if base != arn:
+        family.append(base)
+    match = _QUALIFIED_FUNCTION.match(base)
+    if match:
+        family.append(match.group(1))
+    return family
+
+
+class _PrefixNode:
+    __slots__ = ("children", "prefix")
+
+    def __init__(self):
+        self.children: Dict[str, "_PrefixNode"] = {}
+        # The prefix pattern whose prefix ends at this node
+        self.prefix: Optional[str] = None
+
+
+class _PatternNode:
+    """
+    A node of the trie of wildcard patterns, where ``?`` and ``*`` are edges like characters.
+    """
+
+    __slots__ = ("children", "any_char", "star", "loops", "patterns")
+
+    def __init__(self, loops: bool = False):
+        self.children: Dict[str, "_PatternNode"] = {}
+        # The nodes after a ``?``, and after a ``*``
+        self.any_char: Optional["_PatternNode"] = None
+        self.star: Optional["_PatternNode"] = None
+        # Whether this node is after a ``*``, which stays at it on any character
+        self.loops = loops
+        # The patterns that end at this node, with their ranks
+        self.patterns: List[Tuple[Tuple[int, int], str]] = []
+
+
+def _closure(nodes: List[_PatternNode]) -> List[_PatternNode]:
+    """
+    ``nodes`` and the nodes after their ``*`` edges, which match nothing.
+    """
+    closed = {}
+    for node in nodes:
+        while node is not None and id(node) not in closed:
+            closed[id(node)] = node
+            node = node.star
+    return list(closed.values())
+
+
+class ArnIndex:
+    """
+    Index of the ARN patterns that providers are registered for. A pattern is either:
+
+    - an ARN, which also matches the ARNs of its family (see ``arn_family``),
+      so a provider of ``arn:aws:states:::glue:startJobRun`` serves ``...startJobRun.sync``
+      and a provider of a Lambda function serves all its versions and aliases,
+    - a prefix, an ARN ending with ``*`` and without other wildcards,
+    - a shell-style pattern with ``*``, ``?`` or ``[...]`` anywhere (see ``fnmatch``).
+
+    An ARN resolves to the first of: the same ARN, an ARN of its family, the longest matching prefix,
+    the matching pattern with the most literal characters (the first one added on a tie).
+
+    Prefixes and patterns are kept in tries that are walked along the ARN, so resolving takes
+    time in the length of the ARN rather than in the number of patterns. Only patterns
+    with ``[...]`` are matched one by one. Resolutions are cached per ARN until a pattern is added.
+    """
+
+    def __init__(self):
+        self._exact = set()
+        self._prefixes = _PrefixNode()
+        self._patterns = _PatternNode()
+        self._classes: List[Tuple[Tuple[int, int], str, "re.Pattern"]] = []
+        self._added = 0
+        self._resolved: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, pattern: str) -> None:
+        with self._lock:
+            match = _WILDCARDS.search(pattern)
+            if match is None:
+                self._exact.add(pattern)
+            elif match.start() == len(pattern) - 1 and pattern.endswith("*"):
+                node = self._prefixes
+                for char in pattern[:-1]:
+                    node = node.children.setdefault(char, _PrefixNode())
+                node.prefix = pattern
+            else:
+                self._add_pattern(pattern)
+            self._resolved = {}
+
+    def _add_pattern(self, pattern: str) -> None:
+        self._added += 1
+        rank = (-len(_WILDCARDS.sub("", pattern)), self._added)
+        if "[" in pattern:
+            if pattern not in (known for _, known, _ in self._classes):
+                self._classes.append((rank, pattern, re.compile(fnmatch.translate(pattern))))
+            return
+
+        node = self._patterns
+        for char in pattern:
+            if char == "*":
+                if not node.loops:
+                    if node.star is None:
+                        node.star = _PatternNode(loops=True)
+                    node = node.star
+            elif char == "?":
+                if node.any_char is None:
+                    node.any_char = _PatternNode()
+                node = node.any_char
+            else:
+                node = node.children.setdefault(char, _PatternNode())
+        if pattern not in (known for _, known in node.patterns):
+            node.patterns.append((rank, pattern))
+
+    def resolve(self, arn: str) -> Optional[str]:
+        """
+        The pattern ``arn`` resolves to, ``None`` if no pattern matches it.
+        """
+        resolved = self._resolved
+        pattern = resolved.get(arn, _NOT_RESOLVED)
+        if pattern is _NOT_RESOLVED:
+            # Cached in the resolutions it was made with, which a pattern added meanwhile replaces
+            pattern = resolved[arn] = self._match(arn)
+        return pattern
+
+    def _match(self, arn: str) -> Optional[str]:
+        if arn in self._exact:
+            return arn
+        for base in arn_family(arn):
+            if base in self._exact:
+                return base
+
+        prefix = None
+        node = self._prefixes
+        for char in arn:
+            if node.prefix is not None:
+                prefix = node.prefix
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            prefix = node.prefix or prefix
+        if prefix is not None:
+            return prefix
+
+        candidates = [
+            (rank, pattern) for node in self._walk_patterns(arn) for rank, pattern in node.patterns
+        ]
+        candidates.extend((rank, pattern) for rank, pattern, regex in self._classes if regex.match(arn))
+        return min(candidates)[1] if candidates else None
+
+    def _walk_patterns(self, arn: str) -> List[_PatternNode]:
+        """
+        The nodes of the pattern trie at which ``arn`` ends.
+        """
+        nodes = _closure([self._patterns])
+        for char in arn:
+            following = []
+            for node in nodes:
+                if node.loops:
+                    following.append(node)
+                child = node.children.get(char)
+                if child is not None:
+                    following.append(child)
+                if node.any_char is not None:
+                    following.append(node.any_char)
+            if not following:
+                return []
+            nodes = _closure(following)
+        return nodes
@@ -1,8 +1,80 @@
 import collections
-import time
-from typing import Any, Callable, Optional, Tuple
+import contextvars
+import fnmatch
+import functools
+import hashlib
+import importlib
+import itertools
+import json
+import os
+import pickle
+import tempfile
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from .states import Machine, State
+from .batching import Batcher
+from .cache import LRU
+from .clock import Clock
+from .deadlines import execution_deadline
+from .errors import describe_error, Errors, ExecutionTimedOut, StateFailed
+from .limits import Limit
+from .pages import Pages
+from .payloads import shared_payloads
+from .plan import Plan, PLAN_CACHE_SIZE
+from .routing import ArnIndex
+from .states import Machine, Sequence, State, States
+
+# Number of runs in flight when streaming inputs without MaxConcurrency
+STREAM_WINDOW = 256
+
+# Upper bound of the threads fetching pages in process mode
+PAGE_FETCH_THREADS = 32
+
+# Default number of state transitions after which an execution fails with States.Timeout,
+# so that a machine cycling without TimeoutSeconds does not run forever
+MAX_TRANSITIONS = 1_000_000
+
+# MaxPages of the state machine being executed
+_max_pages: "contextvars.ContextVar[Optional[int]]" = contextvars.ContextVar("max_pages", default=None)
+
+
+def import_provider(path: str) -> Callable:
+    """
+    Import a provider by its dotted path, either ``package.module.function``
+    or ``package.module:Class.method``.
+    """
+    if ":" in path:
+        module_name, attr_path = path.split(":", 1)
+    else:
+        module_name, _, attr_path = path.rpartition(".")
+    if not module_name or not attr_path:
+        raise ValueError(f"Invalid provider path {path!r}")
+    obj = importlib.import_module(module_name)
+    for attr in attr_path.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def provider_path(provider: Union[Callable, str]) -> str:
+    """
+    The dotted path by which ``provider`` can be imported in another process.
+    """
+    if isinstance(provider, str):
+        return provider
+    module_name = getattr(provider, "__module__", None)
+    qualname = getattr(provider, "__qualname__", None)
+    if not module_name or not qualname or "<" in qualname:
+        raise ValueError(
+            f"Provider {provider!r} cannot be imported by its name, "
+            f"register a module-level function or its dotted path instead"
+        )
+    try:
+        if import_provider(f"{module_name}:{qualname}") is not provider:
+            raise ValueError(f"Provider {provider!r} is not the object found at {module_name}:{qualname}")
+    except (ImportError, AttributeError):
+        raise ValueError(f"Provider {provider!r} cannot be imported from {module_name}:{qualname}")
+    return f"{module_name}:{qualname}"
 
 
 class ResourceManager:
@@ -15,24 +87,162 @@ class ResourceManager:
         def hello_world(payload):
             return '"Hello, world!"'
 
+    Providers can also be registered by their dotted paths which are imported
+    when the resource is first resolved:
+
+        resources = ResourceManager(providers={
+            "arn.hello-world": "my_package.providers:hello_world",
+        })
+
+    Providers can be registered for patterns of ARNs, see ``ArnIndex`` for how ARNs are resolved:
+
+        resources.register("arn:aws:lambda:us-east-1:123456789012:function:tenant-*", tenant_function)
+        resources.register("arn:aws:states:::glue:startJobRun", start_job_run)  # also serves .sync
+
+    Providers that are pure lookups can have their results cached by payload:
+
+        @resources.provider("arn.lookup", cache=LRU(maxsize=1024, ttl=60))
+        def lookup(payload):
+            ...
+
+    Resources with batch endpoints can have the concurrent calls of their providers
+    coalesced into batches, the batch provider takes a list of payloads and returns
+    the list of their results:
+
+        @resources.batch_provider("arn.get-items", max_batch=100, max_wait_ms=2)
+        def get_items(payloads):
+            return table.batch_get([payload["Key"] for payload in payloads])
+
+    Calls of providers that model throttled downstreams can be limited in concurrency
+    and rate, for resources matching a pattern (see ``limit``):
+
+        resources.limit("arn:aws:lambda:*:function:Resize", max_concurrency=10)
+        resources.limit("arn:aws:states:::dynamodb:*", rate=100, burst=100)
+
+    Resource managers are pickled with the dotted paths of their providers,
+    so they can be shipped to worker processes (see ``Runner(executor="process")``)
+    as long as all providers are importable. Each process has its own caches, batches and limits.
     """
 
-    def __init__(self, providers=None):
+    def __init__(
+        self,
+        providers=None,
+        caches: Dict[str, LRU] = None,
+        batchers: Dict[str, Batcher] = None,
+        limits: Dict[str, Limit] = None,
+    ):
         self._providers = {}
+        self._imported = {}
+        self._caches: Dict[str, LRU] = {}
+        self._batchers: Dict[str, Batcher] = {}
+        self._limits: Dict[str, Limit] = dict(limits or {})
+        self._index = ArnIndex()
+        # Resolved providers by ARN
+        self._wrapped: Dict[str, Callable] = {}
+        self._version = 0
 
         if providers:
-            self._providers.update(providers)
+            for resource_arn, provider in providers.items():
+                self.register(
+                    resource_arn,
+                    provider,
+                    cache=(caches or {}).get(resource_arn),
+                    batcher=(batchers or {}).get(resource_arn),
+                )
+
+    def __getstate__(self):
+        return {
+            "providers": {arn: provider_path(provider) for arn, provider in self._providers.items()},
+            "caches": self._caches,
+            "batchers": self._batchers,
+            "limits": self._limits,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(
+            providers=state["providers"],
+            caches=state.get("caches"),
+            batchers=state.get("batchers"),
+            limits=state.get("limits"),
+        )
+
+    @property
+    def version(self) -> int:
+        """
+        Incremented every time a provider is registered.
+        """
+        return self._version
 
     def resolve(self, resource_arn: str):
-        try:
-            return self._providers[resource_arn]
-        except KeyError:
+        provider = self._wrapped.get(resource_arn)
+        if provider is not None:
+            return provider
+
+        pattern = self._index.resolve(resource_arn)
+        if pattern is None:
             raise RuntimeError(f"Failed to resolve resource {resource_arn!r} -- no provider registered")
+        provider = self._providers[pattern]
+        if isinstance(provider, str):
+            if provider not in self._imported:
+                self._imported[provider] = import_provider(provider)
+            provider = self._imported[provider]
+        # Limits apply to the calls of the provider itself, not to the calls that are
+        # batched or cached. They are acquired in the order they were set.
+        for limit in reversed(self.limits_of(resource_arn)):
+            provider = limit.wrap(provider)
+        if pattern in self._batchers:
+            provider = self._batchers[pattern].wrap(provider)
+        if pattern in self._caches:
+            provider = self._caches[pattern].wrap(provider, pattern)
+        self._wrapped[resource_arn] = provider
+        return provider
 
     def __call__(self, resource_arn: str):
         return self.resolve(resource_arn)
 
-    def provider(self, resource_arn) -> Callable:
+    def limit(
+        self, pattern: str, max_concurrency: int = None, rate: float = None, burst: int = 1, limit: Limit = None,
+    ) -> Limit:
+        """
+        Limit the calls of the providers of the resources matching ``pattern``, an ARN
+        or a shell-style pattern of ARNs (``*`` and ``?``, see ``fnmatch``), to ``max_concurrency``
+        at a time and to ``rate`` per second with bursts of ``burst`` (see ``Limit``), or to ``limit``.
+        All the matching resources share the limit, set one per ARN to limit them separately.
+        Returns the limit, whose ``info()`` tells how many calls it throttled and how long they waited.
+        """
+        if limit is None:
+            limit = Limit(max_concurrency=max_concurrency, rate=rate, burst=burst)
+        self._limits[pattern] = limit
+        self._wrapped.clear()
+        self._version += 1
+        return limit
+
+    def limits_of(self, resource_arn: str) -> List[Limit]:
+        """
+        The limits of the calls of ``resource_arn``.
+        """
+        return [limit for pattern, limit in self._limits.items() if fnmatch.fnmatchcase(resource_arn, pattern)]
+
+    def register(
+        self, resource_arn, provider: Union[Callable, str], cache: LRU = None, batcher: Batcher = None,
+    ) -> None:
+        """
+        Register a provider, or the dotted path of one, for a resource or a pattern of resources.
+        With ``cache`` its results are cached by payload (see ``LRU``).
+        With ``batcher`` it is a batch provider (see ``Batcher``).
+        """
+        self._providers[resource_arn] = provider
+        self._index.add(resource_arn)
+        # The new pattern may take over resources resolved already
+        self._wrapped.clear()
+        for wrappers, wrapper in ((self._caches, cache), (self._batchers, batcher)):
+            if wrapper is None:
+                wrappers.pop(resource_arn, None)
+            else:
+                wrappers[resource_arn] = wrapper
+        self._version += 1
+
+    def provider(self, resource_arn, cache: LRU = None) -> Callable:
         """
         Decorator to register a resource provider.
         The decorated function should take one positional argument `payload`
@@ -40,50 +250,544 @@ class ResourceManager:
         """
 
         def decorator(func):
-            self._providers[resource_arn] = func
+            self.register(resource_arn, func, cache=cache)
+            return func
+
+        return decorator
+
+    def batch_provider(self, resource_arn, max_batch: int = 100, max_wait_ms: float = 2.0, cache: LRU = None):
+        """
+        Decorator to register a batch provider of a resource.
+        The decorated function should take a list of payloads and return the list
+        of their results, concurrent invocations of the resource are coalesced into
+        batches of at most ``max_batch`` payloads waiting at most ``max_wait_ms``
+        (see ``Batcher``).
+        """
+
+        def decorator(func):
+            batcher = Batcher(max_batch=max_batch, max_wait_ms=max_wait_ms)
+            self.register(resource_arn, func, cache=cache, batcher=batcher)
             return func
 
         return decorator
 
 
 class Runner:
-    def __init__(self, resources: ResourceManager=None):
+    """
+    Executes state machines locally, invoking resource providers registered
+    in the ``ResourceManager``.
+
+    Branches of Parallel states are run concurrently on ``executor``:
+
+    - ``"thread"`` (the default) -- a ``ThreadPoolExecutor`` with ``max_workers`` threads,
+    - ``"process"`` -- a ``ProcessPoolExecutor`` with ``max_workers`` processes,
+      for CPU-bound providers. All providers must be importable by their dotted
+      paths (see ``ResourceManager``), and inputs and outputs must be picklable,
+    - an ``Executor`` instance.
+
+    The runner creates the executor when it is first needed, unless one is passed in.
+    Call ``close`` (or use the runner as a context manager) to shut down
+    the executor created by the runner.
+
+    ``clock`` is what the runner waits on between the attempts of a Retry, pass
+    a ``VirtualClock`` to skip the waiting. Worker processes get a copy of it.
+
+    An execution, and each branch of it, fails with ``States.Timeout`` after ``max_transitions``
+    state transitions, also when neither the state machine nor the caller set a timeout.
+    """
+
+    def __init__(
+        self,
+        resources: ResourceManager = None,
+        executor: Union[Executor, str] = "thread",
+        max_workers: int = None,
+        clock: Clock = None,
+        max_transitions: int = MAX_TRANSITIONS,
+    ):
         self._resources: ResourceManager = resources or ResourceManager()
+        self.clock: Clock = clock or Clock()
+        self.max_transitions = max_transitions
+        if executor is None:
+            executor = "thread"
+        if isinstance(executor, str):
+            if executor not in ("thread", "process"):
+                raise ValueError(f"Unsupported executor {executor!r}, expected 'thread' or 'process'")
+            self._executor: Optional[Executor] = None
+            self._executor_kind = executor
+            self._owns_executor = True
+        else:
+            self._executor = executor
+            self._executor_kind = "process" if isinstance(executor, ProcessPoolExecutor) else "thread"
+            self._owns_executor = False
+        self._max_workers = max_workers
+        self._executor_lock = threading.Lock()
+        self._pickled_resources: Optional[Tuple[int, str, bytes]] = None
+        # Definitions and resource managers shipped to worker processes, see ``_ship``
+        self._worker_store: Optional[tempfile.TemporaryDirectory] = None
+        self._shipped = set()
+
+    @property
+    def resources(self) -> ResourceManager:
+        return self._resources
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None and self._executor_kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+                elif self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._max_workers,
+                        thread_name_prefix="aws-sfn-builder",
+                    )
+        return self._executor
 
-    def resource_provider(self, resource_arn) -> Callable:
+    @property
+    def uses_processes(self) -> bool:
+        return self._executor_kind == "process"
+
+    def close(self):
+        """
+        Shut down the executor if it was created by the runner.
+        """
+        with self._executor_lock:
+            if self._owns_executor and self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+            if self._worker_store is not None:
+                self._worker_store.cleanup()
+                self._worker_store = None
+                self._shipped = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def resource_provider(self, resource_arn, cache: LRU = None) -> Callable:
         """
         An alternative to ResourceManager.provider of registering a resource provider
         -- through the Runner instance. Handy when you don't have or don't need
         an explicit ResourceManager instance.
         """
-        return self._resources.provider(resource_arn)
+        return self._resources.provider(resource_arn, cache=cache)
+
+    def batch_resource_provider(
+        self, resource_arn, max_batch: int = 100, max_wait_ms: float = 2.0, cache: LRU = None,
+    ) -> Callable:
+        """
+        Registers a batch provider through the Runner instance, see ``ResourceManager.batch_provider``.
+        """
+        return self._resources.batch_provider(resource_arn, max_batch=max_batch, max_wait_ms=max_wait_ms, cache=cache)
+
+    def run(self, sm: Machine, input=None, _timeout=None) -> Tuple[Optional[State], Any]:
+        """
+        Execute the state machine using its compiled plan (see ``Machine.compile_plan``).
+        Returns the final state and the output.
+
+        The execution fails with ``States.Timeout`` once it has taken longer than
+        TimeoutSeconds of the state machine or ``_timeout`` seconds on the clock of the runner,
+        or has made more than ``max_transitions`` state transitions.
+        """
+        if input is None:
+            input = {}
+
+        plan = sm.compile_plan()
+        token = _max_pages.set(sm.max_pages)
+        try:
+            index, output = self._run_plan(plan, input, sm.comment or sm.name, execution_timeout(sm, _timeout))
+        finally:
+            _max_pages.reset(token)
+
+        # Return the final state
+        if index is None:
+            return None, output
+        return sm.states[plan.names[index]], output
+
+    def walk(self, sm: Machine, input=None, _timeout=None) -> Tuple[Optional[State], Any]:
+        """
+        Execute the state machine by walking its states one by one.
 
-    def run(self, sm: Machine, input=None, _timeout=2) -> Tuple[Optional[State], Any]:
+        This is the reference implementation of ``run`` which is easier to follow and debug
+        but slower.
+        """
         if input is None:
             input = {}
 
-        start_time = time.time()
+        token = _max_pages.set(sm.max_pages)
+        try:
+            return self._walk_sequence(sm, input, execution_timeout(sm, _timeout))
+        finally:
+            _max_pages.reset(token)
+
+    def run_branches(self, branches: List[Sequence], input, walk=False, _timeout=None) -> List:
+        """
+        Run branches of a Parallel state concurrently, all of them with ``input``.
+        Returns the list of outputs of the branches in the order of the branches.
+
+        With ``walk=True`` the branches are executed like ``walk`` does it.
+        """
+        return self.run_sequences(branches, [input] * len(branches), walk=walk, _timeout=_timeout)
+
+    def run_sequences(
+        self, sequences: List[Sequence], inputs: List, walk=False, max_concurrency: int = None, _timeout=None,
+    ) -> List:
+        """
+        Run each of ``sequences`` with the corresponding item of ``inputs`` concurrently,
+        at most ``max_concurrency`` at a time if it is set (``0`` or ``None`` means no limit).
+        Returns the list of outputs in the order of the sequences.
+
+        Inputs are not copied: states never modify their input (ResultPath copies only
+        the objects on the way to the result, see ``Path.assign``), so runs share it.
+        """
+        limit = max_concurrency or len(sequences)
+
+        if not self.uses_processes:
+            if len(sequences) <= 1 or limit == 1:
+                run_sequence = self._walk_branch if walk else self._run_branch
+                return [run_sequence(sequence, input, _timeout) for sequence, input in zip(sequences, inputs)]
+
+        return list(self._stream_sequences(zip(sequences, inputs), walk, limit, _timeout))
+
+    def stream_sequence(
+        self, sequence: Sequence, inputs: Iterable, walk=False, max_concurrency: int = None, _timeout=None,
+    ) -> Iterator:
+        """
+        Run ``sequence`` for each item of ``inputs`` and yield the outputs in the order of the inputs.
+
+        ``inputs`` may be a lazy iterable of any length: at most ``max_concurrency`` runs
+        (``STREAM_WINDOW`` if it is not set) are in flight and the next input is only taken
+        once the oldest run has finished, so memory use does not grow with the number of inputs.
+        """
+        return self._stream_sequences(
+            ((sequence, input) for input in inputs), walk, max_concurrency or STREAM_WINDOW, _timeout,
+        )
+
+    def _stream_sequences(self, runs: Iterable[Tuple[Sequence, Any]], walk, limit: int, _timeout) -> Iterator:
+        runs = iter(runs)
+
+        if self.uses_processes:
+            while True:
+                chunk = list(itertools.islice(runs, limit))
+                if not chunk:
+                    return
+                sequences, inputs = zip(*chunk)
+                yield from self._run_sequences_in_processes(sequences, inputs, walk, _timeout)
+
+        if walk:
+            run_sequence = functools.partial(self._walk_branch, _timeout=_timeout)
+        else:
+            run_sequence = functools.partial(self._run_branch, _timeout=_timeout)
+
+        timelines = self.clock.timelines(limit)
+
+        def run_on_timeline(run):
+            with timelines.run():
+                return run_sequence(*run)
+
+        yield from self._map_ordered(self.executor, run_on_timeline, runs, limit)
+        timelines.join()
+
+    @staticmethod
+    def _map_ordered(executor: Executor, func: Callable, args: Iterable, limit: int) -> Iterator:
+        """
+        Yield ``func(arg)`` for each of ``args`` in order, calling it on ``executor`` with
+        at most ``limit`` calls in flight. Calls run in the context of the caller.
+        """
+        def wait(arg, future):
+            if future.cancel():
+                # Not started yet, most likely because all workers are busy running
+                # the branches of outer Parallel states. Run it here instead of waiting.
+                return func(arg)
+            return future.result()
+
+        # Calls are submitted to the executor in order, keeping at most ``limit`` of them
+        # in flight, and the results are yielded in the same order.
+        pending = collections.deque()
+        try:
+            for arg in args:
+                if len(pending) >= limit:
+                    yield wait(*pending.popleft())
+                pending.append((arg, executor.submit(contextvars.copy_context().run, func, arg)))
+            while pending:
+                yield wait(*pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def fetch_pages(self, pages: Pages) -> Any:
+        """
+        Fetch the pages of a paginated result concurrently, at most ``MaxPages`` of the
+        state machine at a time, and merge them in page order.
+
+        Pages are fetched on the thread pool of the runner, or on a thread pool of their own
+        in process mode.
+        """
+        cursors = pages.remaining_cursors
+        limit = _max_pages.get() or len(cursors) or 1
+        if self.uses_processes:
+            with ThreadPoolExecutor(max_workers=min(limit, PAGE_FETCH_THREADS)) as executor:
+                fetched = list(self._map_ordered(executor, pages.fetch, cursors, limit))
+        else:
+            fetched = list(self._map_ordered(self.executor, pages.fetch, cursors, limit))
+        return pages.combine(fetched)
+
+    def _run_sequences_in_processes(self, sequences: List[Sequence], inputs: List, walk, _timeout) -> List:
+        # Definitions and the resource manager are shipped once, and worker processes load
+        # and keep them between tasks, so tasks only carry keys to them.
+        resources_key = self._ship_resources()
+        max_pages = _max_pages.get()
+        keys = []
+        for sequence in sequences:
+            key = sequence.compile_plan().key
+            if key not in self._shipped:
+                self._ship(key, json.dumps(sequence.compile(), separators=(",", ":")).encode("utf-8"))
+            keys.append(key)
+
+        futures = [
+            self.executor.submit(
+                _run_sequence_in_worker, self._worker_store.name, key, resources_key, input, walk, _timeout,
+                max_pages, self.clock, self.max_transitions,
+            )
+            for key, input in zip(keys, inputs)
+        ]
+        try:
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _ship(self, key: str, data: bytes) -> None:
+        """
+        Make ``data`` available to worker processes by ``key``, in a file of a directory
+        of the runner which ``close`` removes.
+        """
+        with self._executor_lock:
+            if self._worker_store is None:
+                self._worker_store = tempfile.TemporaryDirectory(prefix="aws-sfn-builder-")
+            path = os.path.join(self._worker_store.name, key)
+            with open(f"{path}.{threading.get_ident()}", "wb") as f:
+                f.write(data)
+            # Workers never see a partly written file
+            os.replace(f"{path}.{threading.get_ident()}", path)
+            self._shipped.add(key)
+
+    def _ship_resources(self) -> str:
+        resources_key, resources_blob = self._pickle_resources()
+        if resources_key not in self._shipped:
+            self._ship(resources_key, resources_blob)
+        return resources_key
+
+    def _pickle_resources(self) -> Tuple[str, bytes]:
+        pickled = self._pickled_resources
+        if pickled is None or pickled[0] != self._resources.version:
+            blob = pickle.dumps(self._resources)
+            pickled = self._pickled_resources = (self._resources.version, hashlib.sha1(blob).hexdigest(), blob)
+        return pickled[1], pickled[2]
+
+    def _run_branch(self, branch: Sequence, input, _timeout) -> Any:
+        plan = branch.compile_plan()
+        with shared_payloads():
+            index, output = self._run_plan(plan, input, branch.comment or branch.name, _timeout)
+        if index is not None and plan.states[index].type == States.Fail:
+            raise branch_failed(plan.states[index], output)
+        return output
+
+    def _walk_branch(self, branch: Sequence, input, _timeout) -> Any:
+        with shared_payloads():
+            state, output = self._walk_sequence(branch, input, _timeout)
+        if state is not None and state.type == States.Fail:
+            raise branch_failed(state, output)
+        return output
+
+    def _run_plan(self, plan: Plan, input, label: str, _timeout) -> Tuple[Optional[int], Any]:
+        steps = plan.steps
+        delays = plan.delays
+        clock = self.clock
+
+        deadline = clock.time() + _timeout if _timeout is not None else None
+        index = None
+        next_index = plan.start
+        transitions_left = self.max_transitions
+
+        last_10_states = collections.deque(maxlen=10)
+
+        with execution_deadline(clock, deadline):
+            while next_index is not None:
+                index = next_index
+                last_10_states.append(index)
+                transitions_left -= 1
+                if transitions_left < 0:
+                    raise too_many_transitions(label, self.max_transitions, [plan.names[i] for i in last_10_states])
+                delay = delays[index]
+                if delay is not None:
+                    try:
+                        seconds = delay(input, clock.time())
+                    except Exception as e:
+                        raise state_failed(plan.states[index], e)
+                    if not self._sleep(seconds, deadline):
+                        raise timed_out(label, _timeout, [plan.names[i] for i in last_10_states])
+                try:
+                    next_index, input = steps[index](input, self)
+                except ExecutionTimedOut:
+                    if deadline is None:
+                        raise
+                    raise timed_out(label, _timeout, [plan.names[i] for i in last_10_states])
+                except Exception as e:
+                    raise state_failed(plan.states[index], e)
+                if deadline is not None and clock.time() > deadline:
+                    raise timed_out(label, _timeout, [plan.names[i] for i in last_10_states])
+
+        return index, input
+
+    def _walk_sequence(self, sequence: Sequence, input, _timeout) -> Tuple[Optional[State], Any]:
+        clock = self.clock
+        label = sequence.comment or sequence.name
+
+        deadline = clock.time() + _timeout if _timeout is not None else None
         state = None
-        next_state = sm.start_at
+        next_state = sequence.start_at
+        transitions_left = self.max_transitions
 
         last_10_states = collections.deque()
 
-        while next_state is not None:
-            state = sm.states[next_state]
-            last_10_states.append(next_state)
-            while len(last_10_states) > 10:
-                last_10_states.popleft()
-            try:
-                next_state, input = state.execute(input=input, resource_resolver=self._resources)
-            except Exception as e:
-                raise RuntimeError(
-                    f"State {state.name} ({state.type}) execution failed with an exception: {e!r}"
-                )
-            if time.time() - start_time > _timeout:
-                raise RuntimeError(
-                    f"State machine {(sm.comment or sm.name)!r} failed to terminate in {_timeout} seconds. "
-                    f"Last {len(last_10_states)} states: {last_10_states}.",
-                )
+        with execution_deadline(clock, deadline):
+            while next_state is not None:
+                state = sequence.states[next_state]
+                last_10_states.append(next_state)
+                while len(last_10_states) > 10:
+                    last_10_states.popleft()
+                transitions_left -= 1
+                if transitions_left < 0:
+                    raise too_many_transitions(label, self.max_transitions, list(last_10_states))
+                if state.type == States.Wait:
+                    try:
+                        seconds = state.seconds_to_wait(input, clock.time())
+                    except Exception as e:
+                        raise state_failed(state, e)
+                    if not self._sleep(seconds, deadline):
+                        raise timed_out(label, _timeout, list(last_10_states))
+                try:
+                    next_state, input = state.execute(input=input, resource_resolver=self._resources, runner=self)
+                except ExecutionTimedOut:
+                    if deadline is None:
+                        raise
+                    raise timed_out(label, _timeout, list(last_10_states))
+                except Exception as e:
+                    raise state_failed(state, e)
+                if deadline is not None and clock.time() > deadline:
+                    raise timed_out(label, _timeout, list(last_10_states))
 
         # Return the final state
         return state, input
+
+    def _sleep(self, seconds: float, deadline: Optional[float]) -> bool:
+        """
+        Wait for ``seconds`` on the clock, but not past ``deadline``.
+        Returns ``False`` if the deadline came first.
+        """
+        if deadline is not None and self.clock.time() + seconds > deadline:
+            self.clock.sleep(deadline - self.clock.time())
+            return False
+        self.clock.sleep(seconds)
+        return True
+
+
+def execution_timeout(sm: Machine, _timeout: float = None) -> Optional[float]:
+    """
+    TimeoutSeconds of the state machine or ``_timeout``, whichever is shorter.
+    """
+    timeouts = [timeout for timeout in (sm.timeout_seconds, _timeout) if timeout is not None]
+    return min(timeouts) if timeouts else None
+
+
+def timed_out(label: str, timeout: float, last_states: List[str]) -> StateFailed:
+    """
+    The exception with which an execution fails when it has run out of time.
+    """
+    return StateFailed(
+        f"State machine {label!r} failed to terminate in {timeout} seconds. "
+        f"Last {len(last_states)} states: {last_states}.",
+        error=Errors.Timeout,
+    )
+
+
+def too_many_transitions(label: str, max_transitions: int, last_states: List[str]) -> StateFailed:
+    """
+    The exception with which an execution fails when it has made more than ``max_transitions``
+    state transitions, most likely cycling forever.
+    """
+    return StateFailed(
+        f"State machine {label!r} failed to terminate in {max_transitions} state transitions. "
+        f"Last {len(last_states)} states: {last_states}.",
+        error=Errors.Timeout,
+    )
+
+
+def state_failed(state: State, exc: Exception) -> StateFailed:
+    """
+    The exception with which an execution fails when ``state`` raises ``exc``.
+    """
+    error, cause = describe_error(exc)
+    return StateFailed(
+        f"State {state.name} ({state.type}) execution failed with an exception: {exc!r}",
+        error=error, cause=cause, state=state.name,
+    )
+
+
+def branch_failed(state: State, output: Dict) -> StateFailed:
+    """
+    The exception with which a branch fails when it ends in the Fail ``state`` with ``output``.
+    """
+    return StateFailed(
+        f"State {state.name} ({state.type}) failed the branch: {output!r}",
+        error=output.get("Error", Errors.BranchFailed), cause=output.get("Cause"), state=state.name,
+    )
+
+
+# State of a worker process of Runner(executor="process"): parsed sequences by definition hash
+# and runners by resource manager hash, the PLAN_CACHE_SIZE most recently used of them.
+# Workers run one task at a time, the cache is not shared between threads.
+_worker_cache: "collections.OrderedDict[str, Any]" = collections.OrderedDict()
+
+
+def _load_in_worker(store: str, key: str, load: Callable[[bytes], Any]) -> Any:
+    """
+    The object shipped by the runner as ``key`` (see ``Runner._ship``), loaded once per worker.
+    """
+    loaded = _worker_cache.get(key)
+    if loaded is None:
+        with open(os.path.join(store, key), "rb") as f:
+            loaded = _worker_cache[key] = load(f.read())
+    _worker_cache.move_to_end(key)
+    while len(_worker_cache) > PLAN_CACHE_SIZE:
+        _worker_cache.popitem(last=False)
+    return loaded
+
+
+def _load_sequence(definition: bytes) -> Sequence:
+    return State.parse(json.loads(definition), type=States.Sequence)
+
+
+def _load_runner(resources_blob: bytes) -> "Runner":
+    return Runner(resources=pickle.loads(resources_blob))
+
+
+def _run_sequence_in_worker(
+    store: str, key: str, resources_key: str, input, walk: bool, _timeout, max_pages: Optional[int] = None,
+    clock: Clock = None, max_transitions: int = MAX_TRANSITIONS,
+):
+    sequence = _load_in_worker(store, key, _load_sequence)
+    runner = _load_in_worker(store, resources_key, _load_runner)
+
+    runner.clock = clock or Clock()
+    runner.max_transitions = max_transitions
+    token = _max_pages.set(max_pages)
+    try:
+        if walk:
+            return runner._walk_branch(sequence, input, _timeout)
+        return runner._run_branch(sequence, input, _timeout)
+    finally:
+        _max_pages.reset(token)
@@ -0,0 +1,237 @@
+"""
+Running many executions in one thread.
+
+Executions parked at Wait states, or waiting to retry a state, are kept in a heap ordered by the time they are due,
+instead of each holding a thread, and the scheduler sleeps until the earliest one is due.
+With a ``VirtualClock`` it does not sleep but jumps straight to that time.
+"""
+import collections
+import heapq
+import itertools
+from typing import Any, List, Optional, Tuple
+
+from .deadlines import execution_deadline
+from .errors import Errors, ExecutionTimedOut, Recovery, StateFailed
+from .plan import Plan
+from .runner import _max_pages, execution_timeout, Runner, state_failed, timed_out, too_many_transitions
+from .states import Machine, State, States
+
+
+class Execution:
+    """
+    An execution started by ``Scheduler.start``.
+
+    Once the scheduler has run it, ``status`` is one of ``SUCCEEDED``, ``FAILED``
+    (also when it ends in a Fail state, ``output`` then has its Error and Cause)
+    or ``TIMED_OUT``, and ``error`` is the ``StateFailed`` of an execution that
+    did not end in a Succeed, Fail or End state.
+    """
+
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+    TIMED_OUT = "TIMED_OUT"
+
+    __slots__ = (
+        "machine", "plan", "input", "output", "status", "error",
+        "timeout", "deadline", "index", "next_index", "last_states", "transitions", "recovery", "_parked_for",
+    )
+
+    def __init__(self, machine: Machine, plan: Plan, input, timeout: Optional[float], now: float):
+        self.machine = machine
+        self.plan = plan
+        self.input = input
+        self.output = None
+        self.status = self.RUNNING
+        self.error: Optional[StateFailed] = None
+        self.timeout = timeout
+        self.deadline = now + timeout if timeout is not None else None
+        self.index: Optional[int] = None
+        self.next_index: Optional[int] = plan.start
+        self.last_states = collections.deque(maxlen=10)
+        self.transitions = 0
+        # Retry and Catch of the state being retried
+        self.recovery: Optional[Recovery] = None
+        # What the execution is parked for: None, "wait" or "timeout"
+        self._parked_for: Optional[str] = None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.machine.comment or self.machine.name!r} {self.status}>"
+
+    @property
+    def done(self) -> bool:
+        return self.status != self.RUNNING
+
+    @property
+    def final_state(self) -> Optional[State]:
+        if self.index is None:
+            return None
+        return self.machine.states[self.plan.names[self.index]]
+
+    @property
+    def result(self) -> Tuple[Optional[State], Any]:
+        """
+        The final state and the output, like ``Runner.run`` returns them.
+        Raises the error of an execution that failed with one.
+        """
+        if self.error is not None:
+            raise self.error
+        return self.final_state, self.output
+
+
+class Scheduler:
+    """
+    Runs executions of state machines with the providers and the clock of ``runner``,
+    all in the calling thread except for the branches of Parallel and Map states.
+
+        scheduler = Scheduler(Runner(clock=VirtualClock()))
+        executions = [scheduler.start(state_machine, input) for input in inputs]
+        scheduler.run()
+        outputs = [execution.output for execution in executions]
+
+    Executions at Wait states and between the attempts of a Retry are parked until they are due.
+    Wait states inside branches of Parallel and Map states wait on their own thread.
+    """
+
+    def __init__(self, runner: Runner = None):
+        self.runner = runner or Runner()
+        self._ready = collections.deque()
+        self._timers: List[Tuple[float, int, Execution]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def clock(self):
+        return self.runner.clock
+
+    @property
+    def parked(self) -> int:
+        """
+        Number of executions waiting for their time to come.
+        """
+        return len(self._timers)
+
+    def start(self, sm: Machine, input=None, _timeout=None) -> Execution:
+        """
+        Add an execution of ``sm`` to the scheduler. It starts running when ``run`` is called.
+        """
+        if input is None:
+            input = {}
+        execution = Execution(sm, sm.compile_plan(), input, execution_timeout(sm, _timeout), self.clock.time())
+        self._ready.append(execution)
+        return execution
+
+    def run(self) -> None:
+        """
+        Run all executions until they have finished.
+        """
+        clock = self.clock
+        while self._ready or self._timers:
+            while self._ready:
+                self._advance(self._ready.popleft())
+            if self._timers:
+                clock.sleep_until(self._timers[0][0])
+                now = clock.time()
+                while self._timers and self._timers[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._timers)[2])
+
+    def _park(self, execution: Execution, seconds: float) -> None:
+        due = self.clock.time() + seconds
+        if execution.deadline is not None and due > execution.deadline:
+            due = execution.deadline
+            execution._parked_for = "timeout"
+        else:
+            execution._parked_for = "wait"
+        heapq.heappush(self._timers, (due, next(self._sequence), execution))
+
+    def _advance(self, execution: Execution) -> None:
+        """
+        Run the execution until it parks at a Wait state or finishes.
+        """
+        clock = self.clock
+        runner = self.runner
+        plan = execution.plan
+        steps = plan.steps
+        attempts = plan.attempts
+        delays = plan.delays
+        deadline = execution.deadline
+        input = execution.input
+        index = execution.next_index
+
+        token = _max_pages.set(execution.machine.max_pages)
+        try:
+            while index is not None:
+                if execution._parked_for is None:
+                    execution.last_states.append(plan.names[index])
+                    execution.transitions += 1
+                    if execution.transitions > runner.max_transitions:
+                        raise too_many_transitions(execution.machine.comment or execution.machine.name,
+                                                   runner.max_transitions, list(execution.last_states))
+                    delay = delays[index]
+                    if delay is not None:
+                        try:
+                            seconds = delay(input, clock.time())
+                        except Exception as e:
+                            raise state_failed(plan.states[index], e)
+                        if seconds > 0:
+                            execution.input = input
+                            execution.next_index = index
+                            self._park(execution, seconds)
+                            return
+                elif execution._parked_for == "timeout":
+                    raise timed_out(execution.machine.comment or execution.machine.name, execution.timeout,
+                                    list(execution.last_states))
+                execution._parked_for = None
+
+                execution.index = index
+                attempt = attempts[index]
+                try:
+                    with execution_deadline(clock, deadline):
+                        if attempt is None:
+                            index, input = steps[index](input, runner)
+                        else:
+                            try:
+                                index, input = attempt[0](input, runner)
+                            except Exception as e:
+                                if execution.recovery is None:
+                                    execution.recovery = plan.states[index].recovery()
+                                delay, next_index, output = attempt[1](execution.recovery, input, e)
+                                if delay is not None:
+                                    # Retried once the delay is over, like a Wait
+                                    execution.input = input
+                                    execution.next_index = index
+                                    self._park(execution, delay)
+                                    return
+                                index, input = next_index, output
+                            execution.recovery = None
+                except ExecutionTimedOut:
+                    if deadline is None:
+                        raise
+                    raise timed_out(execution.machine.comment or execution.machine.name, execution.timeout,
+                                    list(execution.last_states))
+                except Exception as e:
+                    raise state_failed(plan.states[index], e)
+                if deadline is not None and clock.time() > deadline:
+                    raise timed_out(execution.machine.comment or execution.machine.name, execution.timeout,
+                                    list(execution.last_states))
+        except StateFailed as e:
+            execution.error = e
+            if e.error == Errors.Timeout and e.state is None:
+                execution.status = Execution.TIMED_OUT
+            else:
+                execution.status = Execution.FAILED
+            return
+        except ExecutionTimedOut as e:
+            # Ran out of time in a branch, without a deadline of its own
+            execution.error = StateFailed(str(e), error=Errors.Timeout)
+            execution.status = Execution.TIMED_OUT
+            return
+        finally:
+            _max_pages.reset(token)
+
+        execution.input = None
+        execution.next_index = None
+        execution.output = input
+        if execution.final_state is not None and execution.final_state.type == States.Fail:
+            execution.status = Execution.FAILED
+        else:
+            execution.status = Execution.SUCCEEDED
@@ -1,135 +1,34 @@
+import datetime as dt
+import functools
 import json
-from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
 from uuid import uuid4
 
 import dataclasses
 from bidict import bidict
-from jsonpath_ng import parse as parse_jsonpath, Index, Child
 
 from .base import Node
-from .choice_rules import ChoiceRule
+from .choice_rules import ChoiceRule, compile_choices
+from .deadlines import acall_with_deadlines, call_with_deadlines
+from .errors import Catcher, Recovery, Retrier
+from .items import batch_items, read_items, ResultFileWriter
+from .jsonpath import compile_path
+from .lazy_json import ARRAY_TYPES
+from .pages import Pages
+from .payloads import copy_payload, provider_input
+from .plan import get_plan, Plan
+from .templates import compile_template, format_dict  # noqa: F401
+from .vectorized import route_many
+
+if TYPE_CHECKING:
+    from .async_runner import AsyncRunner  # noqa: F401
+    from .runner import Runner  # noqa: F401
 
 
 def _generate_name():
     return str(uuid4())
 
 
-def find_index(full_path):
-    if full_path.right:
-        if isinstance(full_path.right, Index):
-            return full_path.right.index
-        else:
-            if isinstance(full_path.left, Index):
-                return full_path.left.index
-            else:
-                return find_index(full_path.left)
-    return None
-
-
-def find_indexes(full_path, just_first=False):
-    if full_path.right:
-        if isinstance(full_path.right, Index):
-            if isinstance(full_path.left, Child):
-                if just_first:
-                    return find_indexes(full_path.left, just_first)
-                return str(find_indexes(full_path.left)) + "-" + str(full_path.right.index)
-            else:
-                return full_path.right.index
-        else:
-            if isinstance(full_path.left, Index):
-                if isinstance(full_path.right, Child):
-                    if just_first:
-                        return find_indexes(full_path.right, just_first)
-                    return str(find_indexes(full_path.right)) + "-" + str(full_path.left.index)
-                else:
-                    return full_path.left.index
-            else:
-                return find_indexes(full_path.left, just_first)
-    return None
-
-
-def add_to_array_inner(array_param, index, indexes, name, value):
-    to_add = index - len(array_param) + 1
-    for i in range(to_add):
-        array_param.append({})
-    if indexes not in array_param[index]:
-        array_param[index][indexes] = {}
-    # if indexes not in array_param[index][name]:
-    #     array_param[index][name][indexes] = {}
-    array_param[index][indexes][name] = value
-
-
-def add_to_array(array_param, index, name, value):
-    to_add = index - len(array_param) + 1
-    for i in range(to_add):
-        array_param.append({})
-    array_param[index][name] = value
-
-
-def format_array(input, dict_param):
-    new_array = []
-    for name, value in dict_param.items():
-        if name.endswith('.$'):
-            name = name[:-2]
-        if value.startswith("$") and "[*]" in value:
-            parse_json(input, value, name, new_array)
-    return new_array
-
-
-def remove_alias(name):
-    try:
-        idx = name.index("_ALIAS")
-        return name[:idx]
-    except ValueError:
-        return name
-    # if "_ALIAS" in name:
-
-
-def parse_json(input, value, name, new_array=None):
-    parsed = parse_jsonpath(value)
-    found = parsed.find(input)
-    name_temp = remove_alias(name[:-3])
-    if found and isinstance(found, list) and "[*]" in value:
-        if new_array is None:
-            new_array = []
-        for item in found:
-            new_value = item.value
-            if name.endswith('[*]'):
-                index = find_indexes(item.full_path, True)
-                indexes = find_indexes(item.full_path)
-                add_to_array_inner(new_array, int(index), indexes, name_temp, new_value)
-            else:
-                index = find_index(item.full_path)
-                add_to_array(new_array, index, name, new_value)
-        return new_array
-    if found:
-        value = found[0].value
-    return value
-
-
-def format_dict(input, dict_param):
-    if isinstance(dict_param, list):
-        return dict_param
-    new_params = {}
-    for name, value in dict_param.items():
-        if name.endswith('.$'):
-            name = name[:-2]
-        if isinstance(value, str) and value.startswith("$") and name.endswith('[*]'):
-            name = name[:-3]
-            value = parse_json(input, value, name)
-        elif isinstance(value, dict) or isinstance(value, list):
-            if name.endswith('[*]'):
-                name = name[:-3]
-                new_params[name] = format_array(input, value)
-            else:
-                new_params[name] = format_dict(input, value)
-            continue
-        if isinstance(value, str) and value.startswith("$."):
-            value = parse_json(input, value, name)
-        new_params[name] = value
-    return new_params
-
-
 class States:
     """
     Namespace for all names of states.
@@ -142,6 +41,7 @@ class States:
     Succeed = "Succeed"
     Fail = "Fail"
     Parallel = "Parallel"
+    Map = "Map"
 
     Sequence = "Sequence"
     Machine = "Machine"
@@ -154,6 +54,7 @@ class States:
         Succeed,
         Fail,
         Parallel,
+        Map,
         Sequence,
         Machine,
     ]
@@ -217,6 +118,22 @@ class State(Node):
     output_path: str = None
     result_path: str = None
 
+    def __post_init__(self):
+        self.compile_paths()
+
+    def compile_paths(self):
+        """
+        Compile all JSONPath expressions of the state so that they are not parsed
+        on every execution. Invalid paths are reported here, at parse time.
+
+        Call this again after changing any of the path attributes in place.
+        """
+        self._input_path = compile_path(self.input_path) if self.input_path else None
+        self._output_path = compile_path(self.output_path) if self.output_path else None
+        self._result_path = compile_path(self.result_path) if self.result_path else None
+        self._parameters = compile_template(self.parameters) if self.parameters else None
+        self._result_selector = compile_template(self.result_selector) if self.result_selector else None
+
     @classmethod
     def parse(cls, raw: Any, **fields) -> "State":
         # Dictionary with no type defaults to Task which is most likely state
@@ -246,52 +163,43 @@ class State(Node):
         """
         Applies InputPath
         """
-        if self.input_path:
-            return parse_jsonpath(self.input_path).find(input)[0].value
+        if self._input_path is not None:
+            return self._input_path.get(input)
         return input
 
     def format_state_parameters(self, input):
         """
         Applies InputPath
         """
-        if self.parameters:
-            return format_dict(input, self.parameters)
+        if self._parameters is not None:
+            return self._parameters(input)
         return input
 
     def format_result_selector(self, input):
         """
         Applies ResultSelector
         """
-        if self.result_selector:
-            return format_dict(input, self.result_selector)
+        if self._result_selector is not None:
+            return self._result_selector(input)
         return input
 
     def format_result(self, input, resource_result):
         """
         Applies ResultPath
         """
-        if self.result_path:
-            result_path = parse_jsonpath(self.result_path)
-            if not result_path.find(input):
-                # A quick hack to set a non-existent key (assuming the parent of the path is a dictionary).
-                result_path.left.find(input)[0].value[str(result_path.right)] = resource_result
-                return input
-            elif str(result_path) == "$":
-                return resource_result
-            else:
-                result_path.update(input, resource_result)
-                return input
+        if self._result_path is not None:
+            return self._result_path.assign(input, resource_result)
         return resource_result
 
     def format_state_output(self, result):
         """
         Applies OutputPath
         """
-        if not self.output_path:
+        output_path = self._output_path
+        if output_path is None:
             return result
 
-        output_path = parse_jsonpath(self.output_path)
-        if str(output_path) == "$":
+        if output_path.is_root:
             # From docs:
             # If the OutputPath has the default value of $, this matches the entire input completely.
             # In this case, the entire input is passed to the next state.
@@ -303,7 +211,7 @@ class State(Node):
                 # If the OutputPath matches an item in the state's input, only that input item is selected.
                 # This input item becomes the state's output.
                 assert len(output_matches) == 1
-                return output_matches[0].value
+                return output_matches[0]
             else:
                 # From docs:
                 # If the OutputPath doesn't match an item in the state's input,
@@ -324,16 +232,173 @@ class State(Node):
         result = self.format_result(input, resource_result)
         return self.next, self.format_state_output(result)
 
-    def execute(self, input, resource_resolver: Callable = None) -> Tuple[Optional[str], Any]:
+    def invoke(self, resource_input, resource_resolver: Callable = None, runner: "Runner" = None):
+        """
+        Produces the result of the state from its effective input.
+        """
+        return resource_resolver(self.resource)(provider_input(resource_input))
+
+    def execute(
+        self, input, resource_resolver: Callable = None, runner: "Runner" = None,
+    ) -> Tuple[Optional[str], Any]:
         resource_input = self.get_input(input)
-        resource_result = resource_resolver(self.resource)(resource_input)
+        resource_result = self.invoke(resource_input, resource_resolver, runner)
         return self.get_output(input, resource_result)
 
+    def input_path_stages(self) -> List[Callable]:
+        """
+        Functions applying InputPath, leaving it out if it is a no-op.
+        """
+        if self._input_path is not None and not self._input_path.is_root:
+            return [self._input_path.get]
+        return []
+
+    def input_stages(self) -> List[Callable]:
+        """
+        Functions applying InputPath and Parameters, leaving out the ones that are no-ops.
+        """
+        stages = self.input_path_stages()
+        if self._parameters is not None:
+            stages.append(self._parameters)
+        return stages
+
+    def output_stages(self) -> List[Callable]:
+        """
+        Functions applying OutputPath, leaving it out if it is a no-op.
+        """
+        if self._output_path is not None and not self._output_path.is_root:
+            return [self.format_state_output]
+        return []
+
+    def compile_stages(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Tuple[Optional[Callable], Callable]:
+        """
+        Compile the processing of the state's input and output around ``invoke`` into
+        ``prepare(input) -> resource_input`` (``None`` if there is nothing to prepare)
+        and ``finish(input, result) -> (next_index, output)``.
+        """
+        next_index = resolve(self.next)
+        prepare = _chain(self.input_stages())
+        select = self._result_selector
+        result_path = self._result_path
+        place = result_path.assign if result_path is not None and not result_path.is_root else None
+        output = _chain(self.output_stages())
+
+        def finish(input, result):
+            if select is not None:
+                result = select(result)
+            if place is not None:
+                result = place(input, result)
+            if output is not None:
+                result = output(result)
+            return next_index, result
+
+        return prepare, finish
+
+    def compile_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        """
+        Lower the state to a step of a ``Plan``.
+        ``resolve`` translates a state name to its index in the plan.
+        """
+        prepare, finish = self.compile_stages(resolve)
+        invoke = self.invoke
+
+        def step(input, runner):
+            resource_input = prepare(input) if prepare is not None else input
+            return finish(input, invoke(resource_input, runner.resources, runner))
+
+        return step
+
+    async def ainvoke(self, resource_input, resource_resolver: Callable = None, runner: "AsyncRunner" = None):
+        """
+        Coroutine version of ``invoke`` used by ``AsyncRunner``.
+        """
+        return await runner.call_provider(resource_resolver(self.resource), provider_input(resource_input))
+
+    def compile_async_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        """
+        Lower the state to a coroutine step of a ``Plan`` for ``AsyncRunner``.
+        """
+        prepare, finish = self.compile_stages(resolve)
+        ainvoke = self.ainvoke
+
+        async def step(input, runner):
+            resource_input = prepare(input) if prepare is not None else input
+            return finish(input, await ainvoke(resource_input, runner.resources, runner))
+
+        return step
+
+    def compile_attempt(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Optional[Tuple[Callable, Callable]]:
+        """
+        The step of a single attempt of states with Retry or Catch, see ``Task.compile_attempt``.
+        ``None`` for the others.
+        """
+        return None
+
+    def compile_delay(self) -> Optional[Callable[[Any, float], float]]:
+        """
+        Returns ``delay(input, now)``, the seconds to wait before the state is executed,
+        for states that wait (see ``Wait``), ``None`` for the others.
+        """
+        return None
+
     def dry_run(self, trace: List):
         trace.append(self.name)
         return self.next
 
 
+def parse_timestamp(timestamp: str) -> float:
+    """
+    Seconds since the epoch of an ISO 8601 timestamp such as ``2016-03-14T01:59:00Z``.
+    Timestamps without a time zone are in UTC.
+    """
+    if not isinstance(timestamp, str):
+        raise ValueError(f"Invalid timestamp {timestamp!r}")
+    if timestamp.endswith(("Z", "z")):
+        timestamp = timestamp[:-1] + "+00:00"
+    value = dt.datetime.fromisoformat(timestamp)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt.timezone.utc)
+    return value.timestamp()
+
+
+def _default_runner(resource_resolver, runner: "Runner" = None) -> "Runner":
+    """
+    States that run other states need a runner, make one if the state is executed on its own.
+    """
+    if runner is not None:
+        return runner
+    from .runner import Runner
+    return Runner(resources=resource_resolver)
+
+
+def _async_step(step: Callable) -> Callable:
+    """
+    Coroutine step running a step that does not need to wait for anything.
+    """
+
+    async def async_step(input, runner):
+        return step(input, runner)
+
+    return async_step
+
+
+def _chain(funcs: List[Callable]) -> Optional[Callable]:
+    """
+    Compose single-argument functions, returns ``None`` if there are none.
+    """
+    if not funcs:
+        return None
+    elif len(funcs) == 1:
+        return funcs[0]
+
+    def chained(value):
+        for func in funcs:
+            value = func(value)
+        return value
+
+    return chained
+
+
 @dataclasses.dataclass
 class Pass(State):
     _FIELDS = bidict(
@@ -351,6 +416,15 @@ class Pass(State):
         if self.next is None:
             c["End"] = True
 
+    def invoke(self, resource_input, resource_resolver: Callable = None, runner: "Runner" = None):
+        if self.result is not None:
+            # A copy, so that outputs never share objects with the definition
+            return copy_payload(self.result)
+        return resource_input
+
+    async def ainvoke(self, resource_input, resource_resolver: Callable = None, runner: "AsyncRunner" = None):
+        return self.invoke(resource_input)
+
 
 @dataclasses.dataclass
 class Task(Pass):
@@ -368,12 +442,139 @@ class Task(Pass):
     )
 
     type: str = States.Task
-    retry: List = None
-    catch: List = None
+    retry: List[Retrier] = None
+    catch: List[Catcher] = None
     timeout_seconds: int = None
     heartbeat_seconds: int = None
     parallel_pages: bool = None
 
+    def __post_init__(self):
+        super().__post_init__()
+        if self.retry is not None:
+            self.retry = [Retrier.parse(retrier) for retrier in self.retry]
+        if self.catch is not None:
+            self.catch = [Catcher.parse(catcher) for catcher in self.catch]
+
+    def recovery(self) -> Optional[Recovery]:
+        """
+        Returns the Retry and Catch handling of one execution of the state,
+        ``None`` if the state has neither.
+        """
+        if not self.retry and not self.catch:
+            return None
+        return Recovery(self.retry or [], self.catch or [])
+
+    def execute(self, input, resource_resolver: Callable = None, runner: "Runner" = None):
+        recovery = self.recovery()
+        if recovery is None:
+            return self.execute_once(input, resource_resolver, runner)
+        while True:
+            try:
+                return self.execute_once(input, resource_resolver, runner)
+            except Exception as e:
+                delay, catcher, error, cause = recovery.recover(e)
+                if delay is not None:
+                    _default_runner(resource_resolver, runner).clock.sleep(delay)
+                elif catcher is not None:
+                    return catcher.next, catcher.get_output(input, error, cause)
+                else:
+                    raise
+
+    def execute_once(self, input, resource_resolver: Callable = None, runner: "Runner" = None):
+        """
+        A single attempt of ``execute``, without Retry and Catch.
+        """
+        return State.execute(self, input, resource_resolver, runner)
+
+    def compile_attempt(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Optional[Tuple[Callable, Callable]]:
+        """
+        Lower the state to the step of a single attempt, without Retry and Catch, and
+        ``recover(recovery, input, exc) -> (delay, next_index, output)`` deciding what follows
+        an attempt that raised ``exc``: another attempt after ``delay`` seconds, or the next state
+        and the output of the catcher. ``exc`` is raised again if neither applies.
+        Returns ``None`` if the state has neither Retry nor Catch.
+        """
+        if self.recovery() is None:
+            return None
+        step = super().compile_step(resolve)
+        catch_next = {id(catcher): resolve(catcher.next) for catcher in self.catch or []}
+
+        def recover(recovery: Recovery, input, exc: Exception):
+            delay, catcher, error, cause = recovery.recover(exc)
+            if delay is not None:
+                return delay, None, None
+            if catcher is not None:
+                return None, catch_next[id(catcher)], catcher.get_output(input, error, cause)
+            raise exc
+
+        return step, recover
+
+    def compile_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        attempt = self.compile_attempt(resolve)
+        if attempt is None:
+            return super().compile_step(resolve)
+        step, recover = attempt
+
+        def recovering_step(input, runner):
+            recovery = None
+            while True:
+                try:
+                    return step(input, runner)
+                except Exception as e:
+                    if recovery is None:
+                        recovery = self.recovery()
+                    delay, next_index, output = recover(recovery, input, e)
+                    if delay is None:
+                        return next_index, output
+                    runner.clock.sleep(delay)
+
+        return recovering_step
+
+    def compile_async_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        step = super().compile_async_step(resolve)
+        if self.recovery() is None:
+            return step
+        catch_next = {id(catcher): resolve(catcher.next) for catcher in self.catch or []}
+
+        async def recovering_step(input, runner):
+            recovery = None
+            while True:
+                try:
+                    return await step(input, runner)
+                except Exception as e:
+                    if recovery is None:
+                        recovery = self.recovery()
+                    delay, catcher, error, cause = recovery.recover(e)
+                    if delay is not None:
+                        await runner.clock.asleep(delay)
+                    elif catcher is not None:
+                        return catch_next[id(catcher)], catcher.get_output(input, error, cause)
+                    else:
+                        raise
+
+        return recovering_step
+
+    def invoke(self, resource_input, resource_resolver: Callable = None, runner: "Runner" = None):
+        # Pass.invoke returns Result, Task invokes the resource.
+        provider = resource_resolver(self.resource)
+        result = call_with_deadlines(
+            provider, provider_input(resource_input), self.timeout_seconds, self.heartbeat_seconds,
+        )
+        if self.parallel_pages and isinstance(result, Pages):
+            result = _default_runner(resource_resolver, runner).fetch_pages(result)
+        return result
+
+    async def ainvoke(self, resource_input, resource_resolver: Callable = None, runner: "AsyncRunner" = None):
+        provider = resource_resolver(self.resource)
+        result = await acall_with_deadlines(
+            functools.partial(runner.call_provider, provider, provider_input(resource_input)),
+            self.timeout_seconds,
+            self.heartbeat_seconds,
+        )
+        if self.parallel_pages and isinstance(result, Pages):
+            result = await runner.fetch_pages(result)
+        return result
+
 
 @dataclasses.dataclass
 class Choice(State):
@@ -393,11 +594,45 @@ class Choice(State):
     def parse_dict(cls, d: Dict, fields: Dict) -> None:
         fields["choices"] = [ChoiceRule.parse(raw_choice_rule) for raw_choice_rule in d["Choices"]]
 
-    def execute(self, input, resource_resolver: Callable):
-        for choice_rule in self.choices:
-            if choice_rule.matches(input):
-                return choice_rule.next, input
-        return self.default, input
+    def compile_paths(self):
+        super().compile_paths()
+        self._choose = self.compile_choices((choice_rule.next for choice_rule in self.choices), self.default)
+
+    def compile_choices(self, outcomes: Iterable, default=None) -> Callable:
+        """
+        Compiles the rules into a function of the input that returns the outcome
+        of the first matching rule or ``default`` if none matches.
+        """
+        return compile_choices([choice_rule.operator for choice_rule in self.choices], outcomes, default)
+
+    def route_many(self, inputs: Iterable) -> List[Optional[str]]:
+        """
+        Returns the next state for each of ``inputs``, evaluating the rules
+        over all of them at once with NumPy if it is installed.
+        """
+        return route_many(
+            [choice_rule.operator for choice_rule in self.choices],
+            [choice_rule.next for choice_rule in self.choices],
+            self.default,
+            inputs,
+        )
+
+    def execute(self, input, resource_resolver: Callable, runner: "Runner" = None):
+        return self._choose(input), input
+
+    def compile_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        choose = self.compile_choices(
+            (resolve(choice_rule.next) for choice_rule in self.choices),
+            resolve(self.default),
+        )
+
+        def step(input, runner):
+            return choose(input), input
+
+        return step
+
+    def compile_async_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        return _async_step(self.compile_step(resolve))
 
 
 @dataclasses.dataclass
@@ -422,12 +657,52 @@ class Wait(State):
         if self.next is None:
             c["End"] = True
 
-    def execute(self, input, resource_resolver: Callable = None):
-        # TODO We don't actually do any waiting here, but perhaps we could delegate it to some predefined resource.
+    def compile_paths(self):
+        super().compile_paths()
+        self._seconds_path = compile_path(self.seconds_path) if self.seconds_path else None
+        self._timestamp_path = compile_path(self.timestamp_path) if self.timestamp_path else None
+
+    def seconds_to_wait(self, input, now: float) -> float:
+        """
+        Seconds from ``now`` (in seconds since the epoch) until the end of the wait
+        given by Seconds, SecondsPath, Timestamp or TimestampPath.
+        The paths are applied to the input after InputPath.
+        """
+        if self.seconds is not None:
+            return self.seconds
+        input = self.format_state_input(input)
+        if self._seconds_path is not None:
+            seconds = self._seconds_path.get(input)
+            if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds < 0:
+                raise ValueError(f"SecondsPath of Wait state {self.name} must select a non-negative number")
+            return seconds
+        if self._timestamp_path is not None:
+            return parse_timestamp(self._timestamp_path.get(input)) - now
+        if self.timestamp is not None:
+            return parse_timestamp(self.timestamp) - now
+        return 0
+
+    def compile_delay(self) -> Optional[Callable[[Any, float], float]]:
+        return self.seconds_to_wait
+
+    def execute(self, input, resource_resolver: Callable = None, runner: "Runner" = None):
+        # Runners do the waiting, see ``seconds_to_wait``.
         state_input = self.format_state_input(input)
         state_output = self.format_state_output(state_input)
         return self.next, state_output
 
+    def compile_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        next_index = resolve(self.next)
+        process = _chain(self.input_path_stages() + self.output_stages())
+
+        def step(input, runner):
+            return next_index, process(input) if process is not None else input
+
+        return step
+
+    def compile_async_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        return _async_step(self.compile_step(resolve))
+
 
 @dataclasses.dataclass
 class Fail(State):
@@ -435,23 +710,71 @@ class Fail(State):
         **State._FIELDS,
         **{
             "cause": "Cause",
+            "cause_path": "CausePath",
             "error": "Error",
+            "error_path": "ErrorPath",
         },
     )
 
     type: str = States.Fail
     cause: str = None
+    cause_path: str = None
     error: str = None
+    error_path: str = None
 
-    def execute(self, input, resource_resolver: Callable = None):
-        # TODO No idea what should we do here.
-        return None, None
+    def compile_paths(self):
+        super().compile_paths()
+        self._cause_path = compile_path(self.cause_path) if self.cause_path else None
+        self._error_path = compile_path(self.error_path) if self.error_path else None
+
+    def get_error(self, input) -> Dict:
+        """
+        The output of the execution failed by this state: ``{"Error": ..., "Cause": ...}``
+        from Error and Cause or ErrorPath and CausePath, leaving out the ones that are not set.
+        """
+        error = self._error_path.get(input) if self._error_path is not None else self.error
+        cause = self._cause_path.get(input) if self._cause_path is not None else self.cause
+        output = {}
+        if error is not None:
+            output["Error"] = error
+        if cause is not None:
+            output["Cause"] = cause
+        return output
+
+    def execute(self, input, resource_resolver: Callable = None, runner: "Runner" = None):
+        return None, self.get_error(input)
+
+    def compile_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        get_error = self.get_error
+
+        def step(input, runner):
+            return None, get_error(input)
+
+        return step
+
+    def compile_async_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        return _async_step(self.compile_step(resolve))
 
 
 @dataclasses.dataclass
 class Succeed(State):
     type: str = States.Succeed
 
+    def execute(self, input, resource_resolver: Callable = None, runner: "Runner" = None):
+        state_input = self.format_state_input(input)
+        return None, self.format_state_output(state_input)
+
+    def compile_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        process = _chain(self.input_path_stages() + self.output_stages())
+
+        def step(input, runner):
+            return None, process(input) if process is not None else input
+
+        return step
+
+    def compile_async_step(self, resolve: Callable[[Optional[str]], Optional[int]]) -> Callable:
+        return _async_step(self.compile_step(resolve))
+
 
 @dataclasses.dataclass
 class Parallel(Task):
@@ -481,6 +804,23 @@ class Parallel(Task):
         if self.next is None:
             c["End"] = True
 
+    def execute_once(self, input, resource_resolver: Callable = None, runner: "Runner" = None):
+        runner = _default_runner(resource_resolver, runner)
+        branch_input = self.get_input(input)
+        branch_outputs = runner.run_branches(self.branches, branch_input, walk=True)
+        return self.get_output(input, branch_outputs)
+
+    def invoke(self, resource_input, resource_resolver: Callable = None, runner: "Runner" = None):
+        """
+        Runs the branches, each with its own copy of the input,
+        and returns the list of their outputs in the order of the branches.
+        """
+        runner = _default_runner(resource_resolver, runner)
+        return runner.run_branches(self.branches, resource_input)
+
+    async def ainvoke(self, resource_input, resource_resolver: Callable = None, runner: "AsyncRunner" = None):
+        return await runner.run_branches(self.branches, resource_input)
+
     def dry_run(self, trace: List):
         parallel_trace = []
         for branch in self.branches:
@@ -491,6 +831,217 @@ class Parallel(Task):
         return self.next
 
 
+@dataclasses.dataclass
+class Map(Task):
+    _FIELDS = bidict(
+        **Task._FIELDS,
+        **{
+            "items_path": "ItemsPath",
+            "item_selector": "ItemSelector",
+            "iterator": "Iterator",
+            "item_processor": "ItemProcessor",
+            "max_concurrency": "MaxConcurrency",
+        },
+    )
+
+    type: str = States.Map
+    items_path: str = None
+    item_selector: Dict = None
+    iterator: "Sequence" = None
+    item_processor: "Sequence" = None
+    max_concurrency: int = None
+
+    # ProcessorConfig of ItemProcessor, which is otherwise parsed as a Sequence
+    processor_config: Dict = None
+
+    @classmethod
+    def select_class(cls, d: Dict) -> Type["Map"]:
+        processor_config = (d.get("ItemProcessor") or {}).get("ProcessorConfig") or {}
+        if processor_config.get("Mode") == DistributedMap.MODE:
+            return DistributedMap
+        return cls
+
+    def compile_paths(self):
+        super().compile_paths()
+        self._items_path = compile_path(self.items_path) if self.items_path else None
+        item_selector = self.item_selector if self.item_selector is not None else self.parameters
+        self._item_selector = compile_template(item_selector) if item_selector else None
+
+    @classmethod
+    def parse_dict(cls, d: Dict, fields: Dict) -> None:
+        if "Iterator" in d:
+            fields["iterator"] = State.parse(d["Iterator"], type="Sequence")
+        if "ItemProcessor" in d:
+            raw_processor = dict(d["ItemProcessor"])
+            fields["processor_config"] = raw_processor.pop("ProcessorConfig", None)
+            fields["item_processor"] = State.parse(raw_processor, type="Sequence")
+
+    def compile_dict(self, c: Dict):
+        if self.processor_config is not None and "ItemProcessor" in c:
+            c["ItemProcessor"] = {"ProcessorConfig": self.processor_config, **c["ItemProcessor"]}
+        if self.next is None:
+            c["End"] = True
+
+    @property
+    def processor(self) -> "Sequence":
+        """
+        The sequence run for each item, ItemProcessor or its older name Iterator.
+        """
+        if self.item_processor is not None:
+            return self.item_processor
+        return self.iterator
+
+    def get_input(self, input):
+        # Parameters of a Map state apply to each item, not to the input of the state.
+        return self.format_state_input(input)
+
+    def input_stages(self) -> List[Callable]:
+        return self.input_path_stages()
+
+    def get_item_inputs(self, input) -> List:
+        """
+        Applies ItemsPath and ItemSelector (or Parameters), returns the inputs of the iterations.
+        """
+        items = self._items_path.get(input) if self._items_path is not None else input
+        if not isinstance(items, ARRAY_TYPES):
+            raise ValueError(f"ItemsPath of Map state {self.name} must select an array, got {type(items).__name__}")
+
+        item_selector = self._item_selector
+        if item_selector is None:
+            return items
+        return [item_selector(input, {"Map": {"Item": {"Index": i, "Value": item}}}) for i, item in enumerate(items)]
+
+    def execute_once(self, input, resource_resolver: Callable = None, runner: "Runner" = None):
+        runner = _default_runner(resource_resolver, runner)
+        item_inputs = self.get_item_inputs(self.get_input(input))
+        outputs = runner.run_sequences(
+            [self.processor] * len(item_inputs), item_inputs, walk=True, max_concurrency=self.max_concurrency,
+        )
+        return self.get_output(input, outputs)
+
+    def invoke(self, resource_input, resource_resolver: Callable = None, runner: "Runner" = None):
+        """
+        Runs the processor for each item, at most MaxConcurrency at a time,
+        and returns the list of their outputs in the order of the items.
+        """
+        runner = _default_runner(resource_resolver, runner)
+        item_inputs = self.get_item_inputs(resource_input)
+        return runner.run_sequences(
+            [self.processor] * len(item_inputs), item_inputs, max_concurrency=self.max_concurrency,
+        )
+
+    async def ainvoke(self, resource_input, resource_resolver: Callable = None, runner: "AsyncRunner" = None):
+        item_inputs = self.get_item_inputs(resource_input)
+        return await runner.run_sequences(
+            [self.processor] * len(item_inputs), item_inputs, max_concurrency=self.max_concurrency,
+        )
+
+
+@dataclasses.dataclass
+class DistributedMap(Map):
+    """
+    Map state whose ItemProcessor runs in ``DISTRIBUTED`` mode.
+
+    Items are read from the file of ItemReader (see ``items.read_items``) or taken from ItemsPath,
+    optionally grouped by ItemBatcher, and results are written to the directory of ResultWriter
+    (see ``items.ResultFileWriter``) as they come. Everything is streamed through
+    ``Runner.stream_sequence``, so the number of items is not limited by memory
+    as long as there is a ResultWriter.
+    """
+
+    MODE = "DISTRIBUTED"
+
+    _FIELDS = bidict(
+        **Map._FIELDS,
+        **{
+            "item_reader": "ItemReader",
+            "item_batcher": "ItemBatcher",
+            "result_writer": "ResultWriter",
+            "label": "Label",
+        },
+    )
+
+    type: str = States.Map
+    item_reader: Dict = None
+    item_batcher: Dict = None
+    result_writer: Dict = None
+    label: str = None
+
+    def compile_paths(self):
+        super().compile_paths()
+        self._reader_parameters = compile_template((self.item_reader or {}).get("Parameters") or {})
+        self._writer_parameters = compile_template((self.result_writer or {}).get("Parameters") or {})
+        batch_input = (self.item_batcher or {}).get("BatchInput")
+        self._batch_input = compile_template(batch_input) if batch_input is not None else None
+
+    def iter_item_inputs(self, input) -> Iterator:
+        """
+        Applies ItemReader (or ItemsPath), ItemSelector (or Parameters) and ItemBatcher,
+        yields the inputs of the child executions.
+        """
+        if self.item_reader:
+            items = read_items(self.item_reader.get("ReaderConfig") or {}, self._reader_parameters(input))
+        else:
+            items = self._items_path.get(input) if self._items_path is not None else input
+            if not isinstance(items, ARRAY_TYPES):
+                raise ValueError(
+                    f"ItemsPath of Map state {self.name} must select an array, got {type(items).__name__}"
+                )
+
+        item_selector = self._item_selector
+        if item_selector is not None:
+            items = (
+                item_selector(input, {"Map": {"Item": {"Index": i, "Value": item}}})
+                for i, item in enumerate(items)
+            )
+
+        if self.item_batcher:
+            batch_input = self._batch_input(input) if self._batch_input is not None else None
+            items = batch_items(items, self.item_batcher, batch_input)
+        return items
+
+    def get_item_inputs(self, input) -> List:
+        return list(self.iter_item_inputs(input))
+
+    def collect(self, input, outputs: Iterable):
+        """
+        Writes the outputs of the child executions with ResultWriter and returns its details,
+        or returns the list of outputs if there is no ResultWriter.
+        """
+        if not self.result_writer:
+            return list(outputs)
+        with ResultFileWriter(self._writer_parameters(input)) as writer:
+            for output in outputs:
+                writer.write(output)
+        return writer.details
+
+    def execute_once(self, input, resource_resolver: Callable = None, runner: "Runner" = None):
+        runner = _default_runner(resource_resolver, runner)
+        map_input = self.get_input(input)
+        outputs = runner.stream_sequence(
+            self.processor, self.iter_item_inputs(map_input), walk=True, max_concurrency=self.max_concurrency,
+        )
+        return self.get_output(input, self.collect(map_input, outputs))
+
+    def invoke(self, resource_input, resource_resolver: Callable = None, runner: "Runner" = None):
+        runner = _default_runner(resource_resolver, runner)
+        outputs = runner.stream_sequence(
+            self.processor, self.iter_item_inputs(resource_input), max_concurrency=self.max_concurrency,
+        )
+        return self.collect(resource_input, outputs)
+
+    async def ainvoke(self, resource_input, resource_resolver: Callable = None, runner: "AsyncRunner" = None):
+        outputs = runner.stream_sequence(
+            self.processor, self.iter_item_inputs(resource_input), max_concurrency=self.max_concurrency,
+        )
+        if not self.result_writer:
+            return [output async for output in outputs]
+        with ResultFileWriter(self._writer_parameters(resource_input)) as writer:
+            async for output in outputs:
+                writer.write(output)
+        return writer.details
+
+
 @dataclasses.dataclass
 class Sequence(State):
     _FIELDS = bidict(
@@ -505,10 +1056,29 @@ class Sequence(State):
     start_at: str = None
     states: Dict[str, State] = dataclasses.field(default_factory=dict)
 
+    def __post_init__(self):
+        super().__post_init__()
+        self._plan = None
+
     @property
     def start_at_state(self) -> State:
         return self.states[self.start_at]
 
+    def compile_plan(self) -> Plan:
+        """
+        Lower the states to a ``Plan`` that ``Runner`` executes.
+
+        The plan is compiled on the first call and reused afterwards, also by
+        other instances with an equal definition. ``insert``, ``remove`` and ``append``
+        discard it; call ``discard_plan`` after changing states in any other way.
+        """
+        if self._plan is None:
+            self._plan = get_plan(self)
+        return self._plan
+
+    def discard_plan(self):
+        self._plan = None
+
     @classmethod
     def parse_list(cls, raw: List, **fields) -> "State":
         if not isinstance(raw, list):
@@ -542,6 +1112,7 @@ class Sequence(State):
         return self.next
 
     def insert(self, raw, before: str = None, after: str = None):
+        self.discard_plan()
         new_state = State.parse(raw)
         if before:
             assert not after
@@ -569,6 +1140,7 @@ class Sequence(State):
             raise NotImplementedError()
 
     def remove(self, name: str):
+        self.discard_plan()
         removed_state = self.states[name]
         for state in self.states.values():
             if state.next == name:
@@ -578,6 +1150,7 @@ class Sequence(State):
         del self.states[name]
 
     def append(self, raw):
+        self.discard_plan()
         new_state = State.parse(raw)
         if not self.states:
             self.states[new_state.name] = new_state
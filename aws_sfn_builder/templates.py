@@ -0,0 +1,348 @@
+"""
+Compilation of the payload templates of states: Parameters, ResultSelector, ItemSelector
+and the templates of ItemReader, ItemBatcher and ResultWriter.
+
+A template is compiled once into a dict of its constant fields and a list of getters of
+the fields that are resolved against the input (``.$`` fields, ``$.`` strings,
+``$$`` context paths, intrinsic functions, nested templates and ``name[*]`` projections), so that applying it
+copies the constants and calls the getters instead of inspecting every key again.
+"""
+import functools
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .intrinsics import compile_intrinsic, is_intrinsic
+from .jsonpath import compile_path, compile_template_paths, INDEX, PATH_CACHE_SIZE, WILDCARD
+from .lazy_json import ARRAY_TYPES
+from .payloads import copy_payload
+
+
+def joined_indexes(indexes: Tuple[int, ...]):
+    """
+    Key under which values found at nested array ``indexes`` are grouped in a ``name[*]`` projection.
+    """
+    if len(indexes) == 1:
+        return indexes[0]
+    return "-".join(str(index) for index in indexes)
+
+
+def remove_alias(name):
+    try:
+        idx = name.index("_ALIAS")
+        return name[:idx]
+    except ValueError:
+        return name
+    # if "_ALIAS" in name:
+
+
+def _extend(array: List, size: int):
+    if len(array) < size:
+        array.extend({} for _ in range(size - len(array)))
+
+
+def _project_found(found: List[Tuple[Tuple[int, ...], Any]], name: str, new_array: List):
+    """
+    Projects ``(indexes, value)`` matches of a path with ``[*]`` into ``new_array``.
+    """
+    if name.endswith("[*]"):
+        # Grouped by the indexes of the match in the row of its outermost index.
+        name = remove_alias(name[:-3])
+        _extend(new_array, max(indexes[0] for indexes, _ in found) + 1)
+        for indexes, value in found:
+            row = new_array[indexes[0]]
+            key = joined_indexes(indexes)
+            group = row.get(key)
+            if group is None:
+                group = row[key] = {}
+            group[name] = value
+    else:
+        # In the row of its innermost index.
+        _extend(new_array, max(indexes[-1] for indexes, _ in found) + 1)
+        for indexes, value in found:
+            new_array[indexes[-1]][name] = value
+
+
+@functools.lru_cache(maxsize=PATH_CACHE_SIZE)
+def compile_projection(value: str) -> Callable[[Any, str, List], bool]:
+    """
+    Compiles a path with ``[*]`` into ``project(input, name, new_array)`` that sets ``name``
+    to each value matched by the path in the row of ``new_array`` of its array index,
+    adding rows as needed, and tells whether there were any matches.
+
+    Paths with a single ``[*]`` preceded and followed by field names only, by far the most
+    common, walk the array once and write straight into the rows. Others are evaluated
+    with ``find_indexed``.
+    """
+    path = compile_path(value)
+    segments = getattr(path, "segments", None)
+    kinds = [kind for kind, _ in segments] if segments is not None else None
+    if kinds is None or kinds.count(WILDCARD) != 1 or INDEX in kinds:
+        find_indexed = path.find_indexed
+
+        def project_found(input, name, new_array):
+            found = find_indexed(input)
+            if found:
+                _project_found(found, name, new_array)
+            return bool(found)
+
+        return project_found
+
+    star = kinds.index(WILDCARD)
+    prefix = tuple(key for _, key in segments[:star])
+    suffix = tuple(key for _, key in segments[star + 1:])
+
+    def project(input, name, new_array):
+        if name.endswith("[*]"):
+            found = path.find_indexed(input)
+            if found:
+                _project_found(found, name, new_array)
+            return bool(found)
+
+        doc = input
+        try:
+            for key in prefix:
+                doc = doc[key]
+        except (KeyError, TypeError, IndexError):
+            return False
+        # Like jsonpath_ng, treat a non-array as an array of one item.
+        items = doc if isinstance(doc, ARRAY_TYPES) else [doc]
+        if not items:
+            return False
+
+        # Rows are added for all items up front and the ones after the last match removed again.
+        start = len(new_array)
+        _extend(new_array, len(items))
+        last = -1
+        if not suffix:
+            for row, item in zip(new_array, items):
+                row[name] = item
+            last = len(items) - 1
+        elif len(suffix) == 1:
+            key = suffix[0]
+            for i, item in enumerate(items):
+                try:
+                    new_array[i][name] = item[key]
+                    last = i
+                except (KeyError, TypeError, IndexError):
+                    pass
+        else:
+            for i, item in enumerate(items):
+                try:
+                    for key in suffix:
+                        item = item[key]
+                except (KeyError, TypeError, IndexError):
+                    continue
+                new_array[i][name] = item
+                last = i
+        del new_array[max(start, last + 1):]
+        return last >= 0
+
+    return project
+
+
+def format_array(input, dict_param):
+    new_array = []
+    for name, value in dict_param.items():
+        if name.endswith('.$'):
+            name = name[:-2]
+        if value.startswith("$") and "[*]" in value:
+            parse_json(input, value, name, new_array)
+    return new_array
+
+
+def parse_json(input, value, name, new_array=None, path=None):
+    if "[*]" in value:
+        projected = [] if new_array is None else new_array
+        if compile_projection(value)(input, name, projected):
+            return projected
+    if path is None:
+        path = compile_path(value)
+    found = path.find(input)
+    if found:
+        value = found[0]
+    return value
+
+
+# A getter of a field: ``get(input, context) -> value``.
+Getter = Callable[[Any, Optional[Dict]], Any]
+
+
+def _path_getter(value: str, name: str) -> Getter:
+    """
+    Getter of the value at path ``value`` of the input, the path itself if there is none.
+    """
+    try:
+        path = compile_path(value)
+    except ValueError:
+        # Only paths of ``.$`` fields must be valid, others are reported when the template is applied.
+        return lambda input, context: parse_json(input, value, name)
+
+    if "[*]" in value:
+        project, find = compile_projection(value), path.find
+
+        def get_projection(input, context):
+            new_array = []
+            if project(input, name, new_array):
+                return new_array
+            found = find(input)
+            return found[0] if found else value
+
+        return get_projection
+
+    keys = getattr(path, "_keys", None)
+    if keys is None:
+        find = path.find
+
+        def get_found(input, context):
+            found = find(input)
+            return found[0] if found else value
+
+        return get_found
+
+    if len(keys) == 1:
+        key = keys[0]
+
+        def get_key(input, context):
+            try:
+                return input[key]
+            except (KeyError, TypeError, IndexError):
+                return value
+
+        return get_key
+
+    def get_keys(input, context):
+        doc = input
+        try:
+            for key in keys:
+                doc = doc[key]
+        except (KeyError, TypeError, IndexError):
+            return value
+        return doc
+
+    return get_keys
+
+
+def _context_getter(value: str) -> Getter:
+    """
+    Getter of the value at ``$$`` path ``value`` of the context object, the path itself if there is no context.
+    """
+    get = compile_path(value[1:]).get
+    return lambda input, context: value if context is None else get(context)
+
+
+def _projection_getter(template) -> Getter:
+    """
+    Getter of a ``name[*]`` field whose template is an object of ``[*]`` paths, see ``format_array``.
+    """
+    if not isinstance(template, dict) or not all(isinstance(value, str) for value in template.values()):
+        # Fails just like format_array does.
+        return lambda input, context: format_array(input, template)
+
+    projections = []
+    for name, value in template.items():
+        if name.endswith(".$"):
+            name = name[:-2]
+        if value.startswith("$") and "[*]" in value:
+            try:
+                projections.append((name, compile_projection(value)))
+            except ValueError:
+                # Invalid paths are reported when the template is applied, by format_array.
+                return lambda input, context: format_array(input, template)
+
+    def get_projection(input, context):
+        new_array = []
+        for name, project in projections:
+            project(input, name, new_array)
+        return new_array
+
+    return get_projection
+
+
+def _compile_fields(template: Dict) -> Tuple[Dict, List[str], List[Tuple[str, Getter]]]:
+    """
+    Splits a template into its constant fields, the names of the constants that are arrays
+    or objects, and the getters of the other fields.
+    The constants include a placeholder for every other field to keep the order of the template.
+    """
+    constants = {}
+    getters = {}
+    for name, value in template.items():
+        is_path = name.endswith(".$")
+        if is_path:
+            name = name[:-2]
+
+        if isinstance(value, str) and value.startswith("$") and name.endswith("[*]"):
+            name = name[:-3]
+            getter = _path_getter(value, name)
+        elif isinstance(value, dict):
+            if name.endswith("[*]"):
+                name = name[:-3]
+                getter = _projection_getter(value)
+            else:
+                getter = _compile_template(value)
+        elif isinstance(value, list) and name.endswith("[*]"):
+            name = name[:-3]
+            getter = _projection_getter(value)
+        elif is_path and is_intrinsic(value):
+            getter = compile_intrinsic(value)
+        elif is_path and isinstance(value, str) and value.startswith("$$"):
+            getter = _context_getter(value)
+        elif isinstance(value, str) and (value.startswith("$.") or (is_path and value.startswith("$"))):
+            getter = _path_getter(value, name)
+        else:
+            getter = None
+
+        constants[name] = value if getter is None else None
+        if getter is None:
+            getters.pop(name, None)
+        else:
+            getters[name] = getter
+    mutable = [name for name, value in constants.items() if name not in getters and isinstance(value, (dict, list))]
+    return constants, mutable, list(getters.items())
+
+
+def compile_template(template) -> Callable[..., Any]:
+    """
+    Compiles a template into ``build(input, context=None)`` that returns the template
+    resolved against ``input``. Paths starting with ``$$`` are resolved against the
+    ``context`` object, if there is one.
+
+    Paths of ``.$`` fields must be valid, ``ValueError`` is raised here if they are not.
+    """
+    if isinstance(template, dict):
+        compile_template_paths(template)
+    return _compile_template(template)
+
+
+def _compile_template(template) -> Callable[..., Any]:
+    if not isinstance(template, dict):
+        # Arrays are not templates, they are used as they are, copied like constant fields.
+        if isinstance(template, list):
+            return lambda input, context=None: copy_payload(template)
+        return lambda input, context=None: template
+
+    constants, mutable, getters = _compile_fields(template)
+
+    # Constant arrays and objects are copied into every output, so that outputs never share them
+    # with each other or with the template.
+    def build(input, context=None):
+        output = constants.copy()
+        for name in mutable:
+            output[name] = copy_payload(output[name])
+        for name, get in getters:
+            output[name] = get(input, context)
+        return output
+
+    if not mutable and not getters:
+        return lambda input, context=None: constants.copy()
+
+    return build
+
+
+def format_dict(input, dict_param, context=None):
+    """
+    Resolve a Parameters (or ResultSelector, ItemSelector) template against ``input``.
+    Paths starting with ``$$`` are resolved against the ``context`` object, if there is one.
+
+    States compile their templates once with ``compile_template``, this compiles ``dict_param`` on every call.
+    """
+    return compile_template(dict_param)(input, context)
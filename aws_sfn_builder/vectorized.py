@@ -0,0 +1,229 @@
+"""
+Evaluation of Choice rules over a batch of inputs with NumPy.
+
+Each variable is extracted from all inputs into a column once, coerced once per kind
+of comparison (numeric, string, boolean, timestamp) into an array, and the comparisons
+are array operations combined into boolean masks.
+
+The result is the same as evaluating the rules input by input: comparisons are only
+applied to the inputs that reach them (``And`` and ``Or`` short-circuit per input,
+rules are tried in order until one matches), and an input that reaches a comparison
+whose variable is missing or cannot be coerced raises the same error it would raise alone.
+
+NumPy is an optional dependency (``pip install aws-sfn-builder[numpy]``), without it
+the rules are evaluated input by input.
+"""
+import datetime as dt
+import operator
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Sequence, Tuple
+
+from .choice_rules import Operators, compile_choices, matches_glob, to_bool, to_datetime, to_numeric
+from .jsonpath import Path, PathNotFound
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if TYPE_CHECKING:
+    from .choice_rules import Operator
+
+# Marks a value that could not be extracted or coerced.
+_INVALID = object()
+
+
+def _timestamp(x):
+    return numpy.datetime64(to_datetime(x).astimezone(dt.timezone.utc).replace(tzinfo=None), "us")
+
+
+def _matches_glob(values, pattern):
+    return numpy.fromiter((pattern.fullmatch(x) is not None for x in values), dtype=bool, count=len(values))
+
+
+# Comparisons that do not work on arrays as they are.
+_ARRAY_COMPARISONS = {
+    operator.is_: operator.eq,
+    matches_glob: _matches_glob,
+}
+
+_COERCIONS = {
+    to_numeric: to_numeric,
+    str: str,
+    to_bool: to_bool,
+    to_datetime: _timestamp,
+}
+
+# Types of values that coercions leave as they are, columns of only these types are not coerced.
+_UNCHANGED = {
+    to_numeric: {int, float},
+    str: {str},
+    to_bool: {bool},
+}
+
+# Strings are kept as objects rather than fixed-width NumPy strings as wide as the longest one.
+_DTYPES = {
+    str: object,
+}
+
+
+class _Batch:
+    """
+    Columns of the variables of a batch of inputs, extracted and coerced on first use.
+    """
+
+    def __init__(self, inputs: Sequence):
+        self.inputs = inputs
+        self._columns: Dict[str, List] = {}
+        self._arrays: Dict[Tuple[str, Any], Tuple[Any, Any]] = {}
+
+    def column(self, path: Path) -> List:
+        column = self._columns.get(path.source)
+        if column is None:
+            column = self._columns[path.source] = self._extract(path)
+        return column
+
+    def _extract(self, path) -> List:
+        if path._keys is not None:
+            # Paths of field names only, by far the most common, are extracted with
+            # itemgetter unless one of the inputs does not have the field.
+            try:
+                column = self.inputs
+                for key in path._keys:
+                    column = list(map(operator.itemgetter(key), column))
+                return column
+            except (KeyError, TypeError, IndexError):
+                pass
+
+        get = path.get
+        column = []
+        for input in self.inputs:
+            try:
+                column.append(get(input))
+            except PathNotFound:
+                column.append(_INVALID)
+        return column
+
+    def array(self, path: Path, coerce) -> Tuple[Any, Any]:
+        """
+        The values at ``path`` coerced with ``coerce`` as ``(values, valid)`` arrays.
+        """
+        key = (path.source, coerce)
+        if key not in self._arrays:
+            column = self.column(path)
+            types = set(map(type, column))
+            if types <= _UNCHANGED.get(coerce, set()):
+                values, valid = numpy.array(column, dtype=_DTYPES.get(coerce)), numpy.ones(len(column), dtype=bool)
+            else:
+                coerced = [_coerce(coerce, x) for x in column]
+                valid = numpy.fromiter((x is not _INVALID for x in coerced), dtype=bool, count=len(coerced))
+                filler = next((x for x in coerced if x is not _INVALID), 0)
+                coerced = [x if x is not _INVALID else filler for x in coerced]
+                values = numpy.array(coerced, dtype=_DTYPES.get(coerce))
+            self._arrays[key] = values, valid
+        return self._arrays[key]
+
+    def values(self, path: Path, coerce, rows) -> Any:
+        """
+        The values at ``path`` of the inputs at ``rows`` coerced with ``coerce``.
+        Raises the error of the first of them whose value could not be extracted or coerced.
+        """
+        values, valid = self.array(path, coerce)
+        valid = valid[rows]
+        if not valid.all():
+            input = self.inputs[int(rows[numpy.argmin(valid)])]
+            coerce(path.get(input))
+            raise AssertionError(f"{path} of {input!r} was expected to be invalid")
+        return values[rows]
+
+
+def _coerce(coerce, x):
+    if x is _INVALID:
+        return x
+    try:
+        return coerce(x)
+    except (TypeError, ValueError, AttributeError):
+        return _INVALID
+
+
+def _evaluate(op: "Operator", batch: _Batch, rows) -> Any:
+    """
+    Boolean array telling which of the inputs at ``rows`` match ``op``.
+    """
+    if op.name == "Not":
+        return ~_evaluate(op.value, batch, rows)
+
+    if op.name in ("And", "Or"):
+        is_and = op.name == "And"
+        result = numpy.full(len(rows), is_and)
+        pending = numpy.arange(len(rows))
+        for part in op.value:
+            if not len(pending):
+                break
+            matched = _evaluate(part, batch, rows[pending])
+            if is_and:
+                pending = pending[matched]
+            else:
+                result[pending[matched]] = True
+                pending = pending[~matched]
+        if is_and:
+            result[:] = False
+            result[pending] = True
+        return result
+
+    op_def = Operators.ALL[op.name]
+
+    if op.name == "IsPresent":
+        column = batch.column(op._variable)
+        present = numpy.fromiter((column[i] is not _INVALID for i in rows.tolist()), dtype=bool, count=len(rows))
+        return present if op.value else ~present
+
+    if op_def.test is not None:
+        matched = batch.values(op._variable, op_def.test, rows).astype(bool)
+        return matched if op.value else ~matched
+
+    coerce = _COERCIONS[op_def.coerce]
+    compare = _ARRAY_COMPARISONS.get(op_def.compare, op_def.compare)
+    if op_def.path:
+        value = batch.values(op._value_path, coerce, rows)
+    elif op_def.prepare is op_def.coerce:
+        value = coerce(op.value)
+    else:
+        value = op_def.prepare(op.value)
+    return numpy.asarray(compare(batch.values(op._variable, coerce, rows), value), dtype=bool)
+
+
+def matches_many(op: "Operator", inputs: Iterable) -> List[bool]:
+    """
+    Tells for each of ``inputs`` whether it matches ``op``.
+    """
+    inputs = list(inputs)
+    if numpy is None:
+        return [op.matches(input) for input in inputs]
+    return _evaluate(op, _Batch(inputs), numpy.arange(len(inputs))).tolist()
+
+
+def route_many(operators: List["Operator"], outcomes: Iterable, default, inputs: Iterable) -> List:
+    """
+    Returns for each of ``inputs`` the outcome of the first of ``operators`` that matches it,
+    ``default`` if none does.
+    """
+    inputs = list(inputs)
+    if numpy is None:
+        choose = compile_choices(operators, outcomes, default)
+        return [choose(input) for input in inputs]
+
+    # Index of the chosen outcome per input, the default is the last one.
+    outcomes = list(outcomes)[:len(operators)]
+    choices = numpy.empty(len(outcomes) + 1, dtype=object)
+    choices[:] = outcomes + [default]
+    chosen = numpy.full(len(inputs), len(outcomes))
+
+    batch = _Batch(inputs)
+    pending = numpy.arange(len(inputs))
+    for i, op in enumerate(operators):
+        if not len(pending):
+            break
+        matched = _evaluate(op, batch, pending)
+        chosen[pending[matched]] = i
+        pending = pending[~matched]
+    return choices[chosen].tolist()
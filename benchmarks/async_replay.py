@@ -0,0 +1,52 @@
+"""
+Many concurrent executions of the job status poller on one event loop with AsyncRunner.
+
+    python benchmarks/async_replay.py
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from aws_sfn_builder import AsyncRunner, Machine
+
+EXAMPLE = Path(__file__).parent.parent / "tests" / "aws_examples" / "job_status_poller.json"
+
+
+def build_runner(latency: float) -> AsyncRunner:
+    runner = AsyncRunner()
+
+    @runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob")
+    async def submit_job(payload):
+        await asyncio.sleep(latency)
+        return payload
+
+    @runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob")
+    async def check_job(payload):
+        await asyncio.sleep(latency)
+        return "FAILED" if payload < 30 else "SUCCEEDED"
+
+    return runner
+
+
+async def replay(sm, runner, executions):
+    return await asyncio.gather(*(runner.run(sm, {"input": 25 + i % 10, "wait_time": 0}) for i in range(executions)))
+
+
+def main(latency=0.05):
+    with open(EXAMPLE) as f:
+        sm = Machine.parse(json.load(f))
+    runner = build_runner(latency)
+
+    for executions in (1000, 10000, 50000):
+        started = time.perf_counter()
+        asyncio.run(replay(sm, runner, executions))
+        elapsed = time.perf_counter() - started
+        print(
+            f"{executions:>6} concurrent executions, {latency * 1000:.0f}ms per provider call: "
+            f"{elapsed:.2f}s, {executions / elapsed:,.0f} executions/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+A Map of 2,000 lookups against a local stand-in of a table that serves one request at a time,
+each with a fixed overhead of 1ms plus 10us per key: one call per lookup vs concurrent lookups
+coalesced into batch calls.
+
+    python benchmarks/batch_provider.py
+"""
+import threading
+import time
+
+from aws_sfn_builder import Machine, Runner
+
+ITEMS = 2000
+
+
+class Table:
+    def __init__(self, overhead=0.001, per_key=0.00001):
+        self.overhead = overhead
+        self.per_key = per_key
+        self.requests = 0
+        self._connection = threading.Lock()
+
+    def batch_get(self, keys):
+        with self._connection:
+            self.requests += 1
+            time.sleep(self.overhead + self.per_key * len(keys))
+            return [{"key": key, "value": key * 2} for key in keys]
+
+
+def machine():
+    return Machine.parse({
+        "StartAt": "Lookups",
+        "States": {
+            "Lookups": {
+                "Type": "Map",
+                "Iterator": {
+                    "StartAt": "GetItem",
+                    "States": {"GetItem": {"Type": "Task", "Resource": "GetItem", "End": True}},
+                },
+                "End": True,
+            },
+        },
+    })
+
+
+def run(batched):
+    table = Table()
+    with Runner(max_workers=64) as runner:
+        if batched:
+            runner.batch_resource_provider("GetItem", max_batch=100, max_wait_ms=2)(table.batch_get)
+        else:
+            runner.resource_provider("GetItem")(lambda key: table.batch_get([key])[0])
+        started = time.perf_counter()
+        output = runner.run(machine(), list(range(ITEMS)))[1]
+        elapsed = time.perf_counter() - started
+    assert output == [{"key": key, "value": key * 2} for key in range(ITEMS)]
+    return elapsed, table.requests
+
+
+def main():
+    for name, batched in (("one call per lookup", False), ("batch_provider", True)):
+        elapsed, requests = run(batched)
+        print(f"{name:20} {elapsed:>7.2f}s  {requests:>5} requests  {elapsed / ITEMS * 1e6:>7.0f}us per lookup")
+
+
+if __name__ == "__main__":
+    main()
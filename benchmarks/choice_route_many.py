@@ -0,0 +1,43 @@
+"""
+Routing a batch of recorded inputs through a Choice state: one input at a time vs Choice.route_many.
+
+    python benchmarks/choice_route_many.py
+"""
+import json
+import pathlib
+import random
+import time
+
+from aws_sfn_builder import State, vectorized
+
+EXAMPLES = pathlib.Path(__file__).parent.parent / "tests" / "aws_examples"
+
+INPUTS = 1_000_000
+
+
+def main():
+    with open(EXAMPLES / "choice_state_x.json") as f:
+        state = State.parse(json.load(f)["States"]["ChoiceStateX"])
+
+    rng = random.Random(0)
+    inputs = [
+        {"type": rng.choice(["Private", "Public"]), "value": rng.choice([0, rng.randrange(100), rng.random() * 100])}
+        for _ in range(INPUTS)
+    ]
+
+    started = time.perf_counter()
+    one_by_one = [state.execute(input, None)[0] for input in inputs]
+    one_by_one_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    routed = state.route_many(inputs)
+    route_many_time = time.perf_counter() - started
+    assert routed == one_by_one
+
+    print(f"{INPUTS:,} inputs through choice_state_x (numpy {'installed' if vectorized.numpy else 'missing'})")
+    print(f"  one by one  {INPUTS / one_by_one_time:>12,.0f} inputs/s")
+    print(f"  route_many  {INPUTS / route_many_time:>12,.0f} inputs/s   x{one_by_one_time / route_many_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
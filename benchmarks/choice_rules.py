@@ -0,0 +1,159 @@
+"""
+Evaluation of Choice states: compiled rules vs interpreting the operator tree on every input,
+and indexed dispatch vs trying the rules one by one for a routing Choice with 1,000 rules.
+
+    python benchmarks/choice_rules.py
+"""
+import json
+import pathlib
+import timeit
+
+from aws_sfn_builder import State, choice_rules
+from aws_sfn_builder.choice_rules import to_numeric
+
+EXAMPLES = pathlib.Path(__file__).parent.parent / "tests" / "aws_examples"
+
+RULES = 500
+ROUTING_RULES = 1000
+
+
+def interpret(op, input):
+    """
+    How rules used to be evaluated: dispatch on the operator name, extract the variable
+    and coerce both sides on every evaluation.
+    """
+    if op.name == "Not":
+        return not interpret(op.value, input)
+    if op.name == "Or":
+        return any(interpret(v, input) for v in op.value)
+    if op.name == "And":
+        return all(interpret(v, input) for v in op.value)
+    x = op._variable.get(input)
+    if op.name == "StringEquals":
+        return str(x) == op.value
+    if op.name == "NumericEquals":
+        return to_numeric(x) == op.value
+    if op.name == "NumericGreaterThanEquals":
+        return to_numeric(x) >= op.value
+    if op.name == "NumericLessThan":
+        return to_numeric(x) < op.value
+    raise NotImplementedError(op.name)
+
+
+def interpreted_choice(state, input):
+    for choice_rule in state.choices:
+        if interpret(choice_rule.operator, input):
+            return choice_rule.next
+    return state.default
+
+
+def synthetic_choice(rules):
+    """
+    A routing Choice: half the rules test a string, half a numeric range, all on the same two variables.
+    """
+    choices = []
+    for i in range(rules):
+        if i % 2:
+            choices.append({"Variable": "$.route", "StringEquals": f"route-{i}", "Next": f"S{i}"})
+        else:
+            choices.append({
+                "And": [
+                    {"Variable": "$.size", "NumericGreaterThanEquals": i * 10},
+                    {"Variable": "$.size", "NumericLessThan": i * 10 + 5},
+                ],
+                "Next": f"S{i}",
+            })
+    return State.parse({"Type": "Choice", "Choices": choices, "Default": "Default"})
+
+
+def routing_choice(rules):
+    """
+    A routing Choice: a run of StringEquals rules on a tenant followed by a run of numeric size buckets.
+    """
+    choices = [
+        {"Variable": "$.tenant", "StringEquals": f"tenant-{i}", "Next": f"Tenant{i}"}
+        for i in range(rules // 2)
+    ]
+    choices += [
+        {
+            "And": [
+                {"Variable": "$.size", "NumericGreaterThanEquals": i * 100},
+                {"Variable": "$.size", "NumericLessThan": (i + 1) * 100},
+            ],
+            "Next": f"Bucket{i}",
+        }
+        for i in range(rules // 2)
+    ]
+    return State.parse({"Type": "Choice", "Choices": choices, "Default": "Default"})
+
+
+def compare_indexed(label, inputs, number):
+    indexed = routing_choice(ROUTING_RULES)
+    min_rules, choice_rules.INDEX_MIN_RULES = choice_rules.INDEX_MIN_RULES, ROUTING_RULES + 1
+    linear = routing_choice(ROUTING_RULES)
+    choice_rules.INDEX_MIN_RULES = min_rules
+
+    for input in inputs:
+        assert indexed.execute(input, None) == linear.execute(input, None)
+
+    def run(state):
+        for input in inputs:
+            state.execute(input, None)
+
+    linear_time = timeit.timeit(lambda: run(linear), number=number)
+    indexed_time = timeit.timeit(lambda: run(indexed), number=number)
+    evaluations = number * len(inputs)
+    print(
+        f"{label:24} linear      {evaluations / linear_time:>12,.0f}/s   "
+        f"indexed  {evaluations / indexed_time:>12,.0f}/s   x{linear_time / indexed_time:.1f}"
+    )
+
+
+def compare(label, state, inputs, number):
+    for input in inputs:
+        assert state.execute(input, None)[0] == interpreted_choice(state, input)
+
+    def run_interpreted():
+        for input in inputs:
+            interpreted_choice(state, input)
+
+    def run_compiled():
+        for input in inputs:
+            state.execute(input, None)
+
+    interpreted = timeit.timeit(run_interpreted, number=number)
+    compiled = timeit.timeit(run_compiled, number=number)
+    evaluations = number * len(inputs)
+    print(
+        f"{label:24} interpreted {evaluations / interpreted:>12,.0f}/s   "
+        f"compiled {evaluations / compiled:>12,.0f}/s   x{interpreted / compiled:.1f}"
+    )
+
+
+def main():
+    with open(EXAMPLES / "choice_state_x.json") as f:
+        choice_state_x = State.parse(json.load(f)["States"]["ChoiceStateX"])
+    compare("choice_state_x", choice_state_x, [
+        {"type": "Public", "value": 0},
+        {"type": "Private", "value": 0},
+        {"type": "Private", "value": 25},
+        {"type": "Private", "value": 30},
+    ], number=50000)
+
+    compare(f"{RULES} rules", synthetic_choice(RULES), [
+        {"route": f"route-{RULES // 2 + 1}", "size": -1},
+        {"route": "none", "size": (RULES - 2) * 10 + 1},
+        {"route": "none", "size": -1},
+    ], number=200)
+
+    compare_indexed(f"{ROUTING_RULES} routing rules", [
+        {"tenant": "tenant-10", "size": 0},
+        {"tenant": f"tenant-{ROUTING_RULES // 2 - 1}", "size": 0},
+        {"tenant": "unknown", "size": 250},
+        {"tenant": "unknown", "size": ROUTING_RULES * 50 - 1},
+        {"tenant": "unknown", "size": -1},
+    ], number=200)
+
+
+if __name__ == "__main__":
+    main()
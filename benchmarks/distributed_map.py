@@ -0,0 +1,87 @@
+"""
+Throughput and peak memory of a Distributed Map streaming items from a JSON Lines file
+through ItemBatcher to ResultWriter. Each size runs in its own process so that its peak RSS
+is measured on its own; with streaming it should stay flat as the number of items grows.
+
+    python benchmarks/distributed_map.py [ITEMS ...]
+
+    python benchmarks/distributed_map.py 10000000
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from aws_sfn_builder import Machine, Runner
+
+SIZES = [10000, 100000, 1000000]
+
+
+def write_items(path, items):
+    with open(path, "w") as f:
+        for i in range(items):
+            f.write(json.dumps({"id": i, "name": f"item-{i}"}) + "\n")
+
+
+def distributed_map(directory):
+    return Machine.parse({
+        "StartAt": "ForEachItem",
+        "States": {
+            "ForEachItem": {
+                "Type": "Map",
+                "ItemReader": {
+                    "Resource": "arn:aws:states:::s3:getObject",
+                    "ReaderConfig": {"InputType": "JSONL"},
+                    "Parameters": {"Bucket": directory, "Key": "items.jsonl"},
+                },
+                "ItemBatcher": {"MaxItemsPerBatch": 100},
+                "ItemProcessor": {
+                    "ProcessorConfig": {"Mode": "DISTRIBUTED", "ExecutionType": "EXPRESS"},
+                    "StartAt": "Measure",
+                    "States": {
+                        "Measure": {"Type": "Task", "Resource": "Measure", "End": True},
+                    },
+                },
+                "ResultWriter": {
+                    "Resource": "arn:aws:states:::s3:putObject",
+                    "Parameters": {"Bucket": directory, "Prefix": "results"},
+                },
+                "End": True,
+            },
+        },
+    })
+
+
+def measure(batch):
+    return sum(len(item["name"]) for item in batch["Items"])
+
+
+def run(items):
+    with tempfile.TemporaryDirectory() as directory:
+        write_items(os.path.join(directory, "items.jsonl"), items)
+        sm = distributed_map(directory)
+
+        with Runner() as runner:
+            runner.resources.register("Measure", measure)
+            started = time.perf_counter()
+            runner.run(sm, _timeout=3600)
+            elapsed = time.perf_counter() - started
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"  {items:>10,} items: {elapsed:7.2f}s  {items / elapsed:>9,.0f} items/s  peak RSS {peak_rss_mb:6.1f} MB")
+
+
+def main(sizes):
+    print("Distributed Map over a JSON Lines file, 100 items per batch")
+    for items in sizes:
+        subprocess.run([sys.executable, __file__, "--child", str(items)], check=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        run(int(sys.argv[2]))
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -0,0 +1,47 @@
+"""
+Intrinsic functions in the ItemSelector of a Map: expressions compiled once (with the arguments
+that do not reference paths folded) vs parsing them on every item.
+
+    python benchmarks/intrinsics.py
+"""
+import timeit
+
+from aws_sfn_builder.intrinsics import compile_intrinsic
+
+ITEMS = 10_000
+
+EXPRESSIONS = [
+    "States.ArrayPartition($.records, 25)",
+    "States.JsonToString($.detail)",
+    "States.Format('{}/{}/{}', $.tenant, States.MathAdd($.page, 1), States.Hash('salt', 'SHA-256'))",
+]
+
+
+def inputs():
+    return [
+        {
+            "tenant": f"tenant-{i % 10}",
+            "page": i,
+            "records": list(range(100)),
+            "detail": {"id": i, "tags": ["a", "b", "c"], "size": i * 10},
+        }
+        for i in range(ITEMS)
+    ]
+
+
+def main():
+    items = inputs()
+    parse = compile_intrinsic.__wrapped__
+    for expression in EXPRESSIONS:
+        get = compile_intrinsic(expression)
+        for item in items[:10]:
+            assert parse(expression)(item, None) == get(item, None)
+
+        parsed = timeit.timeit(lambda: [parse(expression)(item, None) for item in items], number=1)
+        compiled = timeit.timeit(lambda: [get(item, None) for item in items], number=1)
+        print(f"{expression[:40]:42} parsed   {ITEMS / parsed:>10,.0f}/s   compiled {ITEMS / compiled:>10,.0f}/s   "
+              f"x{parsed / compiled:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Executions per second of the job status poller example.
+
+    python benchmarks/job_status_poller.py
+"""
+import json
+import time
+from pathlib import Path
+
+from aws_sfn_builder import Machine, Runner
+
+EXAMPLE = Path(__file__).parent.parent / "tests" / "aws_examples" / "job_status_poller.json"
+
+
+def build_runner() -> Runner:
+    runner = Runner()
+
+    @runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob")
+    def submit_job(payload):
+        return payload
+
+    @runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob")
+    def check_job(payload):
+        return "FAILED" if payload < 30 else "SUCCEEDED"
+
+    return runner
+
+
+def main(duration=2.0):
+    with open(EXAMPLE) as f:
+        sm = Machine.parse(json.load(f))
+    runner = build_runner()
+
+    executions = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        runner.run(sm, {"input": 25, "wait_time": 0})
+        runner.run(sm, {"input": 40, "wait_time": 0})
+        executions += 2
+    elapsed = time.perf_counter() - started
+
+    print(f"job_status_poller: {executions / elapsed:,.0f} executions/sec")
+
+
+if __name__ == "__main__":
+    main()
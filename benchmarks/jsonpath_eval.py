@@ -0,0 +1,43 @@
+"""
+Evaluation of pre-compiled States Language paths: jsonpath_ng vs aws_sfn_builder.jsonpath.
+
+    python benchmarks/jsonpath_eval.py
+"""
+import timeit
+
+from jsonpath_ng import parse
+
+from aws_sfn_builder.jsonpath import compile_path
+
+DOC = {
+    "input": 25,
+    "guid": {"state": "run-mediainfo"},
+    "output": {"SdkResponseMetadata": {"RequestId": "1234-5678-9012"}},
+    "page": [{"page": str(i), "error_count": i % 2} for i in range(20)],
+}
+
+PATHS = [
+    "$",
+    "$.input",
+    "$.output.SdkResponseMetadata.RequestId",
+    "$.page[3].page",
+    "$.page[*].error_count",
+]
+
+
+def main(number=20000):
+    for path in PATHS:
+        ng = parse(path)
+        ours = compile_path(path)
+        assert ours.find(DOC) == [m.value for m in ng.find(DOC)]
+
+        ng_time = timeit.timeit(lambda: ng.find(DOC), number=number)
+        our_time = timeit.timeit(lambda: ours.find(DOC), number=number)
+        print(
+            f"{path:45} jsonpath_ng {number / ng_time:>12,.0f}/s   "
+            f"ours {number / our_time:>12,.0f}/s   x{ng_time / our_time:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
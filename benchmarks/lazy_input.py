@@ -0,0 +1,126 @@
+"""
+Peak RSS and time of a 10-state machine that only touches a few paths of a large input:
+the input loaded with json.load vs memory-mapped with lazy_json.load.
+
+    python benchmarks/lazy_input.py [size in MB, 1024 by default]
+
+Each mode runs in its own process so that their peak RSS are measured separately.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from aws_sfn_builder import lazy_json, Machine, Runner
+
+RECORD = {"name": "record", "tags": ["a", "b", "c"], "values": {"x": 1, "y": 2.5}, "text": "x" * 100}
+
+MACHINE = {
+    "StartAt": "Configure",
+    "States": {
+        "Configure": {
+            "Type": "Pass",
+            "InputPath": "$.config",
+            "Parameters": {"mode.$": "$.mode", "limit.$": "$.limit"},
+            "ResultPath": "$.settings",
+            "Next": "Route",
+        },
+        "Route": {
+            "Type": "Choice",
+            "Choices": [{"Variable": "$.settings.mode", "StringEquals": "full", "Next": "Fetch"}],
+            "Default": "Skip",
+        },
+        "Skip": {"Type": "Pass", "Result": "skipped", "ResultPath": "$.status", "Next": "Fetch"},
+        "Fetch": {
+            "Type": "Task",
+            "Resource": "Fetch",
+            "Parameters": {"owner.$": "$.meta.owner", "limit.$": "$.settings.limit"},
+            "ResultPath": "$.fetched",
+            "Next": "Label",
+        },
+        "Label": {
+            "Type": "Pass",
+            "Parameters": {"label.$": "States.Format('{}/{}', $.meta.owner, $.settings.mode)"},
+            "ResultPath": "$.label",
+            "Next": "Wait",
+        },
+        "Wait": {"Type": "Wait", "Seconds": 0, "Next": "Check"},
+        "Check": {
+            "Type": "Choice",
+            "Choices": [{"Variable": "$.fetched.count", "NumericGreaterThan": 0, "Next": "Count"}],
+            "Default": "Done",
+        },
+        "Count": {
+            "Type": "Task",
+            "Resource": "Count",
+            "InputPath": "$.fetched",
+            "ResultPath": "$.fetched.total",
+            "Next": "Summarize",
+        },
+        "Summarize": {
+            "Type": "Pass",
+            "Parameters": {"label.$": "$.label.label", "total.$": "$.fetched.total", "first.$": "$.records[0].name"},
+            "Next": "Done",
+        },
+        "Done": {"Type": "Succeed"},
+    },
+}
+
+
+def write_input(path, size_mb):
+    record = json.dumps(RECORD)
+    count = size_mb * 1024 * 1024 // (len(record) + 1)
+    with open(path, "w") as f:
+        f.write('{"config": {"mode": "full", "limit": 10}, "records": [')
+        chunk = ",".join([record] * 10_000)
+        for _ in range(count // 10_000):
+            f.write(chunk)
+            f.write(",")
+        f.write(record)
+        f.write('], "meta": {"owner": "team-a"}}')
+
+
+def run(mode, path):
+    started = time.perf_counter()
+    if mode == "json.load":
+        with open(path) as f:
+            input = json.load(f)
+    else:
+        input = lazy_json.load(path)
+    with Runner() as runner:
+        runner.resource_provider("Fetch")(lambda payload: {"count": payload["limit"]})
+        runner.resource_provider("Count")(lambda payload: payload["count"] * 2)
+        output = runner.run(Machine.parse(MACHINE), input)[1]
+    elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"output": output, "seconds": elapsed, "peak_mb": peak_mb}))
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "input.json")
+        write_input(path, size_mb)
+        print(f"input {os.path.getsize(path) / 1024 / 1024:,.0f} MB")
+        outputs = []
+        for mode in ("json.load", "lazy_json.load"):
+            result = subprocess.run(
+                [sys.executable, __file__, "--run", mode, path], stdout=subprocess.PIPE, universal_newlines=True,
+            )
+            if result.returncode:
+                print(f"{mode:16} failed with exit code {result.returncode}")
+                continue
+            measured = json.loads(result.stdout)
+            outputs.append(measured["output"])
+            print(f"{mode:16} {measured['seconds']:>8.2f} s   peak RSS {measured['peak_mb']:>8,.0f} MB")
+        assert all(output == outputs[0] for output in outputs)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--run"]:
+        run(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,62 @@
+"""
+Throughput of a Map state over thousands of items for different MaxConcurrency.
+
+    python benchmarks/map_items.py
+"""
+import time
+
+from aws_sfn_builder import Machine, ResourceManager, Runner
+
+ITEMS = 2000
+MAX_WORKERS = 32
+
+
+def fetch(payload):
+    time.sleep(0.001)  # stands for a call to a remote service
+    return {"id": payload["id"], "size": len(payload["name"])}
+
+
+def map_machine(max_concurrency, resource):
+    return Machine.parse({
+        "StartAt": "ForEachItem",
+        "States": {
+            "ForEachItem": {
+                "Type": "Map",
+                "ItemsPath": "$.items",
+                "ItemSelector": {
+                    "id.$": "$$.Map.Item.Index",
+                    "name.$": "$$.Map.Item.Value.name",
+                },
+                "MaxConcurrency": max_concurrency,
+                "ItemProcessor": {
+                    "ProcessorConfig": {"Mode": "INLINE"},
+                    "StartAt": "Process",
+                    "States": {
+                        "Process": {"Type": "Task", "Resource": resource, "End": True},
+                    },
+                },
+                "ResultPath": "$.results",
+                "End": True,
+            },
+        },
+    })
+
+
+def main(items=ITEMS):
+    resources = ResourceManager(providers={"Fetch": fetch, "Echo": lambda payload: payload})
+    input = {"items": [{"name": f"item-{i}"} for i in range(items)]}
+
+    print(f"Map over {items} items, max_workers={MAX_WORKERS}")
+    for resource in ("Echo", "Fetch"):
+        for max_concurrency in (1, 8, MAX_WORKERS, 0):
+            sm = map_machine(max_concurrency, resource)
+            with Runner(resources=resources, max_workers=MAX_WORKERS) as runner:
+                started = time.perf_counter()
+                final_state, output = runner.run(sm, input, _timeout=600)
+                elapsed = time.perf_counter() - started
+            assert len(output["results"]) == items
+            print(f"  {resource:5} MaxConcurrency={max_concurrency:<3}: {elapsed:.2f}s  {items / elapsed:,.0f} items/s")
+
+
+if __name__ == "__main__":
+    main()
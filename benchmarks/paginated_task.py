@@ -0,0 +1,43 @@
+"""
+Latency of a Task with ParallelPages paging through a result set, for different MaxPages.
+
+    python benchmarks/paginated_task.py
+"""
+import time
+
+from aws_sfn_builder import Machine, Pages, Runner
+
+PAGES = 50
+PAGE_LATENCY = 0.02
+
+
+def fetch_page(page):
+    time.sleep(PAGE_LATENCY)  # stands for a call to a paginated API
+    return [{"page": page, "item": i} for i in range(100)]
+
+
+def list_items(payload):
+    return Pages(fetch_page, PAGES)
+
+
+def main():
+    print(f"{PAGES} pages of {PAGE_LATENCY * 1000:.0f}ms each")
+    for max_pages in (1, 4, 16, 0):
+        sm = Machine.parse({
+            "StartAt": "ListItems",
+            "MaxPages": max_pages,
+            "States": {
+                "ListItems": {"Type": "Task", "Resource": "ListItems", "ParallelPages": True, "End": True},
+            },
+        })
+        with Runner(max_workers=PAGES) as runner:
+            runner.resources.register("ListItems", list_items)
+            started = time.perf_counter()
+            final_state, output = runner.run(sm, _timeout=600)
+            elapsed = time.perf_counter() - started
+        assert len(output) == PAGES * 100
+        print(f"  MaxPages={max_pages:<3}: {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
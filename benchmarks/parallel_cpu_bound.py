@@ -0,0 +1,40 @@
+"""
+Scaling of a Parallel state with CPU-bound providers across worker processes.
+
+    python benchmarks/parallel_cpu_bound.py
+"""
+import hashlib
+import os
+import time
+
+from aws_sfn_builder import Machine, ResourceManager, Runner
+
+BRANCHES = 8
+
+
+def burn_cpu(payload):
+    digest = payload["seed"].encode()
+    for _ in range(payload["rounds"]):
+        digest = hashlib.sha256(digest).digest()
+    return digest.hex()
+
+
+def main(rounds=200000):
+    sm = Machine.parse([[{"Resource": "BurnCpu"}] for _ in range(BRANCHES)])
+    resources = ResourceManager(providers={"BurnCpu": burn_cpu})
+    input = {"seed": "x", "rounds": rounds}
+
+    print(f"{BRANCHES} CPU-bound branches, {os.cpu_count()} CPUs")
+    baseline = None
+    for executor, max_workers in [("thread", 1), ("thread", BRANCHES), *(("process", n) for n in (1, 2, 4, 8))]:
+        with Runner(resources=resources, executor=executor, max_workers=max_workers) as runner:
+            runner.run(sm, input, _timeout=600)  # warm up the workers
+            started = time.perf_counter()
+            runner.run(sm, input, _timeout=600)
+            elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"  {executor:8} max_workers={max_workers}: {elapsed:.2f}s  x{baseline / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
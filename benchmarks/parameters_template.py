@@ -0,0 +1,79 @@
+"""
+Applying a Task's 40-field Parameters template: interpreting the template on every
+execution (as format_dict used to) vs the template compiled once by compile_template.
+
+    python benchmarks/parameters_template.py
+"""
+import timeit
+
+from aws_sfn_builder.jsonpath import compile_path
+from aws_sfn_builder.templates import compile_template, format_array, parse_json
+
+INPUT = {
+    "job": {"id": "job-1", "owner": {"name": "ops", "team": "data"}, "attempt": 3},
+    "detail": {f"field{i}": i for i in range(20)},
+    "page": [{"n": i} for i in range(5)],
+}
+
+PARAMETERS = {
+    **{f"const{i}": f"value {i}" for i in range(20)},
+    **{f"field{i}.$": f"$.detail.field{i}" for i in range(13)},
+    "jobId.$": "$.job.id",
+    "attempt.$": "$.job.attempt",
+    "owner": {"name.$": "$.job.owner.name", "team.$": "$.job.owner.team", "kind": "user"},
+    "limits": {"cpu": 2, "memory": 4096},
+    "tags": ["a", "b"],
+    "index.$": "$$.Map.Item.Index",
+    "first.$": "$.page[0].n",
+}
+
+CONTEXT = {"Map": {"Item": {"Index": 7, "Value": {}}}}
+
+
+def interpret(input, dict_param, context=None):
+    """
+    How templates used to be applied: every key inspected and every path looked up again on every call.
+    """
+    if isinstance(dict_param, list):
+        return dict_param
+    new_params = {}
+    for name, value in dict_param.items():
+        is_path = name.endswith('.$')
+        if is_path:
+            name = name[:-2]
+        if isinstance(value, str) and value.startswith("$") and name.endswith('[*]'):
+            name = name[:-3]
+            value = parse_json(input, value, name)
+        elif isinstance(value, dict) or isinstance(value, list):
+            if name.endswith('[*]'):
+                name = name[:-3]
+                new_params[name] = format_array(input, value)
+            else:
+                new_params[name] = interpret(input, value, context)
+            continue
+        if is_path and context is not None and isinstance(value, str) and value.startswith("$$"):
+            new_params[name] = compile_path(value[1:]).get(context)
+            continue
+        if isinstance(value, str) and (
+            value.startswith("$.") or (is_path and value.startswith("$") and not value.startswith("$$"))
+        ):
+            value = parse_json(input, value, name)
+        new_params[name] = value
+    return new_params
+
+
+def main(number=20000):
+    build = compile_template(PARAMETERS)
+    assert build(INPUT, CONTEXT) == interpret(INPUT, PARAMETERS, CONTEXT)
+    assert len(PARAMETERS) == 40
+
+    interpreted = timeit.timeit(lambda: interpret(INPUT, PARAMETERS, CONTEXT), number=number)
+    compiled = timeit.timeit(lambda: build(INPUT, CONTEXT), number=number)
+    print(
+        f"40-field Parameters   interpreted {number / interpreted:>10,.0f}/s   "
+        f"compiled {number / compiled:>10,.0f}/s   x{interpreted / compiled:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+A 5 MB input fanned out to 50 Parallel branches: branches sharing the input (ResultPath
+copies only the objects on the way to the result) vs every branch getting a deep copy
+of it, as the runner used to do.
+
+    python benchmarks/shared_payloads.py
+"""
+import copy
+import json
+import time
+import tracemalloc
+
+from aws_sfn_builder import Machine, Runner
+
+BRANCHES = 50
+
+
+class CopyingRunner(Runner):
+    def run_sequences(self, sequences, inputs, *args, **kwargs):
+        return super().run_sequences(sequences, [copy.deepcopy(input) for input in inputs], *args, **kwargs)
+
+
+def machine():
+    return Machine.parse({
+        "StartAt": "FanOut",
+        "States": {
+            "FanOut": {
+                "Type": "Parallel",
+                "Branches": [
+                    {
+                        "StartAt": "Score",
+                        "States": {
+                            "Score": {
+                                "Type": "Task",
+                                "Resource": "Score",
+                                "Parameters": {"id.$": "$.id", "branch": i},
+                                "ResultPath": "$.score",
+                                "End": True,
+                            },
+                        },
+                    }
+                    for i in range(BRANCHES)
+                ],
+                "ResultSelector": {"scores.$": "$[*].score"},
+                "End": True,
+            },
+        },
+    })
+
+
+def document():
+    return {
+        "id": "doc-1",
+        "records": [
+            {"index": i, "name": f"record-{i}", "tags": ["a", "b", "c"], "values": {"x": i, "y": i * 2.5}}
+            for i in range(48_000)
+        ],
+    }
+
+
+def measure(runner_class, sm, doc):
+    with runner_class() as runner:
+        runner.resource_provider("Score")(lambda payload: payload["branch"])
+        started = time.perf_counter()
+        output = runner.run(sm, doc)[1]
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        runner.run(sm, doc)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return output, elapsed, peak
+
+
+def main():
+    sm = machine()
+    doc = document()
+    print(f"input {len(json.dumps(doc)) / 1e6:.1f} MB, {BRANCHES} branches")
+    copied_output, copied_time, copied_peak = measure(CopyingRunner, sm, doc)
+    shared_output, shared_time, shared_peak = measure(Runner, sm, doc)
+    assert copied_output == shared_output
+    print(f"deep copies  {copied_time * 1000:>8.1f} ms   peak {copied_peak / 1e6:>8.1f} MB")
+    print(f"shared       {shared_time * 1000:>8.1f} ms   peak {shared_peak / 1e6:>8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Replay of 200 executions of a Task whose provider hangs on 2% of the calls, with and without
+TimeoutSeconds (and a Retry): the slowest executions are bounded by the timeout instead of the hang.
+Also the overhead of calling providers under a deadline.
+
+    python benchmarks/task_deadlines.py
+"""
+import random
+import threading
+import time
+
+from aws_sfn_builder import Machine, Runner
+
+EXECUTIONS = 200
+HANG_SECONDS = 2.0
+
+
+def machine(timeout_seconds=None):
+    task = {"Type": "Task", "Resource": "Flaky", "End": True}
+    if timeout_seconds is not None:
+        task["TimeoutSeconds"] = timeout_seconds
+        task["Retry"] = [{"ErrorEquals": ["States.Timeout"], "IntervalSeconds": 0, "MaxAttempts": 3}]
+    return Machine.parse({"StartAt": "Flaky", "States": {"Flaky": task}})
+
+
+def replay(sm):
+    rng = random.Random(0)
+    lock = threading.Lock()
+    runner = Runner()
+
+    @runner.resource_provider("Flaky")
+    def flaky(payload):
+        with lock:
+            hangs = rng.random() < 0.02
+        time.sleep(HANG_SECONDS if hangs else 0.001)
+        return payload
+
+    latencies = []
+    for i in range(EXECUTIONS):
+        started = time.perf_counter()
+        runner.run(sm, i)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return sum(latencies), latencies[len(latencies) * 99 // 100], latencies[-1]
+
+
+def overhead(sm, calls=2000):
+    runner = Runner()
+    runner.resource_provider("Flaky")(lambda payload: payload)
+    started = time.perf_counter()
+    for i in range(calls):
+        runner.run(sm, i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    for name, sm in (("no TimeoutSeconds", machine()), ("TimeoutSeconds 0.05", machine(0.05))):
+        total, p99, worst = replay(sm)
+        print(f"{name:20} total {total:>6.2f}s  p99 {p99 * 1000:>7.1f}ms  max {worst * 1000:>7.1f}ms")
+    for name, sm in (("no TimeoutSeconds", machine()), ("TimeoutSeconds 60", machine(60))):
+        print(f"{name:20} {overhead(sm):>6.0f}us per execution of a no-op provider")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+A Map of 500 calls of a 10ms provider under different reserved concurrencies, with the time
+the calls waited in the queue of the limit: what sizing the concurrency of a function costs.
+
+    python benchmarks/throttling.py
+"""
+import time
+
+from aws_sfn_builder import Machine, ResourceManager, Runner
+
+ARN = "arn:aws:lambda:us-east-1:123456789012:function:Resize"
+CALLS = 500
+
+
+def machine():
+    return Machine.parse({
+        "StartAt": "FanOut",
+        "States": {
+            "FanOut": {
+                "Type": "Map",
+                "Iterator": {"StartAt": "Resize", "States": {"Resize": {"Type": "Task", "Resource": ARN, "End": True}}},
+                "End": True,
+            },
+        },
+    })
+
+
+def resize(payload):
+    time.sleep(0.01)
+    return payload
+
+
+def main():
+    sm = machine()
+    for max_concurrency in (None, 50, 10, 2):
+        resources = ResourceManager(providers={ARN: resize})
+        limit = resources.limit("arn:aws:lambda:*", max_concurrency=max_concurrency)
+        with Runner(resources=resources, max_workers=100) as runner:
+            started = time.perf_counter()
+            runner.run(sm, list(range(CALLS)))
+            elapsed = time.perf_counter() - started
+        info = limit.info()
+        print(
+            f"max_concurrency {str(max_concurrency):>4}: {elapsed:>6.2f}s, {info.throttled:>3} calls throttled, "
+            f"queue wait {info.total_wait / CALLS * 1000:>7.1f}ms on average, {info.max_wait * 1000:>7.1f}ms at most"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Executions parked at Wait states: a polling loop on a simulated clock, and many
+executions waiting in real time in a single thread.
+
+    python benchmarks/wait_scheduler.py
+"""
+import resource
+import threading
+import time
+
+from aws_sfn_builder import Machine, Runner, Scheduler, VirtualClock
+
+POLLS = 10000
+PARKED = 100000
+WAIT_SECONDS = 2
+
+
+def polling_machine():
+    return Machine.parse({
+        "StartAt": "Check",
+        "States": {
+            "Check": {"Type": "Task", "Resource": "Check", "ResultPath": "$.done", "Next": "Done?"},
+            "Done?": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.done", "BooleanEquals": True, "Next": "Finished"}],
+                "Default": "Wait",
+            },
+            "Wait": {"Type": "Wait", "Seconds": 60, "Next": "Check"},
+            "Finished": {"Type": "Succeed"},
+        },
+    })
+
+
+def simulated_polling():
+    polls = [0]
+
+    def check(payload):
+        polls[0] += 1
+        return polls[0] >= POLLS
+
+    clock = VirtualClock()
+    with Runner(clock=clock) as runner:
+        runner.resources.register("Check", check)
+        started = time.perf_counter()
+        runner.run(polling_machine())
+        elapsed = time.perf_counter() - started
+    print(f"  {POLLS:,} polls every minute ({clock.time() / 86400:.1f} simulated days) in {elapsed:.2f}s")
+
+
+def parked_in_real_time():
+    sm = Machine.parse({
+        "StartAt": "Wait",
+        "States": {
+            "Wait": {"Type": "Wait", "Seconds": WAIT_SECONDS, "Next": "Done"},
+            "Done": {"Type": "Pass", "End": True},
+        },
+    })
+    scheduler = Scheduler()
+    started = time.perf_counter()
+    executions = [scheduler.start(sm, {"i": i}) for i in range(PARKED)]
+    scheduler.run()
+    elapsed = time.perf_counter() - started
+    assert all(execution.done for execution in executions)
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"  {PARKED:,} executions waiting {WAIT_SECONDS}s each: {elapsed:.2f}s, "
+        f"{threading.active_count()} thread(s), peak RSS {peak_rss_mb:.0f} MB"
+    )
+
+
+def main():
+    print("Wait states")
+    simulated_polling()
+    parked_in_real_time()
+
+
+if __name__ == "__main__":
+    main()
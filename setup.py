@@ -30,6 +30,9 @@ setup(
         "dataclasses",
         "jsonpath-ng",
     ],
+    extras_require={
+        "numpy": ["numpy"],
+    },
     keywords=[
         "aws",
         "asl",
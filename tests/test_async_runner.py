@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+from aws_sfn_builder import AsyncRunner, Machine, Runner
+
+
+def test_runs_hello_world_machine_with_coroutine_provider(example):
+    sm = Machine.parse(example("hello_world"))
+    runner = AsyncRunner()
+
+    @runner.resource_provider("arn:aws:lambda:us-east-1:123456789012:function:HelloWorld")
+    async def hello_world(payload):
+        await asyncio.sleep(0)
+        return "Hello, world!"
+
+    assert asyncio.run(runner.run(sm)) == (sm.start_at_state, "Hello, world!")
+
+
+def test_runs_plain_function_providers_off_the_event_loop(example):
+    sm = Machine.parse(example("hello_world"))
+    threads = []
+
+    with AsyncRunner() as runner:
+        @runner.resource_provider("arn:aws:lambda:us-east-1:123456789012:function:HelloWorld")
+        def hello_world(payload):
+            threads.append(threading.current_thread())
+            return "Hello, world!"
+
+        assert asyncio.run(runner.run(sm)) == (sm.start_at_state, "Hello, world!")
+
+    assert threads and threads[0] is not threading.main_thread()
+
+
+@pytest.mark.parametrize("input", [{"input": 25, "wait_time": 0}, {"input": 40, "wait_time": 0}])
+def test_async_execution_matches_sync_execution(example, input):
+    sm = Machine.parse(example("job_status_poller"))
+
+    def check_job(payload):
+        return "FAILED" if payload < 30 else "SUCCEEDED"
+
+    async def acheck_job(payload):
+        return check_job(payload)
+
+    runner = Runner()
+    runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob")(lambda payload: payload)
+    runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob")(check_job)
+
+    async_runner = AsyncRunner()
+    async_runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob")(lambda payload: payload)
+    async_runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob")(acheck_job)
+
+    assert asyncio.run(async_runner.run(sm, dict(input))) == runner.run(sm, dict(input)) == runner.walk(sm, dict(input))
+
+
+def test_walking_is_left_to_the_sync_runner(example):
+    with pytest.raises(TypeError):
+        AsyncRunner().walk(Machine.parse(example("hello_world")))
+
+
+def test_parallel_branches_are_gathered():
+    sm = Machine.parse([
+        [{"Resource": "A"}],
+        [{"Resource": "B"}],
+    ])
+
+    async def main():
+        a_started, b_started = asyncio.Event(), asyncio.Event()
+        runner = AsyncRunner()
+
+        @runner.resource_provider("A")
+        async def a(payload):
+            a_started.set()
+            await asyncio.wait_for(b_started.wait(), 5)
+            return "a"
+
+        @runner.resource_provider("B")
+        async def b(payload):
+            b_started.set()
+            await asyncio.wait_for(a_started.wait(), 5)
+            return "b"
+
+        return await runner.run(sm, {})
+
+    final_state, output = asyncio.run(main())
+    assert output == ["a", "b"]
+
+
+def test_runs_many_concurrent_executions_on_one_loop():
+    sm = Machine.parse([{"Resource": "Sleep"}, {"Type": "Pass", "Result": "done", "ResultPath": "$.status"}])
+    runner = AsyncRunner()
+    in_flight = []
+
+    @runner.resource_provider("Sleep")
+    async def sleep(payload):
+        in_flight.append(payload["i"])
+        await asyncio.sleep(0.01)
+        return payload
+
+    async def main():
+        return await asyncio.gather(*(runner.run(sm, {"i": i}) for i in range(5000)))
+
+    results = asyncio.run(main())
+    assert [output for _, output in results] == [{"i": i, "status": "done"} for i in range(5000)]
+    assert len(in_flight) == 5000
@@ -0,0 +1,121 @@
+import asyncio
+import pickle
+import threading
+
+import pytest
+
+from aws_sfn_builder import AsyncRunner, Batcher, LRU, Machine, ResourceManager, Runner
+
+GET_ITEM = Machine.parse({
+    "StartAt": "GetItem",
+    "States": {"GetItem": {"Type": "Task", "Resource": "GetItem", "End": True}},
+})
+
+
+def test_sequential_calls_are_batches_of_one():
+    batches = []
+    runner = Runner()
+
+    @runner.batch_resource_provider("GetItem", max_wait_ms=0)
+    def get_items(payloads):
+        batches.append(payloads)
+        return [payload * 2 for payload in payloads]
+
+    assert [runner.run(GET_ITEM, i)[1] for i in range(3)] == [0, 2, 4]
+    assert batches == [[0], [1], [2]]
+
+
+def test_concurrent_calls_are_coalesced_into_batches():
+    batches = []
+    resources = ResourceManager()
+
+    @resources.batch_provider("GetItem", max_batch=4, max_wait_ms=1000)
+    def get_items(payloads):
+        batches.append(payloads)
+        return [{"key": payload, "value": payload * 10} for payload in payloads]
+
+    provider = resources("GetItem")
+    results = {}
+
+    def call(payload):
+        results[payload] = provider(payload)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: {"key": i, "value": i * 10} for i in range(8)}
+    assert sorted(len(batch) for batch in batches) == [4, 4]
+    assert provider.batcher.batches == 2
+
+
+def test_errors_of_payloads_and_of_batches():
+    def get_items(payloads):
+        if "all" in payloads:
+            raise RuntimeError("batch failed")
+        return [KeyError(payload) if payload == "missing" else payload for payload in payloads]
+
+    batcher = Batcher(max_batch=2, max_wait_ms=1000)
+    provider = batcher.wrap(get_items)
+    outcomes = {}
+
+    def call(payload):
+        try:
+            outcomes[payload] = provider(payload)
+        except Exception as e:
+            outcomes[payload] = type(e)
+
+    for payloads in (["found", "missing"], ["all", "other"]):
+        threads = [threading.Thread(target=call, args=(payload,)) for payload in payloads]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert outcomes == {"found": "found", "missing": KeyError, "all": RuntimeError, "other": RuntimeError}
+
+
+def test_wrong_number_of_results_fails_the_batch():
+    provider = Batcher(max_wait_ms=0).wrap(lambda payloads: [])
+    with pytest.raises(ValueError):
+        provider(1)
+
+
+def test_coroutine_batch_provider_coalesces_executions_on_the_loop():
+    batches = []
+    runner = AsyncRunner()
+
+    @runner.batch_resource_provider("GetItem", max_batch=50, max_wait_ms=5)
+    async def get_items(payloads):
+        batches.append(payloads)
+        await asyncio.sleep(0)
+        return [payload + 1 for payload in payloads]
+
+    async def main():
+        return await asyncio.gather(*(runner.run(GET_ITEM, i) for i in range(120)))
+
+    assert [output for _, output in asyncio.run(main())] == [i + 1 for i in range(120)]
+    assert [len(batch) for batch in batches] == [50, 50, 20]
+
+
+def test_batch_provider_with_cache():
+    batches = []
+    resources = ResourceManager()
+
+    @resources.batch_provider("GetItem", max_wait_ms=0, cache=LRU())
+    def get_items(payloads):
+        batches.append(payloads)
+        return payloads
+
+    runner = Runner(resources=resources)
+    assert [runner.run(GET_ITEM, i % 2)[1] for i in range(4)] == [0, 1, 0, 1]
+    assert batches == [[0], [1]]
+
+
+def test_batchers_are_pickled_with_their_settings():
+    resources = ResourceManager(providers={"GetItem": "builtins:list"}, batchers={"GetItem": Batcher(7, 0)})
+    copy = pickle.loads(pickle.dumps(resources))
+    assert copy("GetItem").batcher.max_batch == 7
+    assert copy("GetItem")("ab") == "ab"
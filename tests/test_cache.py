@@ -0,0 +1,165 @@
+import asyncio
+import pickle
+import threading
+import time
+
+import pytest
+
+from aws_sfn_builder import AsyncRunner, LRU, Machine, ResourceManager, Runner
+from aws_sfn_builder.cache import payload_key
+
+LOOKUPS = Machine.parse({
+    "StartAt": "Lookups",
+    "States": {
+        "Lookups": {
+            "Type": "Map",
+            "Iterator": {
+                "StartAt": "Lookup",
+                "States": {"Lookup": {"Type": "Task", "Resource": "Lookup", "End": True}},
+            },
+            "End": True,
+        },
+    },
+})
+
+
+class Timer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_payload_key_is_canonical():
+    assert payload_key({"a": 1, "b": [1, {"c": None}]}) == payload_key({"b": [1, {"c": None}], "a": 1})
+    assert payload_key({"a": 1}) != payload_key({"a": 2})
+    assert payload_key({"a": object()}) is None
+
+
+def test_results_are_cached_by_payload():
+    calls = []
+    resources = ResourceManager()
+
+    @resources.provider("Lookup", cache=LRU())
+    def lookup(payload):
+        calls.append(payload)
+        return {"name": f"user-{payload['id']}"}
+
+    runner = Runner(resources=resources)
+    for _ in range(3):
+        output = runner.run(LOOKUPS, [{"id": 1}, {"id": 2}, {"id": 1}])[1]
+        assert output == [{"name": "user-1"}, {"name": "user-2"}, {"name": "user-1"}]
+
+    assert sorted(call["id"] for call in calls) == [1, 2]
+    assert resources("Lookup").cache.info() == (7, 2, 0, 2, 128)
+
+
+def test_callers_get_their_own_copy():
+    provider = LRU().wrap(lambda payload: {"items": [payload]})
+    first = provider(1)
+    first["items"].append(2)
+    assert provider(1) == {"items": [1]}
+
+
+def test_least_recently_used_results_are_evicted():
+    calls = []
+    provider = LRU(maxsize=2).wrap(lambda payload: calls.append(payload) or payload)
+    for payload in (1, 2, 1, 3, 1, 2):
+        provider(payload)
+    assert calls == [1, 2, 3, 2]
+    assert provider.cache.info() == (2, 4, 2, 2, 2)
+
+
+def test_results_expire():
+    timer = Timer()
+    calls = []
+    provider = LRU(ttl=10, timer=timer).wrap(lambda payload: calls.append(payload) or payload)
+    provider(1)
+    timer.now = 9
+    provider(1)
+    timer.now = 10
+    provider(1)
+    assert calls == [1, 1]
+    assert provider.cache.info().evictions == 1
+
+
+def test_errors_are_not_cached():
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise RuntimeError("flaky")
+        return payload
+
+    provider = LRU().wrap(flaky)
+    with pytest.raises(RuntimeError):
+        provider(1)
+    assert provider(1) == 1
+    assert provider(1) == 1
+    assert calls == [1, 1]
+
+
+def test_payloads_that_are_not_json_are_not_cached():
+    calls = []
+    provider = LRU().wrap(lambda payload: calls.append(payload) or 1)
+    provider({1, 2})
+    provider({1, 2})
+    assert len(calls) == 2
+
+
+def test_concurrent_calls_with_equal_payloads_are_made_once():
+    calls = []
+    started = threading.Event()
+
+    def slow(payload):
+        calls.append(payload)
+        started.set()
+        time.sleep(0.05)
+        return {"id": payload["id"]}
+
+    resources = ResourceManager()
+    resources.register("Lookup", slow, cache=LRU())
+    with Runner(resources=resources, max_workers=8) as runner:
+        output = runner.run(LOOKUPS, [{"id": 1}] * 8)[1]
+
+    assert output == [{"id": 1}] * 8
+    assert len(calls) == 1
+
+
+def test_coroutine_providers_are_cached_on_the_loop():
+    calls = []
+    runner = AsyncRunner()
+
+    @runner.resource_provider("Lookup", cache=LRU())
+    async def lookup(payload):
+        calls.append(payload)
+        await asyncio.sleep(0.01)
+        return {"id": payload["id"]}
+
+    async def main():
+        return await asyncio.gather(*(runner.run(LOOKUPS, [{"id": 1}, {"id": 2}]) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert [output for _, output in results] == [[{"id": 1}, {"id": 2}]] * 5
+    assert sorted(call["id"] for call in calls) == [1, 2]
+    assert asyncio.run(runner.run(LOOKUPS, [{"id": 2}]))[1] == [{"id": 2}]
+    assert len(calls) == 2
+
+
+def test_caches_are_pickled_empty():
+    resources = ResourceManager(providers={"Dumps": "json.dumps"}, caches={"Dumps": LRU(maxsize=8, ttl=60)})
+    resources("Dumps")([1])
+    copy = pickle.loads(pickle.dumps(resources))
+    assert copy("Dumps")([1]) == "[1]"
+    assert copy("Dumps").cache.info() == (0, 1, 0, 1, 8)
+    assert copy("Dumps").cache.ttl == 60
+
+
+def test_registering_again_replaces_the_cache():
+    resources = ResourceManager()
+    resources.register("Echo", lambda payload: payload, cache=LRU())
+    assert hasattr(resources("Echo"), "cache")
+    resources.register("Echo", lambda payload: payload)
+    assert not hasattr(resources("Echo"), "cache")
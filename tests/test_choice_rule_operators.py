@@ -1,3 +1,6 @@
+import pytest
+
+from aws_sfn_builder import State
 from aws_sfn_builder.choice_rules import Operator
 
 
@@ -108,3 +111,213 @@ def test_nested_ands_and_ors_and_nots():
     assert op.matches({"value": 28})
     assert op.matches({"value": 29})
     assert not op.matches({"value": 30})
+
+
+def test_not_operator():
+    op = Operator.parse({
+        "Not": {
+            "Variable": "$.type",
+            "StringEquals": "Private",
+        },
+        "Next": "Public",
+    })
+    assert op.matches({"type": "Public"})
+    assert not op.matches({"type": "Private"})
+
+
+def test_choice_routes_to_first_matching_rule(example):
+    state = State.parse(example("choice_state_x")["States"]["ChoiceStateX"])
+
+    assert state.execute({"type": "Public", "value": 0}, None) == ("Public", {"type": "Public", "value": 0})
+    assert state.execute({"type": "Private", "value": 0}, None)[0] == "ValueIsZero"
+    assert state.execute({"type": "Private", "value": 25}, None)[0] == "ValueInTwenties"
+    assert state.execute({"type": "Private", "value": 30}, None)[0] == "DefaultState"
+
+
+def test_variable_shared_by_rules_is_extracted_once():
+    state = State.parse({
+        "Type": "Choice",
+        "Choices": [
+            {"Variable": "$.value", "NumericEquals": 0, "Next": "Zero"},
+            {
+                "And": [
+                    {"Variable": "$.value", "NumericGreaterThanEquals": 20},
+                    {"Variable": "$.value", "NumericLessThan": 30},
+                ],
+                "Next": "Twenties",
+            },
+        ],
+        "Default": "Other",
+    })
+
+    class CountingInput(dict):
+        reads = 0
+
+        def __getitem__(self, key):
+            self.reads += 1
+            return super().__getitem__(key)
+
+    input = CountingInput(value=25)
+    assert state.execute(input, None)[0] == "Twenties"
+    assert input.reads == 1
+
+
+@pytest.mark.parametrize("operator,value,expected", [
+    ["TimestampEquals", "2016-03-14T01:59:00Z", True],
+    ["TimestampEquals", "2016-03-14T02:59:00+01:00", True],
+    ["TimestampGreaterThan", "2016-03-14T01:58:59Z", True],
+    ["TimestampLessThan", "2016-03-14T01:58:59Z", False],
+])
+def test_timestamp_operators_compare_points_in_time(operator, value, expected):
+    op = Operator.parse({"Variable": "$.at", operator: value})
+    assert op.matches({"at": "2016-03-14T01:59:00"}) is expected
+
+
+def random_rule(rng, kind):
+    if kind == "string":
+        return {"Variable": "$.s", "StringEquals": f"s{rng.randrange(20)}"}
+    kind = rng.choice(["equals", "range", "open", "or", "empty"])
+    if kind == "equals":
+        return {"Variable": "$.n", "NumericEquals": rng.randrange(100)}
+    if kind == "range":
+        low = rng.randrange(100)
+        return {"And": [
+            {"Variable": "$.n", rng.choice(["NumericGreaterThan", "NumericGreaterThanEquals"]): low},
+            {"Variable": "$.n", rng.choice(["NumericLessThan", "NumericLessThanEquals"]): low + rng.randrange(10)},
+        ]}
+    if kind == "open":
+        return {"Variable": "$.n", rng.choice(["NumericGreaterThan", "NumericLessThanEquals"]): rng.randrange(100)}
+    if kind == "or":
+        return {"Or": [{"Variable": "$.n", "NumericEquals": rng.randrange(100)} for _ in range(3)]}
+    return {"And": [
+        {"Variable": "$.n", "NumericGreaterThanEquals": 50},
+        {"Variable": "$.n", "NumericLessThan": 50},
+    ]}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_indexed_choice_matches_rules_in_order(monkeypatch, seed):
+    import random
+
+    from aws_sfn_builder import choice_rules
+
+    rng = random.Random(seed)
+    # Runs of indexable rules on the same variable, separated by rules that cannot be indexed.
+    choices = []
+    while len(choices) < 300:
+        kind = rng.choice(["string", "numeric"])
+        choices.extend(random_rule(rng, kind) for _ in range(rng.randrange(1, 40)))
+        choices.append({"Not": {"Variable": "$.n", "NumericEquals": rng.randrange(100)}})
+    source = {
+        "Type": "Choice",
+        "Choices": [{**rule, "Next": f"S{i}"} for i, rule in enumerate(choices)],
+        "Default": "Default",
+    }
+
+    indexed = State.parse(source)
+    monkeypatch.setattr(choice_rules, "INDEX_MIN_RULES", len(choices) + 1)
+    linear = State.parse(source)
+    assert indexed._choose.__name__ == "choose_indexed"
+    assert linear._choose.__name__ != "choose_indexed"
+
+    inputs = [
+        {"s": f"s{rng.randrange(25)}", "n": rng.choice([rng.randrange(-5, 115), rng.random() * 110])}
+        for _ in range(500)
+    ]
+    inputs += [{"s": "s1", "n": n} for n in range(-1, 112)]
+    inputs += [{"s": "s1", "n": n + 0.5} for n in range(-1, 112)]
+    for input in inputs:
+        assert indexed.execute(input, None)[0] == linear.execute(input, None)[0], input
+
+
+def test_indexed_equality_rules_coerce_the_variable_like_the_rules():
+    state = State.parse({
+        "Type": "Choice",
+        "Choices": (
+            [{"Variable": "$.code", "StringEquals": str(i), "Next": f"String{i}"} for i in range(10)]
+            + [{"Variable": "$.code", "NumericEquals": i, "Next": f"Number{i}"} for i in range(10)]
+            + [{"Variable": "$.code", "NumericEquals": 3, "Next": "Shadowed"}]
+        ),
+        "Default": "Default",
+    })
+    assert state._choose.__name__ == "choose_indexed"
+
+    assert state.execute({"code": "3"}, None)[0] == "String3"
+    assert state.execute({"code": 3}, None)[0] == "String3"
+    assert state.execute({"code": 3.0}, None)[0] == "Number3"
+    assert state.execute({"code": "12"}, None)[0] == "Default"
+
+
+NEW_YEAR = "2020-01-01T00:00:00Z"
+
+OPERATOR_CASES = [
+    [{"Variable": "$.a", "IsPresent": True}, {"a": None}, True],
+    [{"Variable": "$.a", "IsPresent": True}, {"b": 1}, False],
+    [{"Variable": "$.a", "IsPresent": False}, {"b": 1}, True],
+    [{"Variable": "$.a.b", "IsPresent": True}, {"a": "not an object"}, False],
+    [{"Variable": "$.a", "IsNull": True}, {"a": None}, True],
+    [{"Variable": "$.a", "IsNull": False}, {"a": None}, False],
+    [{"Variable": "$.a", "IsBoolean": True}, {"a": False}, True],
+    [{"Variable": "$.a", "IsBoolean": True}, {"a": "true"}, False],
+    [{"Variable": "$.a", "IsBoolean": False}, {"a": "True"}, True],
+    [{"Variable": "$.a", "IsBoolean": True}, {"a": 1}, False],
+    [{"Variable": "$.a", "IsNumeric": True}, {"a": 1.5}, True],
+    [{"Variable": "$.a", "IsNumeric": True}, {"a": 3}, True],
+    [{"Variable": "$.a", "IsNumeric": True}, {"a": "3"}, False],
+    [{"Variable": "$.a", "IsNumeric": True}, {"a": True}, False],
+    [{"Variable": "$.a", "IsNumeric": True}, {"a": None}, False],
+    [{"Variable": "$.a", "IsString": False}, {"a": 1}, True],
+    [{"Variable": "$.a", "IsTimestamp": True}, {"a": "2016-03-14T01:59:00Z"}, True],
+    [{"Variable": "$.a", "IsTimestamp": True}, {"a": "2016-03-14"}, False],
+    [{"Variable": "$.a", "IsTimestamp": True}, {"a": "yesterday"}, False],
+    [{"Variable": "$.a", "IsTimestamp": True}, {"a": 1458}, False],
+    [{"Variable": "$.a", "StringMatches": "log-*.txt"}, {"a": "log-2020.txt"}, True],
+    [{"Variable": "$.a", "StringMatches": "log-*.txt"}, {"a": "log-2020.txt.gz"}, False],
+    [{"Variable": "$.a", "StringMatches": "*"}, {"a": ""}, True],
+    [{"Variable": "$.a", "StringMatches": r"a\*b"}, {"a": "a*b"}, True],
+    [{"Variable": "$.a", "StringMatches": r"a\*b"}, {"a": "axb"}, False],
+    [{"Variable": "$.a", "StringMatches": r"a\\*"}, {"a": "a\\bc"}, True],
+    [{"Variable": "$.a", "StringMatches": "a.c"}, {"a": "abc"}, False],
+    [{"Variable": "$.a", "BooleanEqualsPath": "$.b"}, {"a": True, "b": True}, True],
+    [{"Variable": "$.a", "NumericEqualsPath": "$.b"}, {"a": 1, "b": 1.0}, True],
+    [{"Variable": "$.a", "NumericGreaterThanPath": "$.b"}, {"a": 2, "b": "1"}, True],
+    [{"Variable": "$.a", "NumericGreaterThanEqualsPath": "$.b"}, {"a": 1, "b": 2}, False],
+    [{"Variable": "$.a", "NumericLessThanPath": "$.b"}, {"a": 1, "b": 2}, True],
+    [{"Variable": "$.a", "NumericLessThanEqualsPath": "$.b"}, {"a": 2, "b": 2}, True],
+    [{"Variable": "$.a", "StringEqualsPath": "$.b"}, {"a": "x", "b": "x"}, True],
+    [{"Variable": "$.a", "StringGreaterThanPath": "$.b"}, {"a": "b", "b": "a"}, True],
+    [{"Variable": "$.a", "StringGreaterThanEqualsPath": "$.b"}, {"a": "a", "b": "b"}, False],
+    [{"Variable": "$.a", "StringLessThanPath": "$.b"}, {"a": "a", "b": "b"}, True],
+    [{"Variable": "$.a", "StringLessThanEqualsPath": "$.b"}, {"a": "b", "b": "b"}, True],
+    [{"Variable": "$.a", "TimestampEqualsPath": "$.b"}, {"a": "2020-01-01T01:00:00+01:00", "b": NEW_YEAR}, True],
+    [{"Variable": "$.a", "TimestampGreaterThanPath": "$.b"}, {"a": "2020-01-02T00:00:00Z", "b": NEW_YEAR}, True],
+    [{"Variable": "$.a", "TimestampGreaterThanEqualsPath": "$.b"}, {"a": "2019-01-01T00:00:00Z", "b": NEW_YEAR}, False],
+    [{"Variable": "$.a", "TimestampLessThanPath": "$.b"}, {"a": "2019-01-01T00:00:00Z", "b": NEW_YEAR}, True],
+    [{"Variable": "$.a", "TimestampLessThanEqualsPath": "$.b"}, {"a": NEW_YEAR, "b": "2020-01-01T00:00:00"}, True],
+    [{"Variable": "$.a", "TimestampGreaterThanEquals": "2020-01-01T00:00:00Z"}, {"a": "2020-01-01T00:00:00Z"}, True],
+    [{"Variable": "$.a", "TimestampLessThanEquals": "2020-01-01T00:00:00Z"}, {"a": "2020-01-01T00:00:01Z"}, False],
+]
+
+
+@pytest.mark.parametrize("source,input,expected", OPERATOR_CASES)
+def test_operator(source, input, expected):
+    op = Operator.parse(source)
+    assert op.compile() == source
+    assert op.matches(input) is expected
+
+
+def test_string_matches_patterns_are_compiled_once():
+    from aws_sfn_builder.choice_rules import compile_glob
+
+    assert Operator.parse({"Variable": "$.a", "StringMatches": "x*"})
+    info = compile_glob.cache_info()
+    Operator.parse({"Variable": "$.b", "StringMatches": "x*"})
+    assert compile_glob.cache_info().hits == info.hits + 1
+
+
+def test_comparison_with_missing_path_raises():
+    from aws_sfn_builder.jsonpath import PathNotFound
+
+    op = Operator.parse({"Variable": "$.a", "NumericEqualsPath": "$.b"})
+    with pytest.raises(PathNotFound):
+        op.matches({"a": 1})
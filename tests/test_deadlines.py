@@ -0,0 +1,251 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from aws_sfn_builder import abandoned_calls, AsyncRunner, Errors, heartbeat, Machine, Runner, Scheduler, StateFailed
+from aws_sfn_builder.scheduler import Execution
+
+
+def machine(task=None, timeout_seconds=None):
+    definition = {
+        "StartAt": "Work",
+        "States": {
+            "Work": {"Type": "Task", "Resource": "Work", "End": True, **(task or {})},
+            "Recover": {"Type": "Pass", "End": True},
+        },
+    }
+    if timeout_seconds is not None:
+        definition["TimeoutSeconds"] = timeout_seconds
+    return Machine.parse(definition)
+
+
+CATCH_TIMEOUTS = {
+    "Catch": [
+        {"ErrorEquals": [Errors.HeartbeatTimeout, Errors.Timeout], "ResultPath": "$.error", "Next": "Recover"},
+    ],
+}
+
+
+@pytest.fixture
+def hang():
+    released = threading.Event()
+    yield lambda payload: released.wait(5)
+    released.set()
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_task_timeout_is_caught(hang, method):
+    runner = Runner()
+    runner.resource_provider("Work")(hang)
+    sm = machine({"TimeoutSeconds": 0.05, **CATCH_TIMEOUTS})
+
+    started = time.monotonic()
+    final_state, output = getattr(runner, method)(sm, {})
+    assert time.monotonic() - started < 1
+    assert final_state.name == "Recover"
+    assert output["error"]["Error"] == Errors.Timeout
+
+
+def test_task_timeout_is_retried():
+    calls = []
+    runner = Runner()
+
+    @runner.resource_provider("Work")
+    def slow_once(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            time.sleep(0.5)
+        return "done"
+
+    retry = {"Retry": [{"ErrorEquals": [Errors.Timeout], "IntervalSeconds": 0}]}
+    assert runner.run(machine({"TimeoutSeconds": 0.05, **retry}), {})[1] == "done"
+    assert len(calls) == 2
+
+
+def test_heartbeats_keep_a_long_task_alive():
+    runner = Runner()
+
+    @runner.resource_provider("Work")
+    def beating(payload):
+        for _ in range(10):
+            time.sleep(0.01)
+            heartbeat()
+        return "done"
+
+    assert runner.run(machine({"HeartbeatSeconds": 0.05, **CATCH_TIMEOUTS}), {})[1] == "done"
+
+
+def test_missing_heartbeat_fails_the_task(hang):
+    runner = Runner()
+    runner.resource_provider("Work")(hang)
+    with pytest.raises(StateFailed) as e:
+        runner.run(machine({"HeartbeatSeconds": 0.05, "TimeoutSeconds": 5}), {})
+    assert e.value.error == Errors.HeartbeatTimeout
+
+
+def test_provider_errors_are_raised_as_usual():
+    runner = Runner()
+
+    @runner.resource_provider("Work")
+    def failing(payload):
+        raise KeyError("nope")
+
+    with pytest.raises(StateFailed) as e:
+        runner.run(machine({"TimeoutSeconds": 5}), {})
+    assert e.value.error == "KeyError"
+
+
+def wait_for_abandoned_calls():
+    deadline = time.monotonic() + 1
+    while abandoned_calls() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert abandoned_calls() == 0
+
+
+def slow(payload):
+    time.sleep(0.01)
+    return threading.get_ident()
+
+
+def test_execution_timeout_stops_a_hung_provider_and_is_not_caught(hang):
+    runner = Runner()
+    runner.resource_provider("Work")(hang)
+    sm = machine(CATCH_TIMEOUTS, timeout_seconds=0.2)
+
+    started = time.monotonic()
+    with pytest.raises(StateFailed) as e:
+        runner.run(sm, {})
+    assert 0.2 <= time.monotonic() - started < 1
+    assert e.value.error == Errors.Timeout and e.value.state is None
+
+
+def test_providers_without_deadlines_are_called_in_the_thread_of_the_execution():
+    runner = Runner()
+    runner.resource_provider("Work")(slow)
+    assert runner.run(machine(), {})[1] == threading.get_ident()
+
+
+def test_threads_of_provider_calls_are_reused():
+    runner = Runner()
+    runner.resource_provider("Work")(slow)
+    sm = machine(timeout_seconds=5)
+    assert runner.run(sm, {})[1] != threading.get_ident()
+    threads = threading.active_count()
+    for _ in range(5):
+        runner.run(sm, {})
+    assert threading.active_count() <= threads
+
+
+def test_execution_timeout_stops_a_hung_provider_of_a_task_with_deadlines():
+    released = threading.Event()
+    runner = Runner()
+
+    @runner.resource_provider("Work")
+    def hang_until_released(payload):
+        released.wait(5)
+
+    sm = machine({"TimeoutSeconds": 5, **CATCH_TIMEOUTS}, timeout_seconds=0.05)
+    # The providers released by earlier tests return
+    wait_for_abandoned_calls()
+    started = time.monotonic()
+    try:
+        with pytest.raises(StateFailed) as e:
+            runner.run(sm, {})
+        assert time.monotonic() - started < 1
+        assert e.value.error == Errors.Timeout and e.value.state is None
+        assert abandoned_calls() == 1
+    finally:
+        released.set()
+    # Counted until the provider returns
+    wait_for_abandoned_calls()
+
+
+def test_execution_timeout_reaches_providers_of_branches(hang):
+    runner = Runner()
+    runner.resource_provider("Work")(hang)
+    sm = Machine.parse({
+        "StartAt": "FanOut",
+        "TimeoutSeconds": 0.05,
+        "States": {
+            "FanOut": {
+                "Type": "Map",
+                "Iterator": {
+                    "StartAt": "Work",
+                    "States": {
+                        "Work": {"Type": "Task", "Resource": "Work", "End": True, **CATCH_TIMEOUTS},
+                        "Recover": {"Type": "Pass", "End": True},
+                    },
+                },
+                "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "Recover"}],
+                "End": True,
+            },
+            "Recover": {"Type": "Pass", "End": True},
+        },
+    })
+    with pytest.raises(StateFailed) as e:
+        runner.run(sm, [1, 2])
+    assert e.value.error == Errors.Timeout and e.value.state is None
+
+
+def test_async_task_timeout_cancels_coroutine_provider():
+    cancelled = []
+    runner = AsyncRunner()
+
+    @runner.resource_provider("Work")
+    async def hang(payload):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(payload)
+            raise
+
+    final_state, output = asyncio.run(runner.run(machine({"TimeoutSeconds": 0.05, **CATCH_TIMEOUTS}), {}))
+    assert output["error"]["Error"] == Errors.Timeout
+    assert cancelled == [{}]
+
+
+def test_async_heartbeats_of_plain_and_coroutine_providers():
+    runner = AsyncRunner()
+
+    @runner.resource_provider("Work")
+    async def beating(payload):
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            heartbeat()
+        return "done"
+
+    @runner.resource_provider("Plain")
+    def plain(payload):
+        for _ in range(10):
+            time.sleep(0.01)
+            heartbeat()
+        return "plain"
+
+    assert asyncio.run(runner.run(machine({"HeartbeatSeconds": 0.05}), {}))[1] == "done"
+    sm = machine({"Resource": "Plain", "HeartbeatSeconds": 0.05})
+    assert asyncio.run(runner.run(sm, {}))[1] == "plain"
+
+
+def test_async_execution_timeout(hang):
+    runner = AsyncRunner()
+    runner.resource_provider("Work")(hang)
+    with pytest.raises(StateFailed) as e:
+        asyncio.run(runner.run(machine(CATCH_TIMEOUTS, timeout_seconds=0.05), {}))
+    assert e.value.error == Errors.Timeout and e.value.state is None
+
+
+def test_scheduler_times_out_executions_with_hung_providers(hang):
+    runner = Runner()
+    runner.resource_provider("Work")(hang)
+    scheduler = Scheduler(runner)
+    execution = scheduler.start(machine(CATCH_TIMEOUTS, timeout_seconds=0.05), {})
+    started = time.monotonic()
+    scheduler.run()
+    assert time.monotonic() - started < 1
+    assert execution.status == Execution.TIMED_OUT
+
+
+def test_heartbeat_outside_of_tasks_does_nothing():
+    heartbeat()
@@ -0,0 +1,197 @@
+import asyncio
+import json
+
+import pytest
+
+from aws_sfn_builder import AsyncRunner, DistributedMap, lazy_json, Machine, Map, Runner, State
+from aws_sfn_builder.items import batch_items, read_items
+
+
+def distributed_map_definition(item_reader=None, item_batcher=None, result_writer=None, resource="Double"):
+    state = {
+        "Type": "Map",
+        "ItemProcessor": {
+            "ProcessorConfig": {"Mode": "DISTRIBUTED", "ExecutionType": "EXPRESS"},
+            "StartAt": "Process",
+            "States": {
+                "Process": {"Type": "Task", "Resource": resource, "End": True},
+            },
+        },
+        "MaxConcurrency": 4,
+        "Label": "Numbers",
+        "End": True,
+    }
+    if item_reader:
+        state["ItemReader"] = item_reader
+    if item_batcher:
+        state["ItemBatcher"] = item_batcher
+    if result_writer:
+        state["ResultWriter"] = result_writer
+    return {"StartAt": "ForEachNumber", "States": {"ForEachNumber": state}}
+
+
+def jsonl_reader(bucket, key="numbers.jsonl"):
+    return {
+        "Resource": "arn:aws:states:::s3:getObject",
+        "ReaderConfig": {"InputType": "JSONL"},
+        "Parameters": {"Bucket": str(bucket), "Key.$": "$.key"} if key is None else {"Bucket": str(bucket), "Key": key},
+    }
+
+
+@pytest.fixture
+def numbers_file(tmp_path):
+    with open(tmp_path / "numbers.jsonl", "w") as f:
+        for i in range(100):
+            f.write(json.dumps({"n": i}) + "\n")
+    return tmp_path
+
+
+def double(payload):
+    return payload["n"] * 2
+
+
+def test_distributed_map_is_parsed_and_compiles_back(tmp_path):
+    definition = distributed_map_definition(
+        item_reader=jsonl_reader(tmp_path),
+        item_batcher={"MaxItemsPerBatch": 10, "BatchInput": {"factor.$": "$.factor"}},
+        result_writer={
+            "Resource": "arn:aws:states:::s3:putObject",
+            "Parameters": {"Bucket": str(tmp_path), "Prefix": "results"},
+        },
+    )
+    sm = Machine.parse(definition)
+    state = sm.states["ForEachNumber"]
+    assert isinstance(state, DistributedMap)
+    assert state.type == "Map"
+    assert json.dumps(sm.compile(), sort_keys=True) == json.dumps(definition, sort_keys=True)
+
+    inline = State.parse({**definition["States"]["ForEachNumber"], "ItemProcessor": {
+        "ProcessorConfig": {"Mode": "INLINE"}, "StartAt": "A", "States": {"A": {"Type": "Pass", "End": True}},
+    }})
+    assert type(inline) is Map
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_distributed_map_streams_items_from_a_file(numbers_file, method):
+    sm = Machine.parse(distributed_map_definition(item_reader=jsonl_reader(numbers_file, key=None)))
+
+    with Runner() as runner:
+        runner.resources.register("Double", double)
+        final_state, output = getattr(runner, method)(sm, {"key": "numbers.jsonl"})
+
+    assert output == [i * 2 for i in range(100)]
+
+
+def test_distributed_map_writes_results(numbers_file):
+    sm = Machine.parse(distributed_map_definition(
+        item_reader=jsonl_reader(numbers_file),
+        item_batcher={"MaxItemsPerBatch": 30, "BatchInput": {"factor.$": "$.factor"}},
+        result_writer={"Parameters": {"Bucket": str(numbers_file), "Prefix": "out/run-1"}},
+        resource="SumBatch",
+    ))
+
+    with Runner() as runner:
+        @runner.resource_provider("SumBatch")
+        def sum_batch(batch):
+            total = sum(item["n"] for item in batch["Items"])
+            return {"count": len(batch["Items"]), "sum": total * batch["BatchInput"]["factor"]}
+
+        final_state, output = runner.run(sm, {"factor": 2})
+
+    assert output == {"ResultWriterDetails": {"Bucket": str(numbers_file), "Key": "out/run-1/manifest.json"}}
+
+    manifest = json.loads((numbers_file / "out/run-1/manifest.json").read_text())
+    [result_file] = manifest["ResultFiles"]["SUCCEEDED"]
+    assert result_file["Key"] == "out/run-1/SUCCEEDED_0.json"
+
+    results = json.loads((numbers_file / result_file["Key"]).read_text())
+    assert [json.loads(result["Output"]) for result in results] == [
+        {"count": 30, "sum": 870},
+        {"count": 30, "sum": 2670},
+        {"count": 30, "sum": 4470},
+        {"count": 10, "sum": 1890},
+    ]
+    assert all(result["Status"] == "SUCCEEDED" for result in results)
+
+
+def test_distributed_map_writes_results_of_a_lazy_input(tmp_path):
+    definition = distributed_map_definition(result_writer={"Parameters": {"Bucket": str(tmp_path), "Prefix": "out"}})
+    definition["States"]["ForEachNumber"]["ItemProcessor"]["States"]["Process"] = {"Type": "Pass", "End": True}
+    sm = Machine.parse(definition)
+    items = [{"n": i, "tags": ["a", {"b": None}]} for i in range(5)]
+    (tmp_path / "input.json").write_text(json.dumps(items))
+
+    with Runner() as runner:
+        runner.run(sm, lazy_json.load(str(tmp_path / "input.json")))
+
+    results = json.loads((tmp_path / "out/SUCCEEDED_0.json").read_text())
+    assert [json.loads(result["Output"]) for result in results] == items
+
+
+def test_read_items_from_csv(tmp_path):
+    (tmp_path / "with_header.csv").write_text("id,name\n1,ada\n2,alan\n")
+    (tmp_path / "no_header.csv").write_text("1,ada\n2,alan\n")
+
+    assert list(read_items({"InputType": "CSV"}, {"Bucket": str(tmp_path), "Key": "with_header.csv"})) == [
+        {"id": "1", "name": "ada"},
+        {"id": "2", "name": "alan"},
+    ]
+    assert list(read_items(
+        {"InputType": "CSV", "CSVHeaderLocation": "GIVEN", "CSVHeaders": ["id", "name"], "MaxItems": 1},
+        {"Bucket": str(tmp_path), "Key": "no_header.csv"},
+    )) == [{"id": "1", "name": "ada"}]
+
+
+def test_batch_items():
+    items = [{"n": i} for i in range(5)]
+
+    assert [batch["Items"] for batch in batch_items(items, {"MaxItemsPerBatch": 2})] == [
+        items[0:2], items[2:4], items[4:],
+    ]
+
+    # Each {"n":i} is 7 bytes of JSON plus a separator
+    assert [batch["Items"] for batch in batch_items(items, {"MaxInputBytesPerBatch": 20})] == [
+        items[0:2], items[2:4], items[4:],
+    ]
+    assert list(batch_items(items[:1], {"MaxItemsPerBatch": 2}, {"x": 1})) == [
+        {"Items": items[:1], "BatchInput": {"x": 1}},
+    ]
+
+    with pytest.raises(ValueError):
+        list(batch_items(items, {}))
+
+
+def test_stream_sequence_takes_inputs_as_runs_finish():
+    sm = Machine.parse([{"Type": "Pass"}])
+    taken = []
+
+    def inputs():
+        for i in range(1000):
+            taken.append(i)
+            yield i
+
+    with Runner() as runner:
+        outputs = runner.stream_sequence(sm, inputs(), max_concurrency=5)
+        assert next(outputs) == 0
+        assert len(taken) <= 6
+        assert list(outputs) == list(range(1, 1000))
+
+
+def test_async_runner_runs_distributed_map(numbers_file):
+    sm = Machine.parse(distributed_map_definition(
+        item_reader=jsonl_reader(numbers_file),
+        result_writer={"Parameters": {"Bucket": str(numbers_file), "Prefix": "async"}},
+    ))
+    runner = AsyncRunner()
+
+    @runner.resource_provider("Double")
+    async def async_double(payload):
+        await asyncio.sleep(0)
+        return payload["n"] * 2
+
+    final_state, output = asyncio.run(runner.run(sm))
+    runner.close()
+
+    assert output["ResultWriterDetails"]["Key"] == "async/manifest.json"
+    results = json.loads((numbers_file / "async/SUCCEEDED_0.json").read_text())
+    assert [json.loads(result["Output"]) for result in results] == [i * 2 for i in range(100)]
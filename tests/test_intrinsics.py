@@ -0,0 +1,179 @@
+import hashlib
+import json
+import uuid
+
+import pytest
+
+from aws_sfn_builder import Errors, Machine, Runner, State, StatesError
+from aws_sfn_builder.intrinsics import compile_intrinsic
+from aws_sfn_builder.templates import compile_template
+
+INPUT = {
+    "name": "World",
+    "items": [1, 2, 3, 4, 5],
+    "doc": {"a": 1, "b": [1, 2]},
+    "text": '{"x": [1, 2]}',
+    "n": 3,
+}
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("States.Format('Hello, {}!', $.name)", "Hello, World!"),
+    ("States.Format('{} + {} = {}', 1, $.n, 4)", "1 + 3 = 4"),
+    (r"States.Format('\{\} \'{}\' \\', $.name)", "{} 'World' \\"),
+    ("States.Format('{}', $.doc)", '{"a":1,"b":[1,2]}'),
+    ("States.StringToJson($.text)", {"x": [1, 2]}),
+    ("States.JsonToString($.doc)", '{"a":1,"b":[1,2]}'),
+    ("States.Array(1, 'two', $.n, null, true, States.Array())", [1, "two", 3, None, True, []]),
+    ("States.ArrayPartition($.items, 2)", [[1, 2], [3, 4], [5]]),
+    ("States.ArrayContains($.items, 3)", True),
+    ("States.ArrayContains($.items, 'x')", False),
+    ("States.ArrayRange(1, 9, 2)", [1, 3, 5, 7, 9]),
+    ("States.ArrayRange(3, 1, -1)", [3, 2, 1]),
+    ("States.ArrayGetItem($.items, 1)", 2),
+    ("States.ArrayLength($.items)", 5),
+    ("States.ArrayUnique(States.Array(1, 2, 1, $.doc, $.doc))", [1, 2, {"a": 1, "b": [1, 2]}]),
+    ("States.Base64Encode('Data to encode')", "RGF0YSB0byBlbmNvZGU="),
+    ("States.Base64Decode('RGF0YSB0byBlbmNvZGU=')", "Data to encode"),
+    ("States.Hash($.name, 'SHA-256')", hashlib.sha256(b"World").hexdigest()),
+    ("States.JsonMerge($.doc, States.StringToJson('{\"b\": 2}'), false)", {"a": 1, "b": 2}),
+    ("States.MathAdd($.n, -1)", 2),
+    ("States.MathAdd(1.0, 2)", 3),
+    ("States.StringSplit('This.is+a,test=string', '.+,=')", ["This", "is", "a", "test", "string"]),
+    ("States.StringSplit('1, 2,,3', ', ')", ["1", "2", "3"]),
+    ("States.ArrayLength(States.ArrayPartition(States.ArrayRange(1, 10, 1), 3))", 4),
+    ("  States.MathAdd( 1 ,2 )  ", 3),
+])
+def test_intrinsic(expression, expected):
+    assert compile_intrinsic(expression)(INPUT, None) == expected
+
+
+def test_context_paths_are_resolved_against_the_context():
+    get = compile_intrinsic("States.Format('{}-{}', $$.Map.Item.Index, $.name)")
+    assert get(INPUT, {"Map": {"Item": {"Index": 2}}}) == "2-World"
+
+
+def test_calls_of_constants_are_evaluated_at_compile_time():
+    get = compile_intrinsic("States.Format('{}:{}', States.MathAdd(1, 2), States.Hash('x', 'MD5'))")
+    # Any input: the value does not depend on it.
+    assert get(None, None) == "3:" + hashlib.md5(b"x").hexdigest()
+
+
+def test_arrays_are_new_on_every_call():
+    get = compile_intrinsic("States.Array(1, 2)")
+    first = get(INPUT, None)
+    first.append(3)
+    assert get(INPUT, None) == [1, 2]
+
+
+def test_uuid_and_random_are_not_folded():
+    get = compile_intrinsic("States.UUID()")
+    first, second = get(INPUT, None), get(INPUT, None)
+    assert first != second
+    assert uuid.UUID(first).version == 4
+
+    get = compile_intrinsic("States.MathRandom(1, 1000, 7)")
+    assert 1 <= get(INPUT, None) < 1000
+    assert get(INPUT, None) == get(INPUT, None)
+
+
+@pytest.mark.parametrize("expression", [
+    "States.Nope(1)",
+    "States.MathAdd(1)",
+    "States.UUID(1)",
+    "States.Format()",
+    "States.Format('{}')",
+    "States.Format('{', 1)",
+    "States.MathAdd(1, 2",
+    "States.MathAdd(1, 2) x",
+    "States.Array('unterminated)",
+    "States.Array(nope)",
+    "$.name",
+])
+def test_invalid_expressions_are_reported_at_compile_time(expression):
+    with pytest.raises(ValueError):
+        compile_intrinsic(expression)
+
+
+@pytest.mark.parametrize("expression", [
+    "States.StringToJson('{')",
+    "States.ArrayPartition($.items, 0)",
+    "States.ArrayGetItem($.items, 5)",
+    "States.ArrayRange(0, 2000, 1)",
+    "States.MathAdd($.name, 1)",
+    "States.MathAdd(1.5, 1)",
+    "States.Hash($.name, 'SHA-0')",
+    "States.JsonMerge($.doc, $.doc, true)",
+    "States.Format($.name, 1)",
+])
+def test_failures_raise_intrinsic_failure(expression):
+    get = compile_intrinsic(expression)
+    with pytest.raises(StatesError) as e:
+        get(INPUT, None)
+    assert e.value.error == Errors.IntrinsicFailure
+
+
+def test_path_that_matches_nothing_raises_runtime_error():
+    get = compile_intrinsic("States.ArrayLength($.nope)")
+    with pytest.raises(StatesError) as e:
+        get(INPUT, None)
+    assert e.value.error == Errors.Runtime
+
+
+def test_templates_evaluate_intrinsics_of_path_fields_only():
+    build = compile_template({
+        "greeting.$": "States.Format('Hello, {}!', $.name)",
+        "batches.$": "States.ArrayPartition($.items, 4)",
+        "literal": "States.Format('{}', $.name)",
+        "nested": {"payload.$": "States.JsonToString($.doc)"},
+    })
+    assert build(INPUT) == {
+        "greeting": "Hello, World!",
+        "batches": [[1, 2, 3, 4], [5]],
+        "literal": "States.Format('{}', $.name)",
+        "nested": {"payload": json.dumps(INPUT["doc"], separators=(",", ":"))},
+    }
+
+
+def test_invalid_intrinsic_in_parameters_is_reported_at_parse_time():
+    with pytest.raises(ValueError):
+        State.parse({"Type": "Pass", "Parameters": {"x.$": "States.MathAdd(1"}, "End": True})
+
+
+def test_parameters_and_result_selector_of_states():
+    machine = Machine.parse({
+        "StartAt": "Split",
+        "States": {
+            "Split": {
+                "Type": "Task",
+                "Resource": "Echo",
+                "Parameters": {"batches.$": "States.ArrayPartition($.items, 2)"},
+                "ResultSelector": {"count.$": "States.ArrayLength($.batches)"},
+                "End": True,
+            },
+        },
+    })
+    runner = Runner()
+    runner.resource_provider("Echo")(lambda payload: payload)
+    assert runner.run(machine, INPUT)[1] == {"count": 3}
+
+
+def test_intrinsic_failure_is_caught():
+    machine = Machine.parse({
+        "StartAt": "Parse",
+        "States": {
+            "Parse": {
+                "Type": "Task",
+                "Resource": "Echo",
+                "Parameters": {"doc.$": "States.StringToJson($.name)"},
+                "Catch": [{"ErrorEquals": ["States.IntrinsicFailure"], "ResultPath": "$.error", "Next": "Recover"}],
+                "End": True,
+            },
+            "Recover": {"Type": "Pass", "End": True},
+        },
+    })
+    runner = Runner()
+    runner.resource_provider("Echo")(lambda payload: payload)
+    final_state, output = runner.run(machine, {"name": "World"})
+    assert final_state.name == "Recover"
+    assert output["error"]["Error"] == Errors.IntrinsicFailure
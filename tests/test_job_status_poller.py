@@ -23,7 +23,7 @@ def test_runs_job_status_poller(example):
         else:
             return "SUCCEEDED"
 
-    final_state, output = runner.run(sm, {'input': 25})
+    final_state, output = runner.run(sm, {'input': 25, 'wait_time': 0})
     assert final_state.name in "Job Failed"
-    final_state, output = runner.run(sm, {'input': 40})
+    final_state, output = runner.run(sm, {'input': 40, 'wait_time': 0})
     assert final_state.name in "Consolidator Output"
@@ -0,0 +1,130 @@
+import copy
+
+import pytest
+
+from aws_sfn_builder import State
+from aws_sfn_builder.choice_rules import Operator
+from aws_sfn_builder.jsonpath import compile_path, JsonPathNgPath, Path, PathNotFound
+
+
+def test_compiled_paths_are_cached():
+    assert compile_path("$.a.b") is compile_path("$.a.b")
+
+
+@pytest.mark.parametrize("field", ["InputPath", "OutputPath", "ResultPath"])
+def test_invalid_state_path_is_reported_at_parse_time(field):
+    with pytest.raises(ValueError) as exc_info:
+        State.parse({field: "$.a[?"})
+    assert "$.a[?" in str(exc_info.value)
+
+
+def test_invalid_parameters_path_is_reported_at_parse_time():
+    with pytest.raises(ValueError):
+        State.parse({"Parameters": {"x.$": "$.a[?"}})
+
+    # Not a path because the key does not end with .$
+    State.parse({"Parameters": {"x": "$.a[?"}})
+
+
+def test_invalid_choice_variable_is_reported_at_parse_time():
+    with pytest.raises(ValueError):
+        Operator.parse({"Variable": "$.a[?", "NumericEquals": 0})
+
+
+DOC = {
+    "a": {"b": 1, "c-d": [10, 20]},
+    "items": [{"x": 1, "y": [1, 2]}, {"x": 2, "y": [3]}, {"z": 3}],
+    "s": "string",
+}
+
+
+@pytest.mark.parametrize("path", [
+    "$",
+    "$.a",
+    "$.a.b",
+    "$.a.missing",
+    "$.a.c-d[1]",
+    "$.a.c-d[5]",
+    "$['a']['b']",
+    "$.items[0].x",
+    "$.items[*].x",
+    "$.items[*].y[*]",
+    "$.items[*]",
+    "$.s.x",
+])
+def test_subset_paths_are_evaluated_like_jsonpath_ng(path):
+    from jsonpath_ng import parse
+
+    compiled = compile_path(path)
+    assert isinstance(compiled, Path)
+    assert compiled.find(DOC) == [m.value for m in parse(path).find(DOC)]
+
+
+@pytest.mark.parametrize("path", [
+    "$.items[?(@.x)]",
+    "$..x",
+    "$.items[0:2]",
+])
+def test_paths_outside_of_subset_fall_back_to_jsonpath_ng(path):
+    from jsonpath_ng.ext import parse
+
+    compiled = compile_path(path)
+    assert isinstance(compiled, JsonPathNgPath)
+    assert compiled.find(DOC) == [m.value for m in parse(path).find(DOC)]
+
+
+def test_find_indexed_returns_array_indexes_of_matches():
+    assert compile_path("$.items[*].y[*]").find_indexed(DOC) == [
+        ((0, 0), 1),
+        ((0, 1), 2),
+        ((1, 0), 3),
+    ]
+
+
+def test_get_raises_path_not_found():
+    with pytest.raises(PathNotFound):
+        compile_path("$.a.missing").get(DOC)
+
+
+@pytest.mark.parametrize("path,expected", [
+    ["$", "new"],
+    ["$.a.b", {"a": {"b": "new"}}],
+    ["$.a.c.d", {"a": {"b": 1, "c": {"d": "new"}}}],
+    ["$.n[1]", {"a": {"b": 1}, "n": [0, "new"]}],
+])
+def test_set_modifies_document(path, expected):
+    doc = {"a": {"b": 1}}
+    if "n" in path:
+        doc["n"] = [0, 1]
+    assert compile_path(path).set(doc, "new") == expected
+
+
+@pytest.mark.parametrize("path", [
+    "$", "$.a.b", "$.a.c.d", "$.n[1]", "$.n[*]", "$.a['b']", "$.a[?(@ > 0)]",
+    "$.n[5]", "$.a.b.c", "$.n.x", "$.s[0]",
+])
+def test_assign_is_set_on_a_copy(path):
+    doc = {"a": {"b": 1}, "n": [0, 1], "s": "text", "other": {"shared": [1, 2]}}
+    original = copy.deepcopy(doc)
+    try:
+        expected = compile_path(path).set(copy.deepcopy(doc), "new")
+    except PathNotFound:
+        with pytest.raises(PathNotFound):
+            compile_path(path).assign(doc, "new")
+    else:
+        assert compile_path(path).assign(doc, "new") == expected
+    assert doc == original
+
+
+def test_assign_shares_everything_off_the_path():
+    doc = {"a": {"b": {"c": 1}, "x": {"y": 2}}, "z": [1, 2]}
+    result = compile_path("$.a.b.c").assign(doc, 3)
+    assert result == {"a": {"b": {"c": 3}, "x": {"y": 2}}, "z": [1, 2]}
+    assert result is not doc and result["a"] is not doc["a"] and result["a"]["b"] is not doc["a"]["b"]
+    assert result["a"]["x"] is doc["a"]["x"]
+    assert result["z"] is doc["z"]
+
+
+def test_strings_are_not_arrays():
+    # Unlike jsonpath_ng which would return the first character
+    assert compile_path("$.s[0]").find(DOC) == []
@@ -0,0 +1,176 @@
+import copy
+import json
+import pickle
+
+import pytest
+
+from aws_sfn_builder import lazy_json, Machine, Runner
+from aws_sfn_builder.lazy_json import LazyArray, LazyObject, materialize
+
+DOC = {
+    "config": {"mode": "fast", "ratio": 2.5, "escaped": "a\"b\\c é ]} {[", "enabled": True, "none": None},
+    "records": [{"id": i, "tags": ["x", {"y": "]"}], "size": i * 10} for i in range(20)],
+    "empty": {},
+    "nothing": [],
+}
+
+MACHINE = {
+    "StartAt": "Configure",
+    "States": {
+        "Configure": {
+            "Type": "Pass",
+            "InputPath": "$.config",
+            "Parameters": {"mode.$": "$.mode", "label.$": "States.Format('{}-{}', $.mode, $.ratio)"},
+            "ResultPath": "$.settings",
+            "Next": "Route",
+        },
+        "Route": {
+            "Type": "Choice",
+            "Choices": [{"Variable": "$.settings.mode", "StringEquals": "fast", "Next": "Sizes"}],
+            "Default": "Done",
+        },
+        "Sizes": {
+            "Type": "Map",
+            "ItemsPath": "$.records",
+            "Iterator": {
+                "StartAt": "Size",
+                "States": {"Size": {"Type": "Task", "Resource": "Size", "End": True}},
+            },
+            "ResultPath": "$.sizes",
+            "Next": "Summarize",
+        },
+        "Summarize": {
+            "Type": "Pass",
+            "Parameters": {
+                "settings.$": "$.settings",
+                "sizes.$": "$.sizes",
+                "ids.$": "$.records[*].id",
+                "count.$": "States.ArrayLength($.records)",
+                "config.$": "$.config",
+            },
+            "OutputPath": "$",
+            "Next": "Done",
+        },
+        "Done": {"Type": "Succeed"},
+    },
+}
+
+
+@pytest.fixture
+def lazy_doc(tmp_path):
+    path = tmp_path / "input.json"
+    path.write_text(json.dumps(DOC, indent=2))
+    return lazy_json.load(str(path))
+
+
+def test_lazy_document_reads_like_the_parsed_one(lazy_doc):
+    assert isinstance(lazy_doc, LazyObject)
+    assert isinstance(lazy_doc["records"], LazyArray)
+    assert lazy_doc["config"]["escaped"] == DOC["config"]["escaped"]
+    assert lazy_doc["records"][-1]["tags"][1] == {"y": "]"}
+    assert lazy_doc["records"][2:4] == DOC["records"][2:4]
+    assert list(lazy_doc) == list(DOC)
+    assert len(lazy_doc["records"]) == 20
+    assert "missing" not in lazy_doc["empty"]
+    assert lazy_doc == DOC
+    assert materialize(lazy_doc) == DOC and type(materialize(lazy_doc)) is dict
+
+
+def test_only_accessed_members_are_located_and_parsed(lazy_doc):
+    assert lazy_doc["config"]["mode"] == "fast"
+    assert lazy_doc._members.keys() == {"config"}
+    assert lazy_doc["config"]._members.keys() == {"mode"}
+    assert lazy_doc["records"][1]["id"] == 1
+    assert len(lazy_doc["records"]._starts) == 2
+    assert lazy_doc["records"]._values.keys() == {1}
+
+
+def plain(value):
+    if isinstance(value, LazyObject):
+        return {key: plain(value[key]) for key in value}
+    if isinstance(value, LazyArray):
+        return [plain(item) for item in value]
+    return value
+
+
+def test_long_values_are_skipped_a_window_at_a_time(monkeypatch):
+    monkeypatch.setattr(lazy_json, "SCAN_BYTES", 8)
+    monkeypatch.setattr(lazy_json, "WINDOW_BYTES", 64)
+    deep = {"a": [{"b": [[{"c": "[{\\\"}]"}]], "d": 1.5e3}]}
+    text = "a \"quoted\", [bracketed] \\"
+    doc = {
+        "records": [dict(DOC["records"][i % 20], deep=deep, text=text * (i % 3)) for i in range(50)],
+        "last": {"deep": deep, "n": -1},
+    }
+    for indent in (None, 1):
+        lazy = lazy_json.loads(json.dumps(doc, indent=indent).encode())
+        assert lazy["last"]["n"] == -1
+        assert plain(lazy) == doc
+
+
+def test_lazy_values_are_copied_and_pickled_as_plain_ones(lazy_doc):
+    for value in (copy.deepcopy(lazy_doc), pickle.loads(pickle.dumps(lazy_doc))):
+        assert type(value) is dict and value == DOC
+
+
+@pytest.mark.parametrize("data", [b"", b"{", b'{"a" 1}', b'{"a": 1,}', b"[1 2]", b'{"a": [1, 2}', b"[1] x"])
+def test_invalid_documents_raise_value_error(data):
+    with pytest.raises(ValueError):
+        materialize(lazy_json.loads(data))
+
+
+@pytest.mark.parametrize("data", [b"1", b' "text" ', b"null", b"[]", b"{}"])
+def test_scalar_and_empty_documents(data):
+    assert materialize(lazy_json.loads(data)) == json.loads(data)
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_runner_runs_on_a_lazy_document(lazy_doc, method):
+    sm = Machine.parse(MACHINE)
+    with Runner() as runner:
+        runner.resource_provider("Size")(lambda record: record["size"])
+        expected = getattr(runner, method)(sm, copy.deepcopy(DOC))[1]
+        output = getattr(runner, method)(sm, lazy_doc)[1]
+
+    assert materialize(output) == expected
+    assert expected["sizes"] == [record["size"] for record in DOC["records"]]
+    # ResultPath copied the root object, the members it did not touch are still lazy.
+    assert isinstance(output["config"], LazyObject)
+    assert lazy_doc == DOC
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_branch_providers_are_given_lazy_inputs_unmaterialized(lazy_doc, method):
+    sm = Machine.parse({
+        "StartAt": "Branches",
+        "States": {
+            "Branches": {
+                "Type": "Parallel",
+                "Branches": [
+                    {"StartAt": "Whole", "States": {"Whole": {"Type": "Task", "Resource": "Input", "End": True}}},
+                    {
+                        "StartAt": "Part",
+                        "States": {
+                            "Part": {
+                                "Type": "Task",
+                                "Resource": "Input",
+                                "Parameters": {"records.$": "$.records", "mode.$": "$.config.mode"},
+                                "End": True,
+                            },
+                        },
+                    },
+                ],
+                "End": True,
+            },
+        },
+    })
+    inputs = []
+    with Runner() as runner:
+        runner.resource_provider("Input")(lambda input: inputs.append(input))
+        getattr(runner, method)(sm, lazy_doc)
+
+    part, whole = sorted(inputs, key=lambda input: isinstance(input, LazyObject))
+    assert whole is lazy_doc
+    assert type(part) is dict and isinstance(part["records"], LazyArray)
+    assert lazy_doc._members.keys() == {"config", "records"}
+    assert len(lazy_doc["records"]._starts) == 0
@@ -0,0 +1,153 @@
+import asyncio
+import pickle
+import threading
+import time
+
+import pytest
+
+from aws_sfn_builder import AsyncRunner, Limit, Machine, ResourceManager, Runner
+
+ARN = "arn:aws:lambda:us-east-1:1:function:Slow"
+
+FAN_OUT = Machine.parse({
+    "StartAt": "FanOut",
+    "States": {
+        "FanOut": {
+            "Type": "Map",
+            "Iterator": {
+                "StartAt": "Call",
+                "States": {"Call": {"Type": "Task", "Resource": ARN, "End": True}},
+            },
+            "End": True,
+        },
+    },
+})
+
+
+class Gauge:
+    def __init__(self):
+        self.current = self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.current -= 1
+
+
+def test_concurrency_is_limited():
+    gauge = Gauge()
+    resources = ResourceManager()
+
+    @resources.provider(ARN)
+    def slow(payload):
+        with gauge:
+            time.sleep(0.01)
+            return payload
+
+    limit = resources.limit(ARN, max_concurrency=3)
+    with Runner(resources=resources, max_workers=16) as runner:
+        assert runner.run(FAN_OUT, list(range(20)))[1] == list(range(20))
+
+    assert gauge.peak == 3
+    info = limit.info()
+    assert info.calls == 20 and info.throttled > 0 and info.max_wait > 0
+    assert info.in_flight == 0 and info.queued == 0
+
+
+def test_rate_is_limited_with_a_token_bucket():
+    limit = Limit(rate=100, burst=5)
+    provider = limit.wrap(lambda payload: time.monotonic())
+    started = time.monotonic()
+    times = [provider(i) for i in range(15)]
+    # The burst goes at once, the rest at 100 per second
+    assert times[4] - started < 0.05
+    assert times[-1] - started >= 0.09
+    assert limit.info().throttled == 10
+
+
+def test_waiting_calls_go_in_order():
+    limit = Limit(max_concurrency=1)
+    order = []
+    release = threading.Event()
+    provider = limit.wrap(lambda payload: release.wait() and order.append(payload))
+
+    threads = []
+    for i in range(5):
+        threads.append(threading.Thread(target=provider, args=(i,)))
+        threads[-1].start()
+        while limit.info().queued + limit.info().in_flight < i + 1:
+            time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_patterns_share_one_limit():
+    resources = ResourceManager(providers={"arn:a:function:One": "json.dumps", "arn:a:function:Two": "json.dumps"})
+    shared = resources.limit("arn:a:function:*", max_concurrency=2)
+    own = resources.limit("arn:a:function:One", rate=1000)
+    assert resources.limits_of("arn:a:function:One") == [shared, own]
+    assert resources.limits_of("arn:a:function:Two") == [shared]
+    assert resources.limits_of("arn:b:function:One") == []
+    assert resources("arn:a:function:One")([1]) == "[1]"
+    assert resources("arn:a:function:Two")([2]) == "[2]"
+    assert shared.info().calls == 2 and own.info().calls == 1
+
+
+def test_coroutine_providers_wait_on_the_loop():
+    gauge = Gauge()
+    runner = AsyncRunner()
+
+    @runner.resource_provider(ARN)
+    async def slow(payload):
+        with gauge:
+            await asyncio.sleep(0.005)
+            return payload
+
+    limit = runner.resources.limit("arn:aws:lambda:us-east-1:*", max_concurrency=4, rate=1000, burst=4)
+
+    async def main():
+        return await asyncio.gather(*(runner.run(FAN_OUT, [i, i]) for i in range(10)))
+
+    assert [output for _, output in asyncio.run(main())] == [[i, i] for i in range(10)]
+    assert gauge.peak == 4
+    assert limit.info().calls == 20 and limit.info().queued == 0
+
+
+def test_cancelled_calls_leave_the_queue():
+    limit = Limit(max_concurrency=1)
+    provider = limit.wrap(asyncio.sleep)
+
+    async def main():
+        first = asyncio.ensure_future(provider(0.05))
+        second = asyncio.ensure_future(provider(0))
+        await asyncio.sleep(0.01)
+        assert limit.info().queued == 1
+        second.cancel()
+        await first
+        assert limit.info().queued == 0
+        await provider(0)
+
+    asyncio.run(main())
+    assert limit.info().in_flight == 0
+
+
+def test_limits_are_pickled_with_their_settings():
+    resources = ResourceManager(providers={"arn:a": "json.dumps"})
+    resources.limit("arn:*", max_concurrency=2, rate=5, burst=2)
+    copy = pickle.loads(pickle.dumps(resources))
+    (limit,) = copy.limits_of("arn:a")
+    assert (limit.max_concurrency, limit.rate, limit.burst) == (2, 5, 2)
+    assert copy("arn:a").limit is limit
+
+
+@pytest.mark.parametrize("options", [{"max_concurrency": 0}, {"rate": 0}, {"burst": 0}])
+def test_invalid_limits(options):
+    with pytest.raises(ValueError):
+        Limit(**options)
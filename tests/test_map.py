@@ -0,0 +1,155 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from aws_sfn_builder import AsyncRunner, Machine, Map, Runner, State, States
+
+
+def map_definition(max_concurrency=0, **processor):
+    return {
+        "StartAt": "ForEachOrder",
+        "States": {
+            "ForEachOrder": {
+                "Type": "Map",
+                "InputPath": "$.detail",
+                "ItemsPath": "$.orders",
+                "ItemSelector": {
+                    "index.$": "$$.Map.Item.Index",
+                    "order.$": "$$.Map.Item.Value",
+                    "customer.$": "$.customer",
+                },
+                "MaxConcurrency": max_concurrency,
+                "ItemProcessor": {
+                    **processor,
+                    "StartAt": "Price",
+                    "States": {
+                        "Price": {"Type": "Task", "Resource": "Price", "End": True},
+                    },
+                },
+                "ResultPath": "$.prices",
+                "End": True,
+            },
+        },
+    }
+
+
+def test_map_compiles_back_to_the_same_definition():
+    for definition in [
+        map_definition(),
+        map_definition(ProcessorConfig={"Mode": "INLINE"}),
+        {
+            "StartAt": "Legacy",
+            "States": {
+                "Legacy": {
+                    "Type": "Map",
+                    "ItemsPath": "$.items",
+                    "Parameters": {"value.$": "$$.Map.Item.Value"},
+                    "Iterator": {
+                        "StartAt": "Echo",
+                        "States": {"Echo": {"Type": "Pass", "End": True}},
+                    },
+                    "MaxConcurrency": 2,
+                    "ResultSelector": {"first.$": "$[0]"},
+                    "Next": "Done",
+                },
+                "Done": {"Type": "Succeed"},
+            },
+        },
+    ]:
+        sm = Machine.parse(definition)
+        assert json.dumps(sm.compile(), sort_keys=True) == json.dumps(definition, sort_keys=True)
+
+
+def test_map_is_parsed():
+    sm = Machine.parse(map_definition(max_concurrency=3, ProcessorConfig={"Mode": "INLINE"}))
+    state = sm.states["ForEachOrder"]
+    assert isinstance(state, Map)
+    assert state.type == States.Map
+    assert state.max_concurrency == 3
+    assert state.processor is state.item_processor
+    assert state.processor.start_at == "Price"
+    assert state.processor_config == {"Mode": "INLINE"}
+
+
+def test_map_items_path_must_select_an_array():
+    state = State.parse({
+        "Type": "Map",
+        "ItemsPath": "$.items",
+        "Iterator": {"StartAt": "Echo", "States": {"Echo": {"Type": "Pass", "End": True}}},
+    })
+    with pytest.raises(ValueError):
+        state.get_item_inputs({"items": {"a": 1}})
+
+
+def price(payload):
+    return payload["order"]["quantity"] * 10 + payload["index"]
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_map_outputs_are_in_the_order_of_the_items(method, executor):
+    sm = Machine.parse(map_definition(max_concurrency=2))
+    orders = [{"quantity": q} for q in (3, 1, 4, 1, 5)]
+
+    with Runner(executor=executor, max_workers=2) as runner:
+        runner.resources.register("Price", "tests.test_map:price")
+        final_state, output = getattr(runner, method)(sm, {"detail": {"customer": "ada", "orders": orders}})
+
+    assert final_state.name == "ForEachOrder"
+    assert output == {
+        "detail": {"customer": "ada", "orders": orders},
+        "prices": [30, 11, 42, 13, 54],
+    }
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 3, 0])
+def test_map_honors_max_concurrency(max_concurrency):
+    sm = Machine.parse(map_definition(max_concurrency=max_concurrency))
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    with Runner(max_workers=8) as runner:
+        @runner.resource_provider("Price")
+        def slow_price(payload):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return payload["index"]
+
+        final_state, output = runner.run(sm, {"detail": {"customer": "ada", "orders": [{}] * 12}})
+
+    assert output["prices"] == list(range(12))
+    if max_concurrency:
+        assert peak[0] <= max_concurrency
+    if max_concurrency != 1:
+        assert peak[0] > 1
+
+
+def test_async_runner_runs_map():
+    sm = Machine.parse(map_definition(max_concurrency=2))
+    runner = AsyncRunner()
+    running = [0]
+    peak = [0]
+
+    @runner.resource_provider("Price")
+    async def async_price(payload):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return payload["order"]["quantity"]
+
+    final_state, output = asyncio.run(
+        runner.run(sm, {"detail": {"customer": "ada", "orders": [{"quantity": q} for q in range(6)]}})
+    )
+    runner.close()
+
+    assert output["prices"] == list(range(6))
+    assert peak[0] == 2
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from aws_sfn_builder import AsyncRunner, Machine, Pages, Runner
+
+
+def paginated_machine(max_pages=None, parallel_pages=True):
+    definition = {
+        "StartAt": "ListJobs",
+        "States": {
+            "ListJobs": {
+                "Type": "Task",
+                "Resource": "ListJobs",
+                "ParallelPages": parallel_pages,
+                "ResultPath": "$.jobs",
+                "End": True,
+            },
+        },
+    }
+    if max_pages is not None:
+        definition["MaxPages"] = max_pages
+    return Machine.parse(definition)
+
+
+class PageCounter:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.fetched = []
+
+    def fetch(self, page):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.fetched.append(page)
+        # Later pages are faster so that they finish first if fetched concurrently
+        time.sleep(self.delay * (10 - page) / 10)
+        with self.lock:
+            self.running -= 1
+        return [f"job-{page}-{i}" for i in range(2)]
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+@pytest.mark.parametrize("max_pages", [None, 1, 3])
+def test_pages_are_fetched_concurrently_and_merged_in_order(method, max_pages):
+    sm = paginated_machine(max_pages)
+    counter = PageCounter()
+
+    with Runner(max_workers=8) as runner:
+        @runner.resource_provider("ListJobs")
+        def list_jobs(payload):
+            return Pages(counter.fetch, payload["page_count"], first=["job-0-0", "job-0-1"])
+
+        final_state, output = getattr(runner, method)(sm, {"page_count": 8})
+
+    assert output["jobs"] == [f"job-{page}-{i}" for page in range(8) for i in range(2)]
+    assert sorted(counter.fetched) == list(range(1, 8))
+    if max_pages:
+        assert counter.peak <= max_pages
+    if max_pages != 1:
+        assert counter.peak > 1
+
+
+def test_pages_with_cursors_and_merge():
+    sm = paginated_machine()
+
+    with Runner() as runner:
+        @runner.resource_provider("ListJobs")
+        def list_jobs(payload):
+            return Pages(
+                lambda cursor: {"count": len(cursor)},
+                ["a", "bb", "ccc"],
+                merge=lambda pages: sum(page["count"] for page in pages),
+            )
+
+        final_state, output = runner.run(sm)
+
+    assert output == {"jobs": 6}
+
+
+def test_pages_are_not_fetched_without_parallel_pages():
+    sm = paginated_machine(parallel_pages=False)
+    pages = Pages(lambda page: [page], 2)
+
+    with Runner() as runner:
+        runner.resources.register("ListJobs", lambda payload: pages)
+        final_state, output = runner.run(sm)
+
+    assert output["jobs"] is pages
+
+
+def test_async_runner_fetches_pages():
+    sm = paginated_machine(max_pages=2)
+    runner = AsyncRunner()
+    running = [0]
+    peak = [0]
+
+    async def fetch(page):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return [page]
+
+    @runner.resource_provider("ListJobs")
+    async def list_jobs(payload):
+        return Pages(fetch, 6)
+
+    final_state, output = asyncio.run(runner.run(sm))
+    runner.close()
+
+    assert output["jobs"] == list(range(6))
+    assert peak[0] == 2
@@ -0,0 +1,146 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from aws_sfn_builder import Machine, Runner, State
+
+
+@pytest.fixture
+def parallel_machine():
+    return Machine.parse({
+        "StartAt": "Lookup",
+        "States": {
+            "Lookup": {
+                "Type": "Parallel",
+                "InputPath": "$.person",
+                "ResultSelector": {
+                    "address.$": "$[0]",
+                    "phone.$": "$[1]",
+                },
+                "ResultPath": "$.contacts",
+                "Branches": [
+                    {
+                        "StartAt": "LookupAddress",
+                        "States": {
+                            "LookupAddress": {"Type": "Task", "Resource": "AddressFinder", "End": True},
+                        },
+                    },
+                    {
+                        "StartAt": "LookupPhone",
+                        "States": {
+                            "LookupPhone": {"Type": "Task", "Resource": "PhoneFinder", "End": True},
+                        },
+                    },
+                ],
+                "End": True,
+            },
+        },
+    })
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_parallel_branches_run_concurrently(parallel_machine, method):
+    barrier = threading.Barrier(2, timeout=5)
+
+    with Runner() as runner:
+        @runner.resource_provider("AddressFinder")
+        def find_address(person):
+            # Would time out if the branches did not run at the same time
+            barrier.wait()
+            person["touched"] = True
+            return f"{person['name']} Street"
+
+        @runner.resource_provider("PhoneFinder")
+        def find_phone(person):
+            barrier.wait()
+            assert "touched" not in person
+            return "555-1234"
+
+        final_state, output = getattr(runner, method)(parallel_machine, {"person": {"name": "Ada"}})
+
+    assert final_state.name == "Lookup"
+    assert output == {
+        "person": {"name": "Ada"},
+        "contacts": {"address": "Ada Street", "phone": "555-1234"},
+    }
+
+
+def test_nested_parallels_do_not_deadlock_on_a_single_worker():
+    def passes(*names):
+        return [{"Type": "Pass", "Name": name} for name in names]
+
+    sm = Machine.parse([
+        [*passes("x"), [passes("a"), passes("b")]],
+        [*passes("y"), [passes("c"), passes("d")]],
+    ])
+
+    with Runner(executor=ThreadPoolExecutor(max_workers=1)) as runner:
+        final_state, output = runner.run(sm, {"x": 1})
+
+    assert output == [[{"x": 1}, {"x": 1}], [{"x": 1}, {"x": 1}]]
+
+
+def test_parallel_state_executes_on_its_own():
+    state = State.parse({
+        "Type": "Parallel",
+        "Branches": [
+            {"StartAt": "A", "States": {"A": {"Type": "Pass", "Result": "a", "End": True}}},
+            {"StartAt": "B", "States": {"B": {"Type": "Pass", "End": True}}},
+        ],
+        "Next": "C",
+    })
+    assert state.execute({"x": 1}) == ("C", ["a", {"x": 1}])
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_branches_share_the_input_without_copying_it(method):
+    sm = Machine.parse({
+        "StartAt": "Fan",
+        "States": {
+            "Fan": {
+                "Type": "Parallel",
+                "Branches": [
+                    {
+                        "StartAt": name,
+                        "States": {name: {"Type": "Pass", "Result": name, "ResultPath": "$.meta.branch", "End": True}},
+                    }
+                    for name in ("A", "B")
+                ],
+                "End": True,
+            },
+        },
+    })
+    input = {"meta": {"id": 1}, "big": list(range(1000))}
+
+    with Runner() as runner:
+        final_state, output = getattr(runner, method)(sm, input)
+
+    assert [branch["meta"] for branch in output] == [{"id": 1, "branch": "A"}, {"id": 1, "branch": "B"}]
+    assert all(branch["big"] is input["big"] for branch in output)
+    assert input == {"meta": {"id": 1}, "big": list(range(1000))}
+
+
+def test_providers_in_branches_get_their_own_copy():
+    sm = Machine.parse({
+        "StartAt": "Fan",
+        "States": {
+            "Fan": {
+                "Type": "Parallel",
+                "Branches": [
+                    {"StartAt": name, "States": {name: {"Type": "Task", "Resource": name, "End": True}}}
+                    for name in ("Mutate", "Read")
+                ],
+                "End": True,
+            },
+        },
+    })
+    input = {"items": [1, 2]}
+
+    with Runner() as runner:
+        runner.resource_provider("Mutate")(lambda payload: payload["items"].append(3) or payload)
+        runner.resource_provider("Read")(lambda payload: payload)
+        final_state, output = runner.run(sm, input)
+
+    assert output == [{"items": [1, 2, 3]}, {"items": [1, 2]}]
+    assert input == {"items": [1, 2]}
@@ -0,0 +1,102 @@
+import copy
+
+import pytest
+
+from aws_sfn_builder import Machine, Runner, VirtualClock
+from aws_sfn_builder.plan import Plan
+
+
+@pytest.fixture
+def runner():
+    runner = Runner()
+    runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob")(lambda payload: payload)
+    runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob")(
+        lambda payload: "FAILED" if payload < 30 else "SUCCEEDED"
+    )
+    runner.resource_provider("arn:aws:lambda:us-east-1:123456789012:function:HelloWorld")(lambda x: "Hello, world!")
+    for name in ("Foo", "Zero", "Bar"):
+        runner.resource_provider(f"arn:aws:lambda:us-east-1:123456789012:function:{name}")(
+            lambda x, name=name: {**x, "visited": name}
+        )
+    return runner
+
+
+@pytest.mark.parametrize("example_name,input", [
+    ["hello_world", {}],
+    ["job_status_poller", {"input": 25, "wait_time": 0}],
+    ["job_status_poller", {"input": 40, "wait_time": 0}],
+    ["choice_state_x", {"type": "Public", "value": 0}],
+    ["choice_state_x", {"type": "Private", "value": 0}],
+    ["choice_state_x", {"type": "Private", "value": 25}],
+    ["choice_state_x", {"type": "Private", "value": 30}],
+])
+def test_plan_execution_matches_tree_walk(example, runner, example_name, input):
+    sm = Machine.parse(example(example_name))
+
+    final_state, output = runner.run(sm, copy.deepcopy(input))
+    ref_final_state, ref_output = runner.walk(sm, copy.deepcopy(input))
+
+    assert final_state is ref_final_state
+    assert output == ref_output
+
+
+def test_plan_resolves_next_to_indexes(example):
+    sm = Machine.parse(example("job_status_poller"))
+    plan = sm.compile_plan()
+
+    assert isinstance(plan, Plan)
+    assert plan.names == list(sm.states.keys())
+    assert plan.start == 0
+    assert plan.resolve("Job Complete?") == 3
+    with pytest.raises(ValueError):
+        plan.resolve("Nonexistent")
+
+
+def test_plan_is_shared_by_equal_definitions(example):
+    sm1 = Machine.parse(example("job_status_poller"))
+    sm2 = Machine.parse(example("job_status_poller"))
+    assert sm1.compile_plan() is sm2.compile_plan()
+    assert sm1.compile_plan() is not Machine.parse(example("hello_world")).compile_plan()
+
+
+def test_plan_is_discarded_when_states_change():
+    sm = Machine.parse([{"Resource": "a"}, {"Resource": "c"}])
+    plan = sm.compile_plan()
+    sm.insert({"Resource": "b"}, before="c")
+    assert sm.compile_plan() is not plan
+    assert sm.compile_plan().names == ["a", "c", "b"]
+
+    runner = Runner()
+    trace = []
+    for name in ("a", "b", "c"):
+        runner.resource_provider(name)(lambda x, name=name: trace.append(name))
+    final_state, _ = runner.run(sm)
+    assert trace == ["a", "b", "c"]
+    assert final_state.name == "c"
+
+
+def test_pass_wait_and_succeed_states_are_planned_like_tree_walk(runner):
+    sm = Machine.parse({
+        "StartAt": "Init",
+        "States": {
+            "Init": {"Type": "Pass", "Result": {"n": 1}, "ResultPath": "$.init", "Next": "Wait"},
+            "Wait": {"Type": "Wait", "Seconds": 1, "OutputPath": "$.init", "Next": "Done"},
+            "Done": {"Type": "Succeed", "InputPath": "$.n"},
+        },
+    })
+
+    runner.clock = VirtualClock()
+    assert runner.run(sm, {"x": 0}) == runner.walk(sm, {"x": 0}) == (sm.states["Done"], 1)
+    assert runner.clock.time() == 2
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_outputs_do_not_share_the_result_of_pass_states(method):
+    sm = Machine.parse({"StartAt": "P", "States": {"P": {"Type": "Pass", "Result": {"l": [1]}, "End": True}}})
+    runner = Runner()
+
+    _, output = getattr(runner, method)(sm)
+    output["l"].append(2)
+
+    assert sm.compile()["States"]["P"]["Result"] == {"l": [1]}
+    assert getattr(runner, method)(sm)[1] == {"l": [1]}
@@ -0,0 +1,118 @@
+import collections
+import json
+import os
+import pickle
+
+import pytest
+
+from aws_sfn_builder import Machine, ResourceManager, Runner
+from aws_sfn_builder import runner as runner_module
+from aws_sfn_builder.runner import _run_sequence_in_worker, import_provider, provider_path
+
+
+def get_pid(payload):
+    return {**payload, "pid": os.getpid()}
+
+
+def double(payload):
+    return payload * 2
+
+
+@pytest.fixture
+def resources():
+    return ResourceManager(providers={
+        "GetPid": get_pid,
+        "Double": "tests.test_process_pool:double",
+    })
+
+
+def test_provider_paths():
+    assert provider_path(get_pid) == "tests.test_process_pool:get_pid"
+    assert import_provider("tests.test_process_pool:get_pid") is get_pid
+    assert import_provider("json.dumps") is json.dumps
+
+    with pytest.raises(ValueError):
+        provider_path(lambda x: x)
+
+
+def test_resource_manager_is_pickled_with_provider_paths(resources):
+    restored = pickle.loads(pickle.dumps(resources))
+    assert restored.resolve("GetPid") is get_pid
+    assert restored.resolve("Double") is double
+
+    resources.register("Lambda", lambda x: x)
+    with pytest.raises(ValueError):
+        pickle.dumps(resources)
+
+
+def test_parallel_branches_run_in_worker_processes(resources):
+    sm = Machine.parse([
+        [{"Resource": "GetPid"}],
+        [{"Resource": "GetPid"}],
+        [{"Resource": "GetPid"}],
+    ])
+
+    with Runner(resources=resources, executor="process", max_workers=2) as runner:
+        for _ in range(3):
+            final_state, output = runner.run(sm, {"x": 1})
+            assert [item["x"] for item in output] == [1, 1, 1]
+            assert all(item["pid"] != os.getpid() for item in output)
+
+
+def test_definitions_and_resources_are_shipped_once(resources, monkeypatch):
+    shipped = []
+    ship = Runner._ship
+    monkeypatch.setattr(Runner, "_ship", lambda self, key, data: shipped.append(key) or ship(self, key, data))
+    sm = Machine.parse([
+        [{"Resource": "Double"}],
+        [{"Name": "Once", "Resource": "Double"}, {"Name": "Twice", "Resource": "Double"}],
+    ])
+
+    with Runner(resources=resources, executor="process", max_workers=2) as runner:
+        for _ in range(3):
+            assert runner.run(sm, 1)[1] == [2, 4]
+        store = runner._worker_store.name
+        assert sorted(os.listdir(store)) == sorted(shipped)
+
+    # Two definitions and the resource manager
+    assert len(shipped) == 3
+    assert not os.path.exists(store)
+
+
+def ship(store, key, data: bytes):
+    (store / key).write_bytes(data)
+
+
+def test_worker_keeps_sequences_and_resources_between_tasks(resources, tmp_path):
+    branch = Machine.parse([{"Resource": "Double"}])
+    key = branch.compile_plan().key
+    ship(tmp_path, key, json.dumps(branch.compile()).encode())
+    ship(tmp_path, "resources-key", pickle.dumps(resources))
+
+    assert _run_sequence_in_worker(str(tmp_path), key, "resources-key", 2, False, 2) == 4
+
+    (tmp_path / key).unlink()
+    (tmp_path / "resources-key").unlink()
+    assert _run_sequence_in_worker(str(tmp_path), key, "resources-key", 3, False, 2) == 6
+
+
+def test_worker_keeps_only_the_most_recently_used_sequences(resources, monkeypatch, tmp_path):
+    monkeypatch.setattr(runner_module, "PLAN_CACHE_SIZE", 3)
+    monkeypatch.setattr(runner_module, "_worker_cache", collections.OrderedDict())
+    ship(tmp_path, "resources-key", pickle.dumps(resources))
+    branches = [Machine.parse([{"Resource": "Double", "Comment": str(i)}]) for i in range(4)]
+    keys = [branch.compile_plan().key for branch in branches]
+    for key, branch in zip(keys, branches):
+        ship(tmp_path, key, json.dumps(branch.compile()).encode())
+
+    for i, key in enumerate(keys):
+        assert _run_sequence_in_worker(str(tmp_path), key, "resources-key", i, False, 2) == 2 * i
+
+    assert len(runner_module._worker_cache) == 3
+    # The resources are used by every task and stay, the oldest sequences are evicted
+    assert keys[0] not in runner_module._worker_cache
+    assert "resources-key" in runner_module._worker_cache
+
+    # and loaded again from the store when needed
+    assert _run_sequence_in_worker(str(tmp_path), keys[0], "resources-key", 5, False, 2) == 10
+    assert keys[0] in runner_module._worker_cache
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from aws_sfn_builder import (
+    AsyncRunner, Catcher, Errors, Machine, Retrier, Runner, State, StateFailed, StatesError, Task, VirtualClock,
+)
+from aws_sfn_builder.errors import error_matches
+
+
+def flaky_machine(retry=None, catch=None):
+    task = {"Type": "Task", "Resource": "Flaky", "ResultPath": "$.result", "End": True}
+    if retry is not None:
+        task["Retry"] = retry
+    if catch is not None:
+        task["Catch"] = catch
+        task["End"] = True
+    return Machine.parse({
+        "StartAt": "Flaky",
+        "States": {
+            "Flaky": task,
+            "Recover": {"Type": "Pass", "End": True},
+        },
+    })
+
+
+class Flaky:
+    def __init__(self, failures, exc=ValueError("not yet")):
+        self.failures = failures
+        self.exc = exc
+        self.calls = 0
+
+    def __call__(self, payload):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.exc
+        return "done"
+
+
+def test_retry_and_catch_compile_back():
+    definition = {
+        "StartAt": "Flaky",
+        "States": {
+            "Flaky": {
+                "Type": "Task",
+                "Resource": "Flaky",
+                "Retry": [
+                    {"ErrorEquals": ["States.Timeout"], "IntervalSeconds": 3, "MaxAttempts": 2, "BackoffRate": 1.5},
+                    {"ErrorEquals": ["States.ALL"], "MaxDelaySeconds": 10, "JitterStrategy": "FULL"},
+                ],
+                "Catch": [{"ErrorEquals": ["States.ALL"], "ResultPath": "$.error", "Next": "Recover"}],
+                "End": True,
+            },
+            "Recover": {"Type": "Pass", "End": True},
+        },
+    }
+    sm = Machine.parse(definition)
+    assert isinstance(sm.states["Flaky"].retry[0], Retrier)
+    assert isinstance(sm.states["Flaky"].catch[0], Catcher)
+    assert json.dumps(sm.compile(), sort_keys=True) == json.dumps(definition, sort_keys=True)
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_ten_retries_with_exponential_backoff_on_a_virtual_clock(method):
+    sm = flaky_machine(retry=[
+        {"ErrorEquals": ["States.ALL"], "IntervalSeconds": 1, "BackoffRate": 2, "MaxAttempts": 10},
+    ])
+    flaky = Flaky(failures=10)
+    clock = VirtualClock()
+
+    started = time.perf_counter()
+    with Runner(clock=clock) as runner:
+        runner.resources.register("Flaky", flaky)
+        final_state, output = getattr(runner, method)(sm, {})
+
+    assert time.perf_counter() - started < 1
+    assert output == {"result": "done"}
+    assert flaky.calls == 11
+    assert clock.time() == sum(2 ** i for i in range(10))
+
+
+def test_retrier_delays():
+    assert [Retrier(error_equals=["States.ALL"]).delay(i) for i in (1, 2, 3)] == [1, 2, 4]
+    capped = Retrier(error_equals=["States.ALL"], interval_seconds=5, backoff_rate=3, max_delay_seconds=60)
+    assert [capped.delay(i) for i in (1, 2, 3, 4)] == [5, 15, 45, 60]
+    jittered = Retrier(error_equals=["States.ALL"], interval_seconds=10, jitter_strategy="FULL")
+    assert jittered.delay(1, rand=lambda: 0.25) == 2.5
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_catch_after_retries_run_out(method):
+    sm = flaky_machine(
+        retry=[{"ErrorEquals": ["ValueError"], "MaxAttempts": 2}],
+        catch=[{"ErrorEquals": ["States.ALL"], "ResultPath": "$.error", "Next": "Recover"}],
+    )
+    flaky = Flaky(failures=5)
+
+    with Runner(clock=VirtualClock()) as runner:
+        runner.resources.register("Flaky", flaky)
+        final_state, output = getattr(runner, method)(sm, {"x": 1})
+
+    assert flaky.calls == 3
+    assert final_state.name == "Recover"
+    assert output == {"x": 1, "error": {"Error": "ValueError", "Cause": "not yet"}}
+
+
+def test_first_matching_retrier_decides():
+    sm = flaky_machine(retry=[
+        {"ErrorEquals": ["Throttled"], "MaxAttempts": 1},
+        {"ErrorEquals": ["States.ALL"], "MaxAttempts": 5},
+    ])
+    flaky = Flaky(failures=3, exc=StatesError("Throttled", "slow down"))
+
+    with Runner(clock=VirtualClock()) as runner:
+        runner.resources.register("Flaky", flaky)
+        with pytest.raises(StateFailed) as exc_info:
+            runner.run(sm)
+
+    assert flaky.calls == 2
+    assert exc_info.value.error == "Throttled"
+    assert exc_info.value.cause == "slow down"
+    assert isinstance(exc_info.value, RuntimeError)
+
+
+def test_error_matches():
+    assert error_matches(["States.ALL"], "ValueError")
+    assert not error_matches(["States.ALL"], Errors.Runtime)
+    assert error_matches(["States.TaskFailed"], "ValueError")
+    assert not error_matches(["States.TaskFailed"], Errors.Timeout)
+    assert error_matches(["States.Timeout"], Errors.Timeout)
+    assert not error_matches(["KeyError"], "ValueError")
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_fail_in_a_branch_is_caught_by_the_parallel(method, executor):
+    sm = Machine.parse({
+        "StartAt": "Both",
+        "States": {
+            "Both": {
+                "Type": "Parallel",
+                "Branches": [
+                    {"StartAt": "Ok", "States": {"Ok": {"Type": "Pass", "End": True}}},
+                    {
+                        "StartAt": "NotOk",
+                        "States": {"NotOk": {"Type": "Fail", "Error": "Bad.Thing", "Cause": "it broke"}},
+                    },
+                ],
+                "Catch": [{"ErrorEquals": ["Bad.Thing"], "ResultPath": "$.error", "Next": "Recover"}],
+                "End": True,
+            },
+            "Recover": {"Type": "Pass", "End": True},
+        },
+    })
+
+    with Runner(executor=executor) as runner:
+        final_state, output = getattr(runner, method)(sm, {"x": 1}, _timeout=30)
+
+    assert final_state.name == "Recover"
+    assert output == {"x": 1, "error": {"Error": "Bad.Thing", "Cause": "it broke"}}
+
+
+def test_execution_ending_in_fail_reports_error_and_cause():
+    sm = Machine.parse({
+        "StartAt": "Check",
+        "States": {
+            "Check": {"Type": "Fail", "ErrorPath": "$.code", "Cause": "Job failed"},
+        },
+    })
+
+    with Runner() as runner:
+        final_state, output = runner.run(sm, {"code": "Job.Failed"})
+
+    assert final_state.name == "Check"
+    assert output == {"Error": "Job.Failed", "Cause": "Job failed"}
+
+
+def test_task_state_executed_on_its_own_retries():
+    task = State.parse({
+        "Type": "Task",
+        "Resource": "Flaky",
+        "Retry": [{"ErrorEquals": ["States.ALL"], "IntervalSeconds": 0}],
+    })
+    assert isinstance(task, Task)
+    flaky = Flaky(failures=2)
+    assert task.execute({}, resource_resolver=lambda resource: flaky) == (None, "done")
+
+
+def test_async_runner_retries_on_the_virtual_clock():
+    sm = flaky_machine(retry=[{"ErrorEquals": ["States.ALL"], "IntervalSeconds": 2, "MaxAttempts": 3}])
+    flaky = Flaky(failures=3)
+    clock = VirtualClock()
+    runner = AsyncRunner(clock=clock)
+    runner.resources.register("Flaky", flaky)
+
+    final_state, output = asyncio.run(runner.run(sm))
+    runner.close()
+
+    assert output == {"result": "done"}
+    assert clock.time() == 2 + 4 + 8
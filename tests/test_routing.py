@@ -0,0 +1,109 @@
+import pytest
+
+from aws_sfn_builder import Machine, ResourceManager, Runner
+from aws_sfn_builder.routing import arn_family, ArnIndex
+
+FUNCTION = "arn:aws:lambda:us-east-1:123456789012:function:Resize"
+
+
+@pytest.mark.parametrize("arn, family", [
+    ("arn:aws:states:::glue:startJobRun.sync", ["arn:aws:states:::glue:startJobRun"]),
+    ("arn:aws:states:::states:startExecution.sync:2", ["arn:aws:states:::states:startExecution"]),
+    ("arn:aws:states:::sqs:sendMessage.waitForTaskToken", ["arn:aws:states:::sqs:sendMessage"]),
+    (f"{FUNCTION}:prod", [FUNCTION]),
+    (f"{FUNCTION}:7", [FUNCTION]),
+    (FUNCTION, []),
+    ("arn:aws:states:::lambda:invoke", []),
+])
+def test_arn_family(arn, family):
+    assert arn_family(arn) == family
+
+
+@pytest.fixture
+def index():
+    index = ArnIndex()
+    for pattern in [
+        FUNCTION,
+        "arn:aws:states:::glue:startJobRun",
+        "arn:aws:lambda:*",
+        "arn:aws:lambda:us-east-1:*",
+        "arn:aws:lambda:*:function:tenant-*",
+        "arn:aws:lambda:*:function:tenant-?",
+        "arn:aws:dynamodb:*",
+        "*:sqs:*",
+    ]:
+        index.add(pattern)
+    return index
+
+
+@pytest.mark.parametrize("arn, pattern", [
+    (FUNCTION, FUNCTION),
+    (f"{FUNCTION}:prod", FUNCTION),
+    ("arn:aws:states:::glue:startJobRun.sync", "arn:aws:states:::glue:startJobRun"),
+    # The longest prefix wins over shorter ones and over patterns
+    ("arn:aws:lambda:us-east-1:1:function:tenant-a", "arn:aws:lambda:us-east-1:*"),
+    ("arn:aws:lambda:eu-west-1:1:function:Other", "arn:aws:lambda:*"),
+    ("arn:aws:dynamodb:", "arn:aws:dynamodb:*"),
+    # Patterns are matched after prefixes, the one with the most literal characters first
+    ("arn:aws:sqs:us-east-1:1:queue", "*:sqs:*"),
+    ("arn:aws:states:::glue:getJob", None),
+    ("", None),
+])
+def test_resolution_order(index, arn, pattern):
+    assert index.resolve(arn) == pattern
+    assert index.resolve(arn) == pattern
+
+
+def test_most_literal_pattern_wins():
+    index = ArnIndex()
+    index.add("arn:*:function:*")
+    index.add("arn:*:function:tenant-?")
+    index.add("arn:*:function:tenant-*")
+    assert index.resolve("arn:x:function:tenant-a") == "arn:*:function:tenant-?"
+    assert index.resolve("arn:x:function:tenant-ab") == "arn:*:function:tenant-*"
+    assert index.resolve("arn:x:function:other") == "arn:*:function:*"
+
+
+def test_patterns_match_like_fnmatch():
+    index = ArnIndex()
+    for pattern in ["a*b*c", "a?c", "*x", "[kl]*:q", "a**z"]:
+        index.add(pattern)
+    assert index.resolve("a:b:c") == "a*b*c"
+    assert index.resolve("abbbc") == "a*b*c"
+    assert index.resolve("adc") == "a?c"
+    assert index.resolve("a:c") == "a?c"
+    assert index.resolve("abx") == "*x"
+    assert index.resolve("k:1:q") == "[kl]*:q"
+    assert index.resolve("az") == "a**z"
+    assert index.resolve("ab") is None
+    assert index.resolve("m:q") is None
+
+
+def test_resolutions_are_recomputed_when_patterns_are_added(index):
+    assert index.resolve("arn:aws:states:::glue:getJob") is None
+    index.add("arn:aws:states:::glue:*")
+    assert index.resolve("arn:aws:states:::glue:getJob") == "arn:aws:states:::glue:*"
+    index.add("arn:aws:states:::glue:getJob")
+    assert index.resolve("arn:aws:states:::glue:getJob") == "arn:aws:states:::glue:getJob"
+
+
+def test_resource_manager_resolves_patterns():
+    resources = ResourceManager(providers={
+        "arn:aws:lambda:*:function:tenant-*": lambda payload: "tenant",
+        FUNCTION: lambda payload: "resize",
+    })
+    machine = Machine.parse({
+        "StartAt": "Tenant",
+        "States": {
+            "Tenant": {
+                "Type": "Task",
+                "Resource": "arn:aws:lambda:us-west-2:210987654321:function:tenant-42",
+                "ResultPath": "$.tenant",
+                "Next": "Resize",
+            },
+            "Resize": {"Type": "Task", "Resource": f"{FUNCTION}:live", "ResultPath": "$.resize", "End": True},
+        },
+    })
+    assert Runner(resources=resources).run(machine, {})[1] == {"tenant": "tenant", "resize": "resize"}
+    with pytest.raises(RuntimeError):
+        resources("arn:aws:lambda:us-east-1:1:function:Other")
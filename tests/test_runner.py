@@ -324,7 +324,6 @@ def test_executes_fail_state():
         "Error": "ErrorA",
         "Cause": "Kaiju attack",
     })
-    # TODO No idea what should be the next state or output of fail state.
-    # TODO Should it just raise an exception?
-    next_state, output = fail.execute(input=input)
+    next_state, output = fail.execute(input={})
     assert next_state is None
+    assert output == {"Error": "ErrorA", "Cause": "Kaiju attack"}
@@ -0,0 +1,150 @@
+import pytest
+
+from aws_sfn_builder.templates import compile_template
+
+INPUT = {
+    "guid": "123-456",
+    "detail": {"size": 3, "tags": ["a", "b"]},
+    "page": [{"n": 1}, {"n": 2}],
+}
+
+
+def test_template_resolves_paths_and_keeps_constants():
+    build = compile_template({
+        "static": "Just a string",
+        "guid.$": "$.guid",
+        "size.$": "$.detail.size",
+        "first.$": "$.page[0].n",
+        "legacy": "$.detail.tags",
+        "items": [1, 2],
+        "nested": {"tag.$": "$.detail.tags[1]", "n": 1},
+    })
+    assert build(INPUT) == {
+        "static": "Just a string",
+        "guid": "123-456",
+        "size": 3,
+        "first": 1,
+        "legacy": ["a", "b"],
+        "items": [1, 2],
+        "nested": {"tag": "b", "n": 1},
+    }
+
+
+def test_template_keeps_the_order_of_its_fields():
+    build = compile_template({"a": 1, "b.$": "$.guid", "c": 3, "d": {"e.$": "$.guid"}})
+    assert list(build(INPUT)) == ["a", "b", "c", "d"]
+
+
+def test_later_fields_override_earlier_ones_with_the_same_name():
+    assert compile_template({"a.$": "$.guid", "a": 1})(INPUT) == {"a": 1}
+    assert compile_template({"a": 1, "a.$": "$.guid"})(INPUT) == {"a": "123-456"}
+
+
+def test_path_that_matches_nothing_resolves_to_itself():
+    assert compile_template({"missing.$": "$.nope.nothing", "deep.$": "$.guid.x"})(INPUT) == {
+        "missing": "$.nope.nothing",
+        "deep": "$.guid.x",
+    }
+
+
+def test_every_application_returns_new_objects():
+    build = compile_template({"a": 1, "nested": {"b": 2}})
+    first = build(INPUT)
+    first["nested"]["b"] = 3
+    first["a"] = 0
+    assert build(INPUT) == {"a": 1, "nested": {"b": 2}}
+
+
+@pytest.mark.parametrize("template", [
+    {"a": [1, 2], "x.$": "$.guid"},
+    {"a": [1, 2]},
+    {"nested": {"a": [1, 2]}, "x.$": "$.guid"},
+])
+def test_constant_arrays_are_not_shared_between_applications(template):
+    build = compile_template(template)
+    first = build(INPUT)
+    (first.get("nested") or first)["a"].append(9)
+    second = build(INPUT)
+    assert (second.get("nested") or second)["a"] == [1, 2]
+    assert (template.get("nested") or template)["a"] == [1, 2]
+
+
+def test_context_paths_are_resolved_against_the_context():
+    build = compile_template({"index.$": "$$.Map.Item.Index", "name.$": "$$.Map.Item.Value.name"})
+    assert build(INPUT, {"Map": {"Item": {"Index": 2, "Value": {"name": "x"}}}}) == {"index": 2, "name": "x"}
+    assert build(INPUT) == {"index": "$$.Map.Item.Index", "name": "$$.Map.Item.Value.name"}
+
+
+def test_projection_of_arrays():
+    build = compile_template({"n[*]": {"n.$": "$.page[*].n", "static": "ignored"}})
+    assert build(INPUT) == {"n": [{"n": 1}, {"n": 2}]}
+
+
+def test_invalid_path_of_path_field_is_reported_at_compile_time():
+    with pytest.raises(ValueError):
+        compile_template({"x.$": "$..["})
+
+
+def test_arrays_are_not_templates():
+    template = [{"x.$": "$.guid"}]
+    built = compile_template(template)(INPUT)
+    assert built == template and built is not template
+    built[0]["x"] = 1
+    assert compile_template(template)(INPUT) == [{"x.$": "$.guid"}]
+
+
+PROJECTION_DOC = {
+    "items": [
+        {"id": 1, "name": "a", "tags": ["x", "y"], "owner": {"name": "o1"}},
+        {"id": 2, "tags": []},
+        "not an object",
+        {"id": 4, "name": "d", "tags": ["z"], "owner": {"name": "o4"}},
+        {"name": "e"},
+    ],
+    "one": {"id": 7},
+    "empty": [],
+}
+
+
+@pytest.mark.parametrize("path", [
+    "$.items[*]",
+    "$.items[*].id",
+    "$.items[*].name",
+    "$.items[*].owner.name",
+    "$.items[*].tags[*]",
+    "$.items[*].tags[0]",
+    "$.one[*].id",
+    "$.empty[*].id",
+    "$.missing[*].id",
+    "$.items[0].tags[*]",
+])
+@pytest.mark.parametrize("name", ["value", "value[*]", "value_ALIAS1[*]"])
+def test_projection_matches_projection_of_all_indexed_matches(path, name):
+    from aws_sfn_builder.jsonpath import compile_path
+    from aws_sfn_builder.templates import _project_found, compile_projection
+
+    # Projected into rows that already hold the values of another projection, as in format_array.
+    rows = [{"first": True}, {"first": True}]
+    expected_rows = [{"first": True}, {"first": True}]
+
+    found = compile_path(path).find_indexed(PROJECTION_DOC)
+    if found:
+        _project_found(found, name, expected_rows)
+    assert compile_projection(path)(PROJECTION_DOC, name, rows) is bool(found)
+    assert rows == expected_rows
+
+
+def test_projection_of_several_fields_into_the_same_rows():
+    build = compile_template({"items[*]": {"id.$": "$.items[*].id", "name.$": "$.items[*].name"}})
+    assert build(PROJECTION_DOC) == {"items": [
+        {"id": 1, "name": "a"},
+        {"id": 2},
+        {},
+        {"id": 4, "name": "d"},
+        {"name": "e"},
+    ]}
+
+
+def test_projection_of_grouped_fields_keeps_all_of_them():
+    build = compile_template({"tags[*]": {"tag[*].$": "$.items[*].tags[*]", "id[*].$": "$.items[*].id"}})
+    assert build(PROJECTION_DOC)["tags"][0] == {"0-0": {"tag": "x"}, "0-1": {"tag": "y"}, 0: {"id": 1}}
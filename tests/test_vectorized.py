@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from aws_sfn_builder import State, vectorized
+from aws_sfn_builder.choice_rules import Operator
+from aws_sfn_builder.jsonpath import PathNotFound
+
+
+@pytest.fixture(params=["numpy", "fallback"])
+def mode(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(vectorized, "numpy", None)
+    return request.param
+
+
+@pytest.fixture
+def routing_choice():
+    return State.parse({
+        "Type": "Choice",
+        "Choices": [
+            {"Not": {"Variable": "$.type", "StringEquals": "Private"}, "Next": "Public"},
+            {"Variable": "$.value", "NumericEquals": 0, "Next": "ValueIsZero"},
+            {
+                "And": [
+                    {"Variable": "$.value", "NumericGreaterThanEquals": 20},
+                    {"Variable": "$.value", "NumericLessThan": 30},
+                ],
+                "Next": "ValueInTwenties",
+            },
+            {
+                "Or": [
+                    {"Variable": "$.flag", "BooleanEquals": True},
+                    {"Variable": "$.at", "TimestampGreaterThan": "2020-01-01T00:00:00Z"},
+                ],
+                "Next": "FlaggedOrRecent",
+            },
+        ],
+        "Default": "DefaultState",
+    })
+
+
+def random_input(rng):
+    return {
+        "type": rng.choice(["Private", "Private", "Public"]),
+        "value": rng.choice([0, 5, 20, 25, 29.5, 30, "25", "0"]),
+        "flag": rng.choice([True, False, 0, "yes"]),
+        "at": rng.choice(["2019-12-31T23:59:59Z", "2020-01-01T01:00:00+02:00", "2020-06-01T00:00:00"]),
+    }
+
+
+def test_route_many_matches_routing_inputs_one_by_one(mode, routing_choice):
+    rng = random.Random(0)
+    inputs = [random_input(rng) for _ in range(1000)]
+
+    assert routing_choice.route_many(inputs) == [routing_choice.execute(input, None)[0] for input in inputs]
+
+
+def test_matches_many_matches_inputs_one_by_one(mode, routing_choice):
+    rng = random.Random(1)
+    inputs = [random_input(rng) for _ in range(200)]
+
+    for choice_rule in routing_choice.choices:
+        assert choice_rule.matches_many(inputs) == [choice_rule.matches(input) for input in inputs]
+
+
+def test_variables_are_only_required_by_inputs_that_reach_them(mode, routing_choice):
+    inputs = [
+        {"type": "Public"},
+        {"type": "Private", "value": 0},
+        {"type": "Private", "value": 1, "flag": True},
+    ]
+    assert routing_choice.route_many(inputs) == ["Public", "ValueIsZero", "FlaggedOrRecent"]
+
+
+def test_inputs_reaching_a_missing_variable_raise(mode, routing_choice):
+    with pytest.raises(PathNotFound):
+        routing_choice.route_many([{"type": "Public"}, {"type": "Private"}])
+
+
+def test_inputs_reaching_a_value_that_cannot_be_coerced_raise(mode):
+    op = Operator.parse({
+        "Or": [
+            {"Variable": "$.ok", "BooleanEquals": True},
+            {"Variable": "$.n", "NumericGreaterThan": 1},
+        ],
+    })
+    assert op.matches_many([{"ok": True, "n": "abc"}, {"ok": False, "n": 2}]) == [True, True]
+    with pytest.raises(ValueError):
+        op.matches_many([{"ok": True, "n": 2}, {"ok": False, "n": "abc"}])
+
+
+def test_matches_many_matches_every_operator_one_by_one(mode):
+    from tests.test_choice_rule_operators import OPERATOR_CASES
+
+    inputs = [input for _, input, _ in OPERATOR_CASES]
+    for source, _, _ in OPERATOR_CASES:
+        op = Operator.parse({"Or": [{"Variable": "$.a", "IsPresent": False}, source]})
+        expected = []
+        for input in inputs:
+            try:
+                expected.append(op.matches(input))
+            except Exception:
+                expected.append(None)
+        valid = [input for input, result in zip(inputs, expected) if result is not None]
+        assert op.matches_many(valid) == [result for result in expected if result is not None], source
@@ -0,0 +1,284 @@
+import asyncio
+import time
+
+import pytest
+
+from aws_sfn_builder import AsyncRunner, Execution, Machine, Runner, Scheduler, State, StateFailed, VirtualClock
+from aws_sfn_builder.errors import ExecutionTimedOut
+from aws_sfn_builder.states import parse_timestamp
+
+
+def polling_machine(timeout_seconds=None):
+    definition = {
+        "StartAt": "Check",
+        "States": {
+            "Check": {"Type": "Task", "Resource": "Check", "ResultPath": "$.done", "Next": "Done?"},
+            "Done?": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.done", "BooleanEquals": True, "Next": "Finished"}],
+                "Default": "Wait",
+            },
+            "Wait": {"Type": "Wait", "SecondsPath": "$.interval", "Next": "Check"},
+            "Finished": {"Type": "Succeed"},
+        },
+    }
+    if timeout_seconds is not None:
+        definition["TimeoutSeconds"] = timeout_seconds
+    return Machine.parse(definition)
+
+
+class Countdown:
+    """
+    Provider that reports the job done after ``polls`` checks.
+    """
+
+    def __init__(self):
+        self.polls = {}
+
+    def __call__(self, payload):
+        self.polls[payload["job"]] = self.polls.get(payload["job"], 0) + 1
+        return self.polls[payload["job"]] >= payload["polls"]
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_polling_loop_runs_instantly_on_a_virtual_clock(method):
+    sm = polling_machine()
+    clock = VirtualClock()
+
+    started = time.perf_counter()
+    with Runner(clock=clock) as runner:
+        runner.resources.register("Check", Countdown())
+        final_state, output = getattr(runner, method)(sm, {"job": "a", "polls": 2000, "interval": 30})
+
+    assert time.perf_counter() - started < 5
+    assert final_state.name == "Finished"
+    assert clock.time() == 1999 * 30
+
+
+@pytest.mark.parametrize("definition,input,now,expected", [
+    [{"Seconds": 10}, {}, 0, 10],
+    [{"SecondsPath": "$.wait"}, {"wait": 3}, 0, 3],
+    [{"InputPath": "$.job", "SecondsPath": "$.wait"}, {"job": {"wait": 4}}, 0, 4],
+    [{"Timestamp": "2020-01-01T00:01:00Z"}, {}, parse_timestamp("2020-01-01T00:00:00Z"), 60],
+    [{"TimestampPath": "$.at"}, {"at": "2020-01-01T00:00:30+00:00"}, parse_timestamp("2020-01-01T00:00:00"), 30],
+    [{"Timestamp": "2020-01-01T00:00:00Z"}, {}, parse_timestamp("2021-01-01T00:00:00Z"), -31622400],
+])
+def test_seconds_to_wait(definition, input, now, expected):
+    wait = State.parse({"Type": "Wait", **definition, "End": True})
+    assert wait.seconds_to_wait(input, now) == expected
+
+
+def test_invalid_seconds_path_fails_the_wait():
+    sm = Machine.parse({"StartAt": "Wait", "States": {"Wait": {"Type": "Wait", "SecondsPath": "$.wait", "End": True}}})
+    with Runner(clock=VirtualClock()) as runner:
+        with pytest.raises(StateFailed) as exc_info:
+            runner.run(sm, {"wait": "soon"})
+    assert exc_info.value.state == "Wait"
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_timeout_seconds_of_the_state_machine(method):
+    sm = polling_machine(timeout_seconds=100)
+
+    with Runner(clock=VirtualClock()) as runner:
+        runner.resources.register("Check", lambda payload: False)
+        with pytest.raises(StateFailed) as exc_info:
+            getattr(runner, method)(sm, {"interval": 30})
+
+    assert exc_info.value.error == "States.Timeout"
+    assert runner.clock.time() == 100
+
+
+WAIT_10 = {"StartAt": "W", "States": {"W": {"Type": "Wait", "Seconds": 10, "End": True}}}
+
+
+@pytest.mark.parametrize("method", ["run", "walk", "async"])
+def test_concurrent_waits_take_as_long_as_the_longest(method):
+    sm = Machine.parse({
+        "StartAt": "P",
+        "TimeoutSeconds": 35,
+        "States": {
+            "P": {"Type": "Parallel", "Branches": [WAIT_10] * 3, "ResultPath": "$.branches", "Next": "M"},
+            "M": {"Type": "Map", "ItemsPath": "$.items", "MaxConcurrency": 2, "Iterator": WAIT_10, "End": True},
+        },
+    })
+    clock = VirtualClock()
+    if method == "async":
+        final_state, _ = asyncio.run(AsyncRunner(clock=clock).run(sm, {"items": [1, 2, 3]}))
+    else:
+        final_state, _ = getattr(Runner(clock=clock), method)(sm, {"items": [1, 2, 3]})
+    assert final_state.name == "M"
+    # 10 seconds for the branches, 20 for the iterations, two at a time
+    assert clock.time() == 30
+
+
+CYCLE = Machine.parse({"StartAt": "A", "States": {"A": {"Type": "Pass", "Next": "A"}}})
+
+
+@pytest.mark.parametrize("method", ["run", "walk"])
+def test_cycling_machine_without_timeout_terminates(method):
+    with Runner(max_transitions=1000) as runner:
+        with pytest.raises(StateFailed) as exc_info:
+            getattr(runner, method)(CYCLE, {})
+    assert exc_info.value.error == "States.Timeout" and exc_info.value.state is None
+    assert "1000 state transitions" in str(exc_info.value)
+
+
+def test_cycling_machine_terminates_by_default():
+    started = time.monotonic()
+    with pytest.raises(StateFailed) as exc_info:
+        Runner().run(CYCLE, {})
+    assert exc_info.value.error == "States.Timeout"
+    assert time.monotonic() - started < 30
+
+
+def test_cycling_machine_without_timeout_terminates_async_and_scheduled():
+    with pytest.raises(StateFailed) as exc_info:
+        asyncio.run(AsyncRunner(max_transitions=1000).run(CYCLE, {}))
+    assert exc_info.value.error == "States.Timeout"
+
+    scheduler = Scheduler(Runner(max_transitions=1000))
+    execution = scheduler.start(CYCLE, {})
+    scheduler.run()
+    assert execution.status == Execution.TIMED_OUT
+
+
+def test_scheduler_fast_forwards_to_the_next_timer():
+    sm = polling_machine()
+    clock = VirtualClock()
+    countdown = Countdown()
+    runner = Runner(clock=clock)
+    runner.resources.register("Check", countdown)
+    scheduler = Scheduler(runner)
+
+    finished = []
+    executions = [
+        scheduler.start(sm, {"job": job, "polls": polls, "interval": interval})
+        for job, polls, interval in [("a", 3, 60), ("b", 10, 5), ("c", 1, 1000)]
+    ]
+    scheduler.run()
+
+    for execution in executions:
+        assert execution.status == Execution.SUCCEEDED
+        assert execution.final_state.name == "Finished"
+        finished.append(execution.output["job"])
+    assert finished == ["a", "b", "c"]
+    # Executions wait at the same time, the clock is at the longest of them
+    assert clock.time() == max(2 * 60, 9 * 5)
+
+
+def test_scheduler_reports_failures_and_timeouts():
+    sm = polling_machine(timeout_seconds=50)
+    fail = Machine.parse({"StartAt": "F", "States": {"F": {"Type": "Fail", "Error": "E", "Cause": "C"}}})
+    runner = Runner(clock=VirtualClock())
+    runner.resources.register("Check", lambda payload: payload["done"])
+    scheduler = Scheduler(runner)
+
+    timed_out = scheduler.start(sm, {"interval": 20, "done": False})
+    succeeded = scheduler.start(sm, {"interval": 20, "done": True})
+    failed = scheduler.start(fail)
+    broken = scheduler.start(sm, {"interval": 20})
+    scheduler.run()
+
+    assert timed_out.status == Execution.TIMED_OUT
+    assert timed_out.error.error == "States.Timeout"
+    assert runner.clock.time() == 50
+    assert succeeded.status == Execution.SUCCEEDED
+    assert failed.status == Execution.FAILED
+    assert failed.result == (fail.states["F"], {"Error": "E", "Cause": "C"})
+    assert broken.status == Execution.FAILED
+    with pytest.raises(StateFailed):
+        broken.result
+
+
+def test_scheduler_parks_executions_between_retries():
+    stamps = []
+    attempts = []
+
+    def flaky(payload):
+        attempts.append(payload)
+        if len(attempts) == 1:
+            raise RuntimeError("Try again")
+
+    runner = Runner()
+    runner.resources.register("Flaky", flaky)
+    runner.resources.register("Stamp", lambda payload: stamps.append(time.monotonic()))
+    retrying = Machine.parse({
+        "StartAt": "Flaky",
+        "States": {
+            "Flaky": {
+                "Type": "Task", "Resource": "Flaky", "End": True,
+                "Retry": [{"ErrorEquals": ["States.ALL"], "IntervalSeconds": 0.3, "MaxAttempts": 1}],
+            },
+        },
+    })
+    waiting = Machine.parse({
+        "StartAt": "Wait",
+        "States": {
+            "Wait": {"Type": "Wait", "Seconds": 0.1, "Next": "Stamp"},
+            "Stamp": {"Type": "Task", "Resource": "Stamp", "End": True},
+        },
+    })
+    scheduler = Scheduler(runner)
+    first = scheduler.start(retrying)
+    second = scheduler.start(waiting)
+    started = time.monotonic()
+    scheduler.run()
+
+    assert first.status == second.status == Execution.SUCCEEDED
+    assert len(attempts) == 2
+    # The other execution went on while the first one waited for its retry
+    assert stamps[0] - started < 0.25
+    assert time.monotonic() - started >= 0.3
+
+
+def test_scheduler_times_out_only_the_execution_that_ran_out_of_time():
+    def out_of_time(payload):
+        raise ExecutionTimedOut("The branch ran out of time")
+
+    runner = Runner()
+    runner.resources.register("OutOfTime", out_of_time)
+    sm = Machine.parse({"StartAt": "T", "States": {"T": {"Type": "Task", "Resource": "OutOfTime", "End": True}}})
+    scheduler = Scheduler(runner)
+    timed_out = scheduler.start(sm)
+    succeeded = scheduler.start(Machine.parse({"StartAt": "P", "States": {"P": {"Type": "Pass", "End": True}}}))
+    scheduler.run()
+
+    assert timed_out.status == Execution.TIMED_OUT
+    assert timed_out.error.error == "States.Timeout"
+    assert succeeded.status == Execution.SUCCEEDED
+
+
+def test_scheduler_parks_many_executions_in_real_time():
+    sm = Machine.parse({
+        "StartAt": "Wait",
+        "States": {
+            "Wait": {"Type": "Wait", "SecondsPath": "$.wait", "Next": "Done"},
+            "Done": {"Type": "Pass", "End": True},
+        },
+    })
+    scheduler = Scheduler()
+    executions = [scheduler.start(sm, {"wait": 0.2 + (i % 3) * 0.05}) for i in range(3000)]
+
+    started = time.perf_counter()
+    scheduler.run()
+    elapsed = time.perf_counter() - started
+
+    assert all(execution.status == Execution.SUCCEEDED for execution in executions)
+    assert 0.3 <= elapsed < 2
+
+
+def test_async_runner_waits_without_blocking_the_loop():
+    sm = Machine.parse({"StartAt": "Wait", "States": {"Wait": {"Type": "Wait", "Seconds": 0.2, "End": True}}})
+    runner = AsyncRunner()
+
+    async def run_many():
+        return await asyncio.gather(*(runner.run(sm, {"i": i}) for i in range(1000)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run_many())
+    elapsed = time.perf_counter() - started
+    runner.close()
+
+    assert [output for _, output in results] == [{"i": i} for i in range(1000)]
+    assert elapsed < 2